@@ -1,11 +1,15 @@
 import streamlit as st
 import sys
+from datetime import date, datetime, timedelta
 from pathlib import Path
+from typing import Optional
 
 # Add src to path
 sys.path.insert(0, str(Path(__file__).parent / "src"))
 
 import data_manager as dm
+import instrumentation
+from stock_alerts import stock_ratio
 
 # Configure for mobile/smartphone use
 st.set_page_config(
@@ -15,10 +19,135 @@ st.set_page_config(
     initial_sidebar_state="collapsed",
 )
 
-# Main navigation
+# Ingredients shown per page on the Ingredients page
+PAGE_SIZE = 25
+
+# Results shown on the Search page
+SEARCH_LIMIT = 30
+
+# Recipes listed under "What can I cook?" on the Meal Planning page
+FEASIBLE_LIMIT = 20
+
+# Low-stock alerts listed at the top of the Ingredients page
+LOW_STOCK_LIMIT = 10
+
+# Expiring lots listed at the top of the Ingredients page
+EXPIRING_LIMIT = 10
+
+# Emoji mappings for visual indicators
+CATEGORY_EMOJIS = {
+    "Vegetables": "🥕",
+    "Fruits": "🍎",
+    "Meat": "🥩",
+    "Dairy": "🥛",
+    "Grains": "🌾",
+    "Spices": "🌶️",
+    "Beverages": "🥤",
+    "Canned Goods": "🥫",
+    "Frozen": "❄️",
+    "Side dish": "🍽️",
+    "Breakfast": "🍳",
+    "Other": "📦"
+}
+
+MEASUREMENT_EMOJIS = {
+    "kg": "⚖️",
+    "liter": "🥤",
+    "pieces": "🔢"
+}
+
+
+# Cached views of the data layer. Every function takes the data version as
+# its first argument, so any mutation (from this or another session) misses
+# the cache and the view is rebuilt once. cache_resource hands out the cached
+# object without copying it, so callers must treat these views as read-only.
+@st.cache_data(max_entries=4)
+def cached_categories(version: int) -> list:
+    return dm.get_categories()
+
+
+@st.cache_resource(max_entries=4)
+def cached_recipe_view(version: int) -> list:
+    """Recipes sorted by ID with expander titles and per-person ingredient lines."""
+    view = []
+    for recipe in sorted(dm.get_recipes(), key=lambda x: x['id']):
+        tag = recipe.get('tag', '')
+        title = f"{recipe['name']} ({tag})" if tag else recipe['name']
+        lines = []
+        for ring in recipe['ingredients']:
+            ing = dm.get_ingredient(ring['ingredient_id'])
+            if ing:
+                lines.append((ring['quantity_grams'], ing['name']))
+        view.append((recipe, title, lines))
+    return view
+
+
+def ingredient_label(ing: dict) -> str:
+    """Expander label of an ingredient: emoji, name, amount, and category; ⚠️ if below min_stock."""
+    category_emoji = CATEGORY_EMOJIS.get(ing['category'], "📦")
+    measurement_emoji = MEASUREMENT_EMOJIS.get(ing.get('measurement', 'pieces'), "🔢")
+    low = " ⚠️" if stock_ratio(ing) is not None else ""
+    return f"{category_emoji} {ing['name']} - {measurement_emoji} {ing.get('amount', 0):.1f} {ing.get('measurement', 'pieces')} ({ing['category']}){low}"
+
+
+def change_ingredient_page(step: int) -> None:
+    """Prev/Next button callback for the ingredient list."""
+    st.session_state['ingredient_page'] = st.session_state.get('ingredient_page', 0) + step
+
+
+def save_ingredient(ing_id: int, revision: int) -> None:
+    """Save-button callback. revision is the one the edit form was rendered with."""
+    fields = {
+        'measurement': st.session_state[f"measurement_{ing_id}"],
+        'amount': st.session_state[f"amount_{ing_id}"],
+        'min_stock': st.session_state[f"min_stock_{ing_id}"] or None
+    }
+    # Conversion fields are only shown for the measurement they apply to
+    for field in ('piece_grams', 'density'):
+        if f"{field}_{ing_id}" in st.session_state:
+            fields[field] = st.session_state[f"{field}_{ing_id}"] or None
+
+    try:
+        dm.update_ingredient(ing_id, expected_revision=revision, **fields)
+    except dm.ConflictError as e:
+        # Drop the edited values so the form shows the latest stored ones
+        for field in ('measurement', 'amount', 'min_stock', 'piece_grams', 'density'):
+            st.session_state.pop(f"{field}_{ing_id}", None)
+        st.session_state['save_conflict'] = f"{e}. Showing the latest values - please check and save again."
+
+
+@st.cache_data(max_entries=4)
+def cached_stock_changes(version: int, day: date) -> Optional[list]:
+    """Ingredients whose stock differs between the end of day and now; None before the ledger started."""
+    past_stock = dm.get_stock_at(day)
+    if past_stock is None:
+        return None
+    current_stock = dm.get_stock_at(datetime.now())
+    rows = []
+    for ing_id in sorted(set(past_stock) | set(current_stock)):
+        then, now = past_stock.get(ing_id, 0.0), current_stock.get(ing_id, 0.0)
+        if then != now:
+            ing = dm.get_ingredient(ing_id)
+            rows.append({
+                'Ingredient': ing['name'] if ing else f"#{ing_id} (deleted)",
+                'Then': round(then, 3),
+                'Now': round(now, 3),
+                'Change': round(now - then, 3),
+            })
+    return rows
+
+
+# Data layer stats at the start of this rerun; see the Debug page
+rerun_start = instrumentation.snapshot()
+data_version = dm.get_data_version()
+
+# Main navigation; the Debug page is hidden unless the URL has ?debug=1
+pages = ["Ingredients", "Recipes", "Meal Planning", "Search"]
+if st.query_params.get("debug") == "1":
+    pages.append("Debug")
 page = st.sidebar.selectbox(
     "Navigate",
-    ["Ingredients", "Recipes", "Meal Planning"]
+    pages
 )
 
 st.title("NYC 2025 Storage Manager")
@@ -27,69 +156,103 @@ st.title("NYC 2025 Storage Manager")
 if page == "Ingredients":
     st.header("Ingredient Inventory")
 
-    # Emoji mappings for visual indicators
-    CATEGORY_EMOJIS = {
-        "Vegetables": "🥕",
-        "Fruits": "🍎",
-        "Meat": "🥩",
-        "Dairy": "🥛",
-        "Grains": "🌾",
-        "Spices": "🌶️",
-        "Beverages": "🥤",
-        "Canned Goods": "🥫",
-        "Frozen": "❄️",
-        "Side dish": "🍽️",
-        "Breakfast": "🍳",
-        "Other": "📦"
-    }
-
-    MEASUREMENT_EMOJIS = {
-        "kg": "⚖️",
-        "liter": "🥤",
-        "pieces": "🔢"
-    }
-
-    # Filter by category
-    filter_category = st.selectbox("Filter by Category", ["All"] + dm.get_categories())
+    # Fetching one more than shown tells whether there are more alerts
+    low_stock = dm.get_low_stock(limit=LOW_STOCK_LIMIT + 1)
+    if low_stock:
+        lines = [
+            f"- {entry['ingredient']['name']}: {entry['ingredient'].get('amount', 0):.1f} of "
+            f"{entry['ingredient']['min_stock']:.1f} {entry['ingredient'].get('measurement', 'pieces')}"
+            for entry in low_stock[:LOW_STOCK_LIMIT]
+        ]
+        if len(low_stock) > LOW_STOCK_LIMIT:
+            lines.append("- ...")
+        st.warning("**Low stock**\n" + "\n".join(lines))
+
+    expiring = dm.get_expiring(limit=EXPIRING_LIMIT + 1)
+    if expiring:
+        lines = [
+            f"- {entry['ingredient']['name']}: {entry['amount']:.1f} "
+            f"{entry['ingredient'].get('measurement', 'pieces')} "
+            f"{'expired' if entry['expired'] else 'expires'} {entry['expires']}"
+            for entry in expiring[:EXPIRING_LIMIT]
+        ]
+        if len(expiring) > EXPIRING_LIMIT:
+            lines.append("- ...")
+        st.warning(f"**Expiring within {dm.EXPIRING_SOON_DAYS} days**\n" + "\n".join(lines))
+
+    categories = cached_categories(data_version)
+
+    # Filter by category and name
+    filter_category = st.selectbox("Filter by Category", ["All"] + categories)
+    search = st.text_input("Search", placeholder="Ingredient name")
 
     st.divider()
 
     # Add new ingredient section
     with st.expander("Add New Ingredient"):
         ing_name = st.text_input("Ingredient Name")
-        ing_category = st.selectbox("Category", dm.get_categories())
+        ing_category = st.selectbox("Category", categories)
         ing_measurement = st.selectbox("Measurement", ["kg", "liter", "pieces"])
         ing_amount = st.number_input("Amount", min_value=0.0, step=0.1, value=0.0)
+        ing_min_stock = st.number_input("Alert below (0 = no alert)", min_value=0.0, step=0.1, value=0.0)
+        ing_piece_grams = ing_density = None
+        if ing_measurement == "pieces":
+            ing_piece_grams = st.number_input("Weight per piece (g, 0 = unknown)", min_value=0.0, step=10.0, value=0.0)
+        elif ing_measurement == "liter":
+            ing_density = st.number_input("Density (kg per liter, 0 = like water)", min_value=0.0, step=0.05, value=0.0)
 
         if st.button("Add Ingredient"):
             if ing_name:
-                dm.add_ingredient(ing_name, ing_category, ing_measurement, ing_amount)
+                dm.add_ingredient(ing_name, ing_category, ing_measurement, ing_amount,
+                                  density=ing_density, piece_grams=ing_piece_grams,
+                                  min_stock=ing_min_stock or None)
                 st.success(f"Added {ing_name}!")
                 st.rerun()
             else:
                 st.error("Please enter an ingredient name")
 
-    st.divider()
-    
-    # Display ingredients
-    ingredients = dm.get_ingredients()
-
-    if filter_category != "All":
-        ingredients = [ing for ing in ingredients if ing['category'] == filter_category]
-
-    if ingredients:
-        for ing in sorted(ingredients, key=lambda x: x['name']):
-            category_emoji = CATEGORY_EMOJIS.get(ing['category'], "📦")
-            measurement_emoji = MEASUREMENT_EMOJIS.get(ing.get('measurement', 'pieces'), "🔢")
+    # Compare with the stock on an earlier day, rebuilt from the stock ledger
+    with st.expander("Stock History"):
+        history_day = st.date_input("Stock at the end of", value=date.today() - timedelta(days=1),
+                                    max_value=date.today())
+        stock_changes = cached_stock_changes(data_version, history_day)
+        if stock_changes is None:
+            st.info("No stock history recorded that far back.")
+        elif stock_changes:
+            st.dataframe(stock_changes, hide_index=True)
+        else:
+            st.caption("No stock changes since then.")
 
-            # Collapsed view shows: emoji, name, amount, and category
-            expander_label = f"{category_emoji} {ing['name']} - {measurement_emoji} {ing.get('amount', 0):.1f} {ing.get('measurement', 'pieces')} ({ing['category']})"
+    st.divider()
 
-            with st.expander(expander_label, expanded=False):
+    if 'save_conflict' in st.session_state:
+        st.error(st.session_state.pop('save_conflict'))
+
+    # Back to the first page whenever the filter changes
+    ingredient_filter = (filter_category, search)
+    if st.session_state.get('ingredient_filter') != ingredient_filter:
+        st.session_state['ingredient_filter'] = ingredient_filter
+        st.session_state['ingredient_page'] = 0
+
+    # Only the visible page is fetched and rendered
+    query_category = None if filter_category == "All" else filter_category
+    page_index = max(st.session_state.get('ingredient_page', 0), 0)
+    result = dm.query_ingredients(query_category, search, page_index * PAGE_SIZE, PAGE_SIZE)
+    num_pages = max(1, -(-result['total'] // PAGE_SIZE))
+    if page_index >= num_pages:
+        # The list shrank (e.g. after a delete): show its last page
+        page_index = num_pages - 1
+        result = dm.query_ingredients(query_category, search, page_index * PAGE_SIZE, PAGE_SIZE)
+    st.session_state['ingredient_page'] = page_index
+    total, ingredient_page = result['total'], result['items']
+
+    if ingredient_page:
+        for ing in ingredient_page:
+            with st.expander(ingredient_label(ing), expanded=False):
                 col1, col2 = st.columns([2, 2])
 
                 with col1:
-                    new_measurement = st.selectbox(
+                    st.selectbox(
                         "Measurement",
                         options=["kg", "liter", "pieces"],
                         index=["kg", "liter", "pieces"].index(ing.get('measurement', 'pieces')),
@@ -97,7 +260,7 @@ if page == "Ingredients":
                     )
 
                 with col2:
-                    new_amount = st.number_input(
+                    st.number_input(
                         "Amount",
                         min_value=0.0,
                         value=float(ing.get('amount', 0)),
@@ -105,18 +268,75 @@ if page == "Ingredients":
                         key=f"amount_{ing['id']}"
                     )
 
-                col1, col2 = st.columns(2)
+                st.number_input(
+                    "Alert below (0 = no alert)",
+                    min_value=0.0,
+                    value=float(ing.get('min_stock') or 0),
+                    step=0.1,
+                    key=f"min_stock_{ing['id']}"
+                )
+
+                # Lets stock be compared with recipe grams; see units.py
+                measurement = st.session_state.get(f"measurement_{ing['id']}", ing.get('measurement', 'pieces'))
+                if measurement == "pieces":
+                    st.number_input(
+                        "Weight per piece (g, 0 = unknown)",
+                        min_value=0.0,
+                        value=float(ing.get('piece_grams') or 0),
+                        step=10.0,
+                        key=f"piece_grams_{ing['id']}"
+                    )
+                elif measurement == "liter":
+                    st.number_input(
+                        "Density (kg per liter, 0 = like water)",
+                        min_value=0.0,
+                        value=float(ing.get('density') or 0),
+                        step=0.05,
+                        key=f"density_{ing['id']}"
+                    )
 
+                # Stock with an expiry date is kept in lots, used soonest expiring first
+                if ing.get('lots'):
+                    st.caption("Lots: " + ", ".join(
+                        f"{lot['amount']:.1f} until {lot['expires']}" for lot in ing['lots']
+                    ))
+                col1, col2, col3 = st.columns([2, 2, 1])
                 with col1:
-                    if st.button("Save", key=f"save_{ing['id']}", type="primary"):
-                        dm.update_ingredient(ing['id'], measurement=new_measurement, amount=new_amount)
-                        st.success("Updated!")
+                    stock_amount = st.number_input("Add stock", min_value=0.0, step=0.1, value=0.0,
+                                                   key=f"add_amount_{ing['id']}")
+                with col2:
+                    stock_expires = st.date_input("Expires", value=None, key=f"add_expires_{ing['id']}")
+                with col3:
+                    if st.button("Add", key=f"add_stock_{ing['id']}", disabled=not stock_amount):
+                        dm.add_stock(ing['id'], stock_amount, stock_expires)
                         st.rerun()
 
+                col1, col2 = st.columns(2)
+
+                with col1:
+                    st.button(
+                        "Save",
+                        key=f"save_{ing['id']}",
+                        type="primary",
+                        on_click=save_ingredient,
+                        args=(ing['id'], ing.get('revision', 0))
+                    )
+
                 with col2:
                     if st.button("Delete", key=f"del_{ing['id']}"):
                         dm.delete_ingredient(ing['id'])
                         st.rerun()
+
+        if num_pages > 1:
+            col1, col2, col3 = st.columns([1, 2, 1])
+            with col1:
+                st.button("◀ Prev", disabled=page_index == 0, on_click=change_ingredient_page, args=(-1,))
+            with col2:
+                st.caption(f"Page {page_index + 1} of {num_pages} ({total} ingredients)")
+            with col3:
+                st.button("Next ▶", disabled=page_index >= num_pages - 1, on_click=change_ingredient_page, args=(1,))
+    elif search or filter_category != "All":
+        st.info("No ingredients match the filter.")
     else:
         st.info("No ingredients yet. Add one above!")
 
@@ -139,7 +359,7 @@ elif page == "Recipes":
         st.subheader("Ingredients (per person, in grams)")
 
         # Get all ingredients for selection
-        all_ingredients = dm.get_ingredients()
+        all_ingredients = dm.query_ingredients()['items']
 
         if all_ingredients:
             # Simple approach: add ingredients one by one
@@ -177,14 +397,12 @@ elif page == "Recipes":
             st.warning("Please add ingredients first before creating recipes")
 
     # Display recipes
-    recipes = dm.get_recipes()
+    recipe_view = cached_recipe_view(data_version)
 
-    if recipes:
+    if recipe_view:
         st.subheader("Your Recipes")
 
-        for recipe in sorted(recipes, key=lambda x: x['id']):
-            tag = recipe.get('tag', '')
-            expander_title = f"{recipe['name']} ({tag})" if tag else recipe['name']
+        for recipe, expander_title, ingredient_lines in recipe_view:
             with st.expander(expander_title):
                 col1, col2 = st.columns(2)
                 with col1:
@@ -196,10 +414,8 @@ elif page == "Recipes":
                     st.write(f"**Comments:** {recipe['comments']}")
 
                 st.write("**Ingredients (per person):**")
-                for ring in recipe['ingredients']:
-                    ing = next((i for i in all_ingredients if i['id'] == ring['ingredient_id']), None)
-                    if ing:
-                        st.write(f"- {ring['quantity_grams']}g {ing['name']}")
+                for quantity_grams, ing_name in ingredient_lines:
+                    st.write(f"- {quantity_grams}g {ing_name}")
 
                 if st.button("Delete Recipe", key=f"del_recipe_{recipe['id']}"):
                     dm.delete_recipe(recipe['id'])
@@ -215,6 +431,60 @@ elif page == "Meal Planning":
     recipes = dm.get_recipes()
 
     if recipes:
+        with st.expander("What can I cook?"):
+            feasible = dm.get_feasible_recipes(limit=FEASIBLE_LIMIT)
+            if feasible:
+                st.dataframe([
+                    {
+                        'Recipe': row['name'],
+                        'Servings': row['max_servings'],
+                        'Limited by': row['limiting_ingredient'] or "",
+                        'Uses expiring (g)': round(row['expiring_grams']),
+                        'Check manually': ", ".join(row['unchecked_ingredients']),
+                    }
+                    for row in feasible
+                ], hide_index=True)
+                st.caption("Servings with ingredients to check manually only count the other ingredients. "
+                           f"Recipes using stock that expires within {dm.EXPIRING_SOON_DAYS} days come first.")
+            else:
+                st.info("The current stock is not enough for a single serving of any recipe.")
+
+        with st.expander("Plan meals from stock"):
+            col1, col2 = st.columns(2)
+            with col1:
+                plan_people = st.number_input("People", min_value=1, value=2, step=1, key="plan_people")
+            with col2:
+                plan_days = st.number_input("Days (0 = as many as the stock covers)", min_value=0, value=7, step=1,
+                                            key="plan_days")
+            plan_vegie = st.checkbox("Vegetarian only", key="plan_vegie")
+            all_tags = sorted({recipe.get('tag', '') for recipe in recipes if recipe.get('tag')})
+            plan_tags = st.multiselect("Only these tags", all_tags, key="plan_tags")
+
+            if st.button("Suggest Plan"):
+                suggestion = dm.optimize_meal_plan(
+                    plan_people,
+                    num_days=plan_days or None,
+                    vegie_only=plan_vegie,
+                    tags=plan_tags or None,
+                    start_date=date.today(),
+                )
+                names = {recipe['id']: recipe['name'] for recipe in recipes}
+                if suggestion['plan']:
+                    st.dataframe([
+                        {'Date': meal_date.isoformat(), 'Recipe': names[recipe_id], 'People': people}
+                        for recipe_id, people, meal_date in suggestion['plan']
+                    ], hide_index=True)
+                if suggestion['unfilled']:
+                    st.warning(f"No recipe left for {suggestion['unfilled']} meals - relax the filters for a full plan.")
+                if suggestion['shopping_list']:
+                    st.write("**Shopping List:**")
+                    for req in suggestion['shopping_list']:
+                        st.write(f"- {req['name']}: {req['shortfall']:.1f}g (first needed {req['first_needed']})")
+                elif suggestion['plan']:
+                    st.success("Everything for this plan is in stock!")
+                else:
+                    st.info("The stock does not cover any recipe on its own.")
+
         # Select recipe
         selected_recipe = st.selectbox(
             "Select Recipe",
@@ -232,11 +502,9 @@ elif page == "Meal Planning":
 
         # Display ingredients for selected recipe
         st.subheader(f"{selected_recipe['name']} - Ingredients")
-        all_ingredients = dm.get_ingredients()
-
         st.write(f"**For {num_people} {'person' if num_people == 1 else 'people'}:**")
         for recipe_ing in selected_recipe['ingredients']:
-            ing = next((i for i in all_ingredients if i['id'] == recipe_ing['ingredient_id']), None)
+            ing = dm.get_ingredient(recipe_ing['ingredient_id'])
             if ing:
                 total_grams = recipe_ing['quantity_grams'] * num_people
                 st.write(f"- {total_grams:.1f}g {ing['name']}")
@@ -291,5 +559,68 @@ elif page == "Meal Planning":
                 st.balloons()
                 st.success("You have all ingredients! Ready to cook!")
 
+        # Takes the ingredients out of stock, soonest expiring lots first
+        if st.button("Mark as Cooked"):
+            cooked = dm.cook_recipe(selected_recipe['id'], num_people)
+            st.success(f"Took the ingredients for {selected_recipe['name']} out of stock.")
+            if cooked['missing']:
+                st.warning("Not enough in stock: " + ", ".join(
+                    dm.get_ingredient(ing_id)['name'] for ing_id in cooked['missing']))
+            if cooked['unconverted']:
+                st.info("Update manually (no weight per piece): " + ", ".join(
+                    dm.get_ingredient(ing_id)['name'] for ing_id in cooked['unconverted']))
+
     else:
         st.info("No recipes available. Create recipes first!")
+
+
+# ===== SEARCH PAGE =====
+elif page == "Search":
+    st.header("Search")
+
+    query = st.text_input("Search ingredients and recipes", placeholder="e.g. coconut mi, soup, frozen")
+    if query:
+        results = dm.search(query, limit=SEARCH_LIMIT)
+        if results:
+            st.caption(f"{len(results)} best matches")
+        else:
+            st.info("Nothing found.")
+
+        for result in results:
+            item = result['item']
+            if result['kind'] == 'ingredient':
+                st.write(ingredient_label(item))
+            else:
+                with st.expander(f"📖 {item['name']}" + (f" ({item['tag']})" if item.get('tag') else "")):
+                    if item.get('comments'):
+                        st.write(f"**Comments:** {item['comments']}")
+                    for ring in item['ingredients']:
+                        ing = dm.get_ingredient(ring['ingredient_id'])
+                        if ing:
+                            st.write(f"- {ring['quantity_grams']}g {ing['name']}")
+
+
+# ===== DEBUG PAGE =====
+elif page == "Debug":
+    st.header("Performance Debug")
+    st.caption("Data layer stats of this server process, shared by all sessions.")
+
+    last_rerun = st.session_state.get('last_rerun_stats')
+    st.subheader("Previous rerun")
+    if last_rerun:
+        st.json(last_rerun['counters'], expanded=True)
+        st.dataframe(instrumentation.timing_rows(last_rerun), hide_index=True)
+    else:
+        st.info("No previous rerun recorded yet.")
+
+    cumulative = instrumentation.snapshot()
+    st.subheader("Cumulative")
+    st.json(cumulative['counters'], expanded=False)
+    st.dataframe(instrumentation.timing_rows(cumulative), hide_index=True)
+
+    if st.button("Reset stats"):
+        instrumentation.reset()
+        st.rerun()
+
+# Reruns that end in st.rerun() stop before this line and are not recorded
+st.session_state['last_rerun_stats'] = instrumentation.diff(rerun_start, instrumentation.snapshot())
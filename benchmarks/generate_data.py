@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Deterministic synthetic inventories and recipe books for benchmarks
+The same scale and seed always give the same data (lot expiry dates are
+relative to the day it is generated). Recipes draw their ingredients with a
+Zipf-like popularity, so staples (onions, rice, ...) appear in many recipes
+and most ingredients in only a few.
+
+Usage: python benchmarks/generate_data.py 10k [--seed 0] [--output data.json] [--excel source.xlsx]
+"""
+import argparse
+import json
+import random
+import sys
+from datetime import date, timedelta
+from itertools import accumulate
+from pathlib import Path
+
+from openpyxl import Workbook
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import data_manager as dm
+import lots
+
+BASE_NAMES = [
+    "Onions", "Carrots", "Potatoes", "Rice", "Tomatoes", "Garlic", "Butter", "Eggs",
+    "Milk", "Flour", "Pasta", "Chicken", "Minced meat", "Leek", "Celery", "Peppers",
+    "Zucchini", "Spinach", "Mushrooms", "Lentils", "Chickpeas", "Beans", "Quinoa",
+    "Millet", "Oatmeal", "Yogurt", "Feta", "Parmesan", "Cream", "Coconut milk",
+    "Broth", "Ginger", "Coriander", "Parsley", "Basil", "Curry paste", "Honey",
+    "Olive oil", "Red Wine", "Bacon", "Sausages", "Turkey", "Salmon", "Tuna",
+    "Cauliflower", "Broccoli", "Cabbage", "Sweet potatoes", "Corn", "Peas",
+    "Apples", "Lemons", "Bananas", "Bread rolls", "Cheese", "Tofu", "Noodles",
+    "Couscous", "Bulgur", "Cashews",
+]
+
+QUALIFIERS = [
+    "", "fresh", "TK", "canned", "peeled", "cubes", "julienne", "organic",
+    "dried", "grated", "sliced", "whole", "smoked", "gluten free", "pre-cut",
+]
+
+CATEGORIES = [
+    "Vegetables", "Fruits", "Meat", "Dairy", "Grains", "Spices",
+    "Beverages", "Canned Goods", "Frozen", "Other",
+]
+
+# Syllables for made-up brand names, so large inventories stay varied
+BRAND_SYLLABLES = [
+    "ka", "lo", "mi", "ber", "sun", "ta", "ro", "vel", "no", "fa", "di", "gor",
+    "lin", "pa", "ste", "wu", "xo", "ri", "mon", "de", "ha", "ju", "ke", "zan",
+]
+
+TAGS = ["", "", "soup", "pasta", "curry", "breakfast", "salad", "oven"]
+
+# Scale name -> number of ingredients; recipes are a quarter of that
+SCALES = {"1k": 1_000, "10k": 10_000, "100k": 100_000}
+
+
+def ingredient_names(count: int, rng: random.Random) -> list:
+    """Return count unique, realistic looking ingredient names."""
+    names = []
+    seen = set()
+    while len(names) < count:
+        name = f"{rng.choice(BASE_NAMES)} {rng.choice(QUALIFIERS)}".strip()
+        if name.lower() in seen:
+            # Brands keep names unique once the plain combinations run out
+            brand = "".join(rng.choice(BRAND_SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+            name = f"{brand} {name}"
+        if name.lower() in seen:
+            name = f"{name} {len(names)}"
+        seen.add(name.lower())
+        names.append(name)
+    return names
+
+
+def generate(num_ingredients: int, seed: int = 0, num_recipes: int = None) -> dict:
+    """Build a complete store document with num_ingredients ingredients."""
+    rng = random.Random(seed)
+    num_recipes = num_ingredients // 4 if num_recipes is None else num_recipes
+
+    ingredients = []
+    for ing_id, name in enumerate(ingredient_names(num_ingredients, rng), start=1):
+        measurement = rng.choices(["pieces", "kg", "liter"], weights=[50, 35, 15])[0]
+        ing = {
+            'id': ing_id,
+            'name': name,
+            'category': rng.choice(CATEGORIES),
+            'measurement': measurement,
+            'amount': round(rng.uniform(0, 20), 1),
+            'revision': 1,
+        }
+        if measurement == "pieces" and rng.random() < 0.7:
+            ing['piece_grams'] = rng.choice([50, 100, 150, 250, 400, 1000])
+        elif measurement == "liter" and rng.random() < 0.3:
+            ing['density'] = round(rng.uniform(0.9, 1.1), 2)
+        ingredients.append(ing)
+
+    # Zipf-like popularity: the ingredient of rank r is picked with weight 1/r
+    ranked = list(range(1, num_ingredients + 1))
+    rng.shuffle(ranked)
+    cum_weights = list(accumulate(1.0 / rank for rank in range(1, num_ingredients + 1)))
+
+    recipes = []
+    for recipe_id in range(1, num_recipes + 1):
+        fan_out = min(num_ingredients, int(rng.triangular(3, 18, 8)))
+        chosen = []
+        while len(chosen) < fan_out:
+            ing_id = ranked[rng.choices(range(num_ingredients), cum_weights=cum_weights)[0]]
+            if ing_id not in chosen:
+                chosen.append(ing_id)
+        recipes.append({
+            'id': recipe_id,
+            'name': f"Recipe {recipe_id} with {ingredients[chosen[0] - 1]['name']}",
+            'comments': rng.choice(["", "Family favourite", "Needs oven", "Prepare the day before"]),
+            'ingredients': [
+                {'ingredient_id': ing_id, 'quantity_grams': float(rng.choice([5, 10, 20, 50, 100, 150, 250]))}
+                for ing_id in chosen
+            ],
+            'vegie': rng.choice(["yes", "no"]),
+            'tag': rng.choice(TAGS),
+            'revision': 1,
+        })
+
+    # A separate generator, so adding thresholds left the rest of the data as it was
+    alert_rng = random.Random(seed + 1)
+    for ing in ingredients:
+        if alert_rng.random() < 0.2:
+            ing['min_stock'] = float(alert_rng.choice([1, 2, 5, 10]))
+
+    # Lots expire relative to the day the data is generated, so some are
+    # always expiring soon (or already expired) when the benchmarks run
+    lot_rng = random.Random(seed + 2)
+    today = date.today()
+    for ing in ingredients:
+        if lot_rng.random() < 0.3:
+            for _ in range(lot_rng.randint(1, 3)):
+                expires = today + timedelta(days=lot_rng.randint(-5, 60))
+                lots.add_lot(ing, float(lot_rng.choice([0.5, 1, 2])), expires.isoformat())
+
+    return {
+        "schema_version": dm.SCHEMA_VERSION,
+        "ingredients": ingredients,
+        "recipes": recipes,
+        "categories": CATEGORIES,
+        "units": ["kg", "liter", "pieces"],
+    }
+
+
+def write_workbook(path: Path, data: dict, num_sheets: int) -> None:
+    """Write recipes as a source.xlsx like the import scripts read (one sheet per meal)."""
+    ingredients_by_id = {ing['id']: ing for ing in data['ingredients']}
+    unit_names = {'kg': 'kg', 'liter': 'l', 'pieces': 'pieces'}
+
+    wb = Workbook()
+    wb.remove(wb.active)
+    for recipe in data['recipes'][:num_sheets]:
+        ws = wb.create_sheet(f"S{recipe['id']}")
+        ws.cell(row=2, column=2, value=recipe['name'])
+        for row, ring in enumerate(recipe['ingredients'], start=7):
+            ing = ingredients_by_id[ring['ingredient_id']]
+            ws.cell(row=row, column=1, value=ing['name'])
+            ws.cell(row=row, column=3, value=unit_names[ing['measurement']])
+            ws.cell(row=row, column=4, value=ring['quantity_grams'] / 1000)
+    wb.save(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('scale', choices=list(SCALES))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=Path, help="write the store document here")
+    parser.add_argument('--excel', type=Path, help="also write a source.xlsx with one sheet per recipe")
+    parser.add_argument('--sheets', type=int, default=100, help="number of recipe sheets in --excel")
+    args = parser.parse_args()
+
+    data = generate(SCALES[args.scale], args.seed)
+    print(f"Generated {len(data['ingredients'])} ingredients and {len(data['recipes'])} recipes")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        print(f"Wrote {args.output}")
+    if args.excel:
+        write_workbook(args.excel, data, args.sheets)
+        print(f"Wrote {args.excel}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Benchmark every public data_manager operation on synthetic stores
+For each scale a fresh store is generated in a temporary directory, every
+operation is timed (p50/p95 latency) and then run once more under tracemalloc
+for its peak memory. Results can be saved as a baseline; later runs print the
+change against it, so regressions show up as diffs.
+
+Usage: python benchmarks/run_benchmarks.py [--sizes 1k,10k,100k] [--backend json|sqlite|arrow]
+                                           [--repeat 20] [--save-baseline]
+"""
+import argparse
+import contextlib
+import inspect
+import io
+import json
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+BENCH_DIR = Path(__file__).parent
+sys.path.insert(0, str(BENCH_DIR.parent / "src"))
+sys.path.insert(0, str(BENCH_DIR.parent / "scripts"))
+
+import clean_ingredients
+import data_manager as dm
+import import_ingredients
+import import_recipes
+from generate_data import SCALES, generate, write_workbook
+from storage_backends import ArrowBackend, JsonBackend, SqliteBackend
+
+BASELINE_DIR = BENCH_DIR / "baselines"
+
+# Public data_manager functions that are not timed on purpose
+NOT_TIMED = {
+    'migrate_ingredient_data': "one-off migration of the pre-1 schema",
+    'migrate_data': "runs only when the stored schema is old",
+    'get_backend': "returns a module global",
+    'set_backend': "benchmark setup",
+    'invalidate_cache': "part of the cold load_data case",
+    'stock_source': "only sets the source recorded with stock events",
+}
+
+# A p50 this much slower than the baseline is reported as a regression,
+# unless it grew by less than REGRESSION_MIN_MS (timer noise on fast calls)
+REGRESSION_RATIO = 1.25
+REGRESSION_MIN_MS = 0.1
+
+# Recipe sheets in the generated workbook for the import script cases
+IMPORT_SHEETS = 50
+
+
+class Case:
+    """One timed operation: setup() returns the args for run(), untimed."""
+
+    def __init__(self, name: str, run: Callable, setup: Optional[Callable] = None,
+                 covers: Optional[List[str]] = None, heavy: bool = False):
+        self.name = name
+        self.run = run
+        self.setup = setup or (lambda: ())
+        self.covers = [name.split(' ')[0]] if covers is None else covers
+        self.heavy = heavy
+
+
+def quiet(func: Callable) -> Callable:
+    """Wrap func so its printed output is discarded."""
+    def wrapper(*args):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return func(*args)
+    return wrapper
+
+
+def run_script(module, workbook: Path, *argv: str) -> None:
+    """Run an import script's main() against workbook."""
+    module.EXCEL_FILE = workbook
+    old_argv = sys.argv
+    sys.argv = [module.__file__, *argv]
+    try:
+        module.main()
+    finally:
+        sys.argv = old_argv
+
+
+def make_cases(data: Dict, workbook: Path, rng: random.Random) -> List[Case]:
+    """Build the benchmark cases for a store generated from data."""
+    num_ingredients = len(data['ingredients'])
+    num_recipes = len(data['recipes'])
+    names = [ing['name'] for ing in data['ingredients']]
+    category = data['categories'][0]
+
+    def any_ingredient():
+        return (rng.randint(1, num_ingredients),)
+
+    def any_recipe():
+        return (rng.randint(1, num_recipes),)
+
+    def typo():
+        name = rng.choice(names)
+        i = rng.randrange(len(name) - 1)
+        return (name[:i] + name[i + 1] + name[i] + name[i + 2:],)
+
+    def new_ingredient():
+        return (f"Bench ingredient {rng.random()}", category, "kg", 1.0)
+
+    def new_recipe():
+        ids = rng.sample(range(1, num_ingredients + 1), 8)
+        return (f"Bench recipe {rng.random()}", "", [{'ingredient_id': i, 'quantity_grams': 50.0} for i in ids])
+
+    def added_ingredient():
+        return (dm.add_ingredient(*new_ingredient())['id'],)
+
+    def added_recipe():
+        return (dm.add_recipe(*new_recipe())['id'],)
+
+    def upsert_rows():
+        rows = [{'name': rng.choice(names), 'category': category, 'measurement': 'kg', 'amount': 2.0}
+                for _ in range(50)]
+        rows += [{'name': f"Bench upsert {rng.random()}", 'category': category, 'measurement': 'kg', 'amount': 1.0}
+                 for _ in range(50)]
+        return (rows,)
+
+    def recipe_rows():
+        return ([{'name': f"Bench upsert recipe {rng.random()}", 'comments': '', 'ingredients': []}
+                 for _ in range(100)],)
+
+    def duplicates():
+        merges = {}
+        for _ in range(5):
+            keep = rng.randint(1, num_ingredients)
+            merges[dm.add_ingredient(f"{names[keep - 1]} copy {rng.random()}", category, "kg", 1.0)['id']] = keep
+        return (merges,)
+
+    def weekly_plan():
+        return ([(rng.randint(1, num_recipes), rng.randint(1, 6), f"2025-01-{day:02d}") for day in range(1, 15)],)
+
+    def cold_load():
+        dm.invalidate_cache()
+        return dm.load_data()
+
+    def bulk_update(ids):
+        with dm.transaction():
+            for ing_id in ids:
+                dm.update_ingredient(ing_id, amount=3.0)
+
+    def buffered_ingredient():
+        dm.set_write_behind(60.0)
+        return any_ingredient()
+
+    def buffered_updates():
+        dm.set_write_behind(60.0)
+        for _ in range(20):
+            dm.update_ingredient(*any_ingredient(), amount=2.0)
+        return ()
+
+    def flush_write_behind():
+        dm.flush()
+        dm.set_write_behind(0)
+
+    def past_moment():
+        # Halfway through the stock events the cases before have recorded
+        history = dm.get_stock_history()
+        return (history[len(history) // 2]['time'],)
+
+    def dated_stock():
+        return (*any_ingredient(), 1.0, date.today() + timedelta(days=rng.randint(0, 30)))
+
+    def journaled_edit():
+        dm.update_ingredient(*any_ingredient(), amount=2.0)
+        return ()
+
+    def update_ids():
+        return (rng.sample(range(1, num_ingredients + 1), 100),)
+
+    return [
+        Case("load_data (cold)", cold_load, heavy=True),
+        Case("load_data (cached)", dm.load_data),
+        Case("save_data", lambda: dm.save_data(dm.load_data()), heavy=True),
+        Case("compact (after one edit)", dm.compact, journaled_edit, heavy=True),
+        Case("get_data_version", dm.get_data_version),
+        Case("get_ingredients", dm.get_ingredients),
+        Case("get_ingredients (category)", lambda: dm.get_ingredients(category), covers=['get_ingredients']),
+        Case("get_ingredient", dm.get_ingredient, any_ingredient),
+        Case("get_low_stock (top 10)", lambda: dm.get_low_stock(limit=10), covers=['get_low_stock']),
+        Case("query_ingredients (page)", dm.query_ingredients,
+             lambda: (category, "", rng.randrange(0, num_ingredients // 10, 25), 25)),
+        Case("query_ingredients (search)", dm.query_ingredients, lambda: (None, rng.choice(names)[:4], 0, 25)),
+        Case("find_ingredient (exact)", dm.find_ingredient, lambda: (rng.choice(names),)),
+        Case("find_ingredient (typo)", dm.find_ingredient, typo),
+        Case("similar_ingredients", dm.similar_ingredients, typo),
+        Case("search (word)", dm.search, lambda: (rng.choice(names).split()[-1],)),
+        Case("search (prefix)", dm.search, lambda: (rng.choice(names)[:6],)),
+        Case("get_recipes", dm.get_recipes),
+        Case("get_recipe", dm.get_recipe, any_recipe),
+        Case("get_categories", dm.get_categories),
+        Case("get_units", dm.get_units),
+        Case("get_meta", dm.get_meta, lambda: ('import_hashes', {})),
+        Case("set_meta", dm.set_meta, lambda: ('bench', rng.random())),
+        Case("add_ingredient", dm.add_ingredient, new_ingredient),
+        Case("update_ingredient", lambda i: dm.update_ingredient(i, amount=2.0), any_ingredient,
+             covers=['update_ingredient']),
+        # Back to back: the flush case switches write-behind off again
+        Case("update_ingredient (write-behind)", lambda i: dm.update_ingredient(i, amount=2.0), buffered_ingredient,
+             covers=['update_ingredient', 'set_write_behind']),
+        Case("flush (20 updates)", flush_write_behind, buffered_updates, covers=['flush', 'set_write_behind']),
+        Case("delete_ingredient", dm.delete_ingredient, added_ingredient),
+        Case("merge_ingredients", dm.merge_ingredients, duplicates),
+        Case("add_recipe", dm.add_recipe, new_recipe),
+        Case("update_recipe", lambda i: dm.update_recipe(i, comments="updated"), any_recipe,
+             covers=['update_recipe']),
+        Case("delete_recipe", dm.delete_recipe, added_recipe),
+        Case("upsert_ingredients (100 rows)", dm.upsert_ingredients, upsert_rows),
+        Case("upsert_recipes (100 rows)", dm.upsert_recipes, recipe_rows),
+        Case("transaction (100 updates)", bulk_update, update_ids, covers=['transaction', 'update_ingredient']),
+        Case("add_stock (dated lot)", dm.add_stock, dated_stock),
+        Case("consume_ingredient", lambda i: dm.consume_ingredient(i, 0.5), any_ingredient,
+             covers=['consume_ingredient']),
+        Case("cook_recipe", lambda i: dm.cook_recipe(i, 2), any_recipe, covers=['cook_recipe']),
+        Case("get_expiring (next 3 days)", dm.get_expiring, covers=['get_expiring']),
+        Case("get_stock_at (past)", dm.get_stock_at, past_moment),
+        Case("get_stock_history (one ingredient)", dm.get_stock_history, any_ingredient),
+        Case("calculate_meal_requirements", lambda i: dm.calculate_meal_requirements(i, 4), any_recipe,
+             covers=['calculate_meal_requirements']),
+        Case("calculate_plan_requirements (14 meals)", dm.calculate_plan_requirements, weekly_plan),
+        Case("get_available_grams", dm.get_available_grams),
+        Case("get_feasible_recipes (top 20)", lambda: dm.get_feasible_recipes(limit=20),
+             covers=['get_feasible_recipes']),
+        Case("get_feasible_recipes (cold)", lambda: (dm.invalidate_cache(), dm.get_feasible_recipes(limit=20)),
+             covers=['get_feasible_recipes'], heavy=True),
+        Case("optimize_meal_plan (7 days)", lambda: dm.optimize_meal_plan(4, num_days=7),
+             covers=['optimize_meal_plan'], heavy=True),
+        Case("optimize_meal_plan (from stock)", lambda: dm.optimize_meal_plan(2, vegie_only=True),
+             covers=['optimize_meal_plan'], heavy=True),
+        Case("scripts/import_ingredients.py", quiet(lambda: run_script(import_ingredients, workbook, '--force')),
+             covers=[], heavy=True),
+        Case("scripts/import_recipes.py", quiet(lambda: run_script(import_recipes, workbook, '--force')),
+             covers=[], heavy=True),
+        Case("scripts/import_recipes.py (unchanged)", quiet(lambda: run_script(import_recipes, workbook)),
+             covers=[], heavy=True),
+        Case("scripts/clean_ingredients.py (review)", quiet(lambda: run_script(clean_ingredients, workbook)),
+             covers=[], heavy=True),
+    ]
+
+
+def measure(case: Case, repeat: int) -> Dict[str, float]:
+    """Time case repeat times, then record its peak memory in one traced run."""
+    timings = []
+    for _ in range(repeat):
+        args = case.setup()
+        start = time.perf_counter()
+        case.run(*args)
+        timings.append(time.perf_counter() - start)
+
+    args = case.setup()
+    tracemalloc.start()
+    try:
+        case.run(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'p50_ms': round(float(np.percentile(timings, 50)) * 1000, 3),
+        'p95_ms': round(float(np.percentile(timings, 95)) * 1000, 3),
+        'peak_kib': round(peak / 1024, 1),
+    }
+
+
+def make_backend(kind: str, directory: Path):
+    """Create a store of the given kind inside directory."""
+    if kind == 'sqlite':
+        return SqliteBackend(directory / "storage_data.db")
+    if kind == 'arrow':
+        return ArrowBackend(directory / "storage_data.arrow")
+    return JsonBackend(directory / "storage_data.json")
+
+
+def bench_scale(scale: str, backend: str, repeat: int, seed: int) -> Dict[str, Dict[str, float]]:
+    """Run all cases on a fresh store of the given scale."""
+    data = generate(SCALES[scale], seed)
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        directory = Path(directory)
+        workbook = directory / "source.xlsx"
+        write_workbook(workbook, data, IMPORT_SHEETS)
+
+        dm.set_backend(make_backend(backend, directory))
+        dm.save_data(data)
+
+        rng = random.Random(seed)
+        for case in make_cases(data, workbook, rng):
+            results[case.name] = measure(case, max(3, repeat // 5) if case.heavy else repeat)
+            print(f"  {case.name:<42} {results[case.name]['p50_ms']:>10.3f} ms")
+    return results
+
+
+def check_coverage() -> List[str]:
+    """Return public data_manager functions that no case times."""
+    covered = set()
+    for case in make_cases({'ingredients': [], 'recipes': [], 'categories': ['Other']}, Path(), random.Random()):
+        covered.update(case.covers)
+    public = [
+        name for name, func in inspect.getmembers(dm, inspect.isfunction)
+        if func.__module__ == dm.__name__ and not name.startswith('_')
+    ]
+    return [name for name in public if name not in covered and name not in NOT_TIMED]
+
+
+def print_report(results: Dict, baseline: Optional[Dict]) -> int:
+    """Print results per scale, compared with baseline; returns the number of regressions."""
+    regressions = 0
+    for scale, cases in results.items():
+        print(f"\n{scale}")
+        print(f"  {'operation':<42} {'p50 ms':>10} {'p95 ms':>10} {'peak KiB':>10} {'vs base':>8}")
+        for name, stats in cases.items():
+            change = ""
+            base = (baseline or {}).get(scale, {}).get(name)
+            if base and base['p50_ms'] > 0:
+                ratio = stats['p50_ms'] / base['p50_ms']
+                change = f"{ratio:.2f}x"
+                if ratio > REGRESSION_RATIO and stats['p50_ms'] - base['p50_ms'] > REGRESSION_MIN_MS:
+                    change += " !"
+                    regressions += 1
+            print(f"  {name:<42} {stats['p50_ms']:>10.3f} {stats['p95_ms']:>10.3f} "
+                  f"{stats['peak_kib']:>10.1f} {change:>8}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default="1k,10k,100k", help="comma-separated scales: " + ", ".join(SCALES))
+    parser.add_argument('--backend', choices=['json', 'sqlite', 'arrow'], default='json')
+    parser.add_argument('--repeat', type=int, default=20, help="timed runs per operation")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', type=Path, help="baseline file (default: baselines/<backend>.json)")
+    parser.add_argument('--save-baseline', action='store_true', help="store these results as the baseline")
+    args = parser.parse_args()
+
+    sizes = [size.strip() for size in args.sizes.split(',') if size.strip()]
+    unknown = [size for size in sizes if size not in SCALES]
+    if unknown:
+        parser.error(f"unknown sizes: {', '.join(unknown)}")
+    baseline_path = args.baseline or BASELINE_DIR / f"{args.backend}.json"
+
+    print("=" * 60)
+    print(f"Benchmarking data_manager ({args.backend}, {args.repeat} runs per operation)")
+    print("=" * 60)
+
+    uncovered = check_coverage()
+    if uncovered:
+        print(f"⚠ Not benchmarked: {', '.join(uncovered)}")
+
+    results = {}
+    for scale in sizes:
+        print(f"\nScale {scale}:")
+        results[scale] = bench_scale(scale, args.backend, args.repeat, args.seed)
+
+    baseline = None
+    if baseline_path.exists():
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    print("\n" + "=" * 60)
+    regressions = print_report(results, baseline)
+    print("=" * 60)
+    if baseline is None:
+        print(f"No baseline at {baseline_path}")
+    elif regressions:
+        print(f"{regressions} operation(s) more than {REGRESSION_RATIO:.2f}x slower than the baseline (marked !)")
+
+    if args.save_baseline:
+        # Keep other scales already in the baseline; sorted keys keep diffs small
+        merged = {**(baseline or {}), **results}
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(baseline_path, 'w', encoding='utf-8') as f:
+            json.dump(merged, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Saved baseline to {baseline_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,43 +1,43 @@
 #!/usr/bin/env python3
 """
 Clean up ingredient data: merge duplicates, fix categories, standardize names
+Duplicates are found automatically (misspellings, spacing, swapped letters);
+the proposed merges are only printed unless --apply is given
+
+Usage: python scripts/clean_ingredients.py [--apply]
 """
-import json
+import argparse
+import sys
 from pathlib import Path
 
-DATA_FILE = Path(__file__).parent.parent / "data" / "storage_data.json"
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import data_manager as dm
+import units
+from dedupe import choose_survivor, find_duplicate_clusters, recipe_usage
 
-# Define merging rules: duplicates that should be merged
-# Format: "name_to_keep": ["duplicate1", "duplicate2", ...]
-MERGE_DUPLICATES = {
-    "Carrots": ["Carottes", "Carotts"],
-    "Carrots julienne": ["Carotts julienne", "carottes cujulienne",],
+# Aliases the similarity check cannot detect (translations, extra words)
+# Format: "name_to_keep": ["alias1", "alias2", ...]
+# Typos and spelling variants need no entry here
+FORCED_MERGES = {
     "Carrot cubes": ["Karotten cut cubes"],
-    "Celery": [],
-    "Celery julienne": ["Sellerie julienne", "cellery julienne"],
-    "Coconut milk": ["Coconutmilk", "Kokosnussmilch"],
-    "Onions": [],  # Keep separate: Onions vs Onions TK
-    "Onions TK": ["Onion TK", "Zwiebeln tk"],
-    "Potatoes": [],
-    "Potatoes peeled": ["Potatoe peeled"],
+    "Celery julienne": ["Sellerie julienne"],
+    "Coconut milk": ["Kokosnussmilch"],
+    "Onions TK": ["Zwiebeln tk"],
     "Sweet potatoes": ["Sweet potatoe cut"],
     "Rice": ["Reis"],
     "Minced meat": ["minced meat Beef"],
-    "Red Wine": ["redwine"],
-    "Red Pepper": ["Paprika (rot/gelb) fresh", "red and yellow pepper"],
-    "Quinoa": ["quiona"],
-    "Coriander fresh": ["Koriander fresh", "coriander fresh"],
+    "Red Pepper (Paprika)": ["Red Pepper", "Paprika (rot/gelb) fresh", "red and yellow pepper"],
     "Chickpeas canned": ["Chickpeas in can"],
     "Sour cream": ["sourcream plain", "Sour Cream Eßlöffel"],
-    "Leek": ["Leach", "Lauch cut"],
+    "Leek (Lauch)": ["Leek", "Leach", "Lauch cut"],
 }
 
-# Define category corrections
+# Define category corrections; merged duplicates take their survivor's category
 # Format: "ingredient_name": "correct_category"
 CATEGORY_FIXES = {
     # Side dish
     "Rice": "Side dish",
-    "Reis": "Side dish",
     "Millet": "Side dish",
     "Quinoa": "Side dish",
     "Kidney Beans": "Side dish",
@@ -46,24 +46,14 @@ CATEGORY_FIXES = {
 
     # Vegetables
     "Carrots": "Vegetables",
-    "Carottes": "Vegetables",
-    "Carotts": "Vegetables",
     "Carrots julienne": "Vegetables",
-    "Carotts julienne": "Vegetables",
-    "Karotten cut cubes": "Vegetables",
-    "carottes cujulienne": "Vegetables",
+    "Carrot cubes": "Vegetables",
     "Celery": "Vegetables",
     "Celery julienne": "Vegetables",
-    "Sellerie julienne": "Vegetables",
-    "cellery julienne": "Vegetables",
-    "Leek": "Vegetables",
-    "Leach": "Vegetables",
-    "Lauch cut": "Vegetables",
+    "Leek (Lauch)": "Vegetables",
     "Cauliflower fresh": "Vegetables",
     "Mushrooms fresh": "Vegetables",
-    "Red Pepper": "Vegetables",
-    "Paprika (rot/gelb) fresh": "Vegetables",
-    "red and yellow pepper": "Vegetables",
+    "Red Pepper (Paprika)": "Vegetables",
     "Parsley": "Vegetables",
 
     # Dairy
@@ -71,14 +61,10 @@ CATEGORY_FIXES = {
     "Joghurt": "Dairy",
     "Parmesan grinded": "Dairy",
     "Coconut milk": "Dairy",
-    "Coconutmilk": "Dairy",
-    "Kokosnussmilch": "Dairy",
     "Sour cream": "Dairy",
-    "sourcream plain": "Dairy",
-    "Sour Cream Eßlöffel": "Dairy",
 
     # Spices
-    "!!!Tandoori masala spice!!!": "Spices",
+    "Tandoori masala spice": "Spices",
     "Ginger paste": "Spices",
     "Ginger": "Spices",
     "spice mixture": "Spices",
@@ -86,12 +72,9 @@ CATEGORY_FIXES = {
     "laurel": "Spices",
     "juniper": "Spices",
     "Coriander fresh": "Spices",
-    "Koriander fresh": "Spices",
-    "coriander fresh": "Spices",
 
     # Canned Goods
     "Chickpeas canned": "Canned Goods",
-    "Chickpeas in can": "Canned Goods",
 
     # Breatfast
     "Oatmeal (Haferflocken)": "Breakfast",
@@ -100,114 +83,124 @@ CATEGORY_FIXES = {
     "olive oil for dressing, lemon juice, mustard, apple juice, honey": "Other",
 }
 
-def normalize_name(name: str) -> str:
-    """Normalize ingredient name for comparison."""
-    return name.lower().strip()
-
-def load_data():
-    """Load data from JSON file."""
-    with open(DATA_FILE, 'r') as f:
-        return json.load(f)
-
-def save_data(data):
-    """Save data to JSON file."""
-    with open(DATA_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
-
-def clean_ingredients(data):
-    """Clean ingredient list: merge duplicates and fix categories."""
-    ingredients = data['ingredients']
-
-    # Build a map of normalized names to ingredients
-    name_to_ingredients = {}
-    for ing in ingredients:
-        norm_name = normalize_name(ing['name'])
-        if norm_name not in name_to_ingredients:
-            name_to_ingredients[norm_name] = []
-        name_to_ingredients[norm_name].append(ing)
-
-    # Build merge plan
-    merge_plan = {}  # Maps ingredient ID to keep ID
-    keep_ingredients = {}  # IDs of ingredients to keep
-
-    for keep_name, duplicate_names in MERGE_DUPLICATES.items():
-        # Find the ingredient to keep
-        norm_keep = normalize_name(keep_name)
-        keep_ing = None
-
-        # Try to find existing ingredient with this name
-        if norm_keep in name_to_ingredients:
-            keep_ing = name_to_ingredients[norm_keep][0]
-
-        # If not found, use the first duplicate as the keeper and rename it
-        if not keep_ing and duplicate_names:
-            for dup_name in duplicate_names:
-                norm_dup = normalize_name(dup_name)
-                if norm_dup in name_to_ingredients:
-                    keep_ing = name_to_ingredients[norm_dup][0]
-                    keep_ing['name'] = keep_name  # Rename to standard name
-                    break
-
-        if keep_ing:
-            keep_ingredients[keep_ing['id']] = keep_ing
-
-            # Mark duplicates for removal
-            for dup_name in duplicate_names:
-                norm_dup = normalize_name(dup_name)
-                if norm_dup in name_to_ingredients:
-                    for dup_ing in name_to_ingredients[norm_dup]:
-                        if dup_ing['id'] != keep_ing['id']:
-                            merge_plan[dup_ing['id']] = keep_ing['id']
-                            print(f"Merging: '{dup_ing['name']}' (ID {dup_ing['id']}) → '{keep_name}' (ID {keep_ing['id']})")
-
-    # Remove duplicates
-    cleaned_ingredients = []
-    removed_count = 0
-
-    for ing in ingredients:
-        if ing['id'] in merge_plan:
-            # This is a duplicate, skip it
-            removed_count += 1
-            continue
-
-        # Fix category if needed
-        if ing['name'] in CATEGORY_FIXES:
-            old_category = ing['category']
-            new_category = CATEGORY_FIXES[ing['name']]
-            if old_category != new_category:
-                ing['category'] = new_category
-                print(f"Fixed category: '{ing['name']}' {old_category} → {new_category}")
 
-        cleaned_ingredients.append(ing)
-
-    # Re-number IDs to be sequential
-    for idx, ing in enumerate(cleaned_ingredients, start=1):
-        ing['id'] = idx
-
-    data['ingredients'] = cleaned_ingredients
+def plan_merges(data):
+    """Find duplicate clusters and decide which ingredient each one keeps.
+
+    Returns a list of (survivor, new_name, duplicates, unconvertible) per
+    cluster. Unconvertible duplicates have stock in a measurement that cannot
+    be converted to the survivor's (pieces without a weight); they are not
+    merged, so their stock is not lost.
+    """
+    usage = recipe_usage(data['recipes'])
+    plan = []
+    for cluster in find_duplicate_clusters(data['ingredients'], FORCED_MERGES):
+        survivor, new_name = choose_survivor(cluster, usage, FORCED_MERGES)
+        duplicates, unconvertible = [], []
+        for ing in cluster:
+            if ing['id'] == survivor['id']:
+                continue
+            if ing.get('amount') and units.convert(ing['amount'], ing, survivor) is None:
+                unconvertible.append(ing)
+            else:
+                duplicates.append(ing)
+        plan.append((survivor, new_name, duplicates, unconvertible))
+    return plan
+
+
+def describe_stock_move(duplicate, survivor):
+    """How the duplicate's stock is added to the survivor, if the measurements differ."""
+    if not duplicate.get('amount') or duplicate.get('measurement') == survivor.get('measurement'):
+        return ""
+    converted = units.convert(duplicate['amount'], duplicate, survivor)
+    return (f" (stock {duplicate['amount']:g} {duplicate.get('measurement', 'pieces')}"
+            f" → {converted:g} {survivor.get('measurement', 'pieces')})")
+
+
+def plan_category_fixes(data, merged_ids, new_names=None):
+    """Return (ingredient, new_category) for ingredients in the wrong category.
+
+    new_names maps ids of merge survivors to the name they are renamed to,
+    which is the name their fix is looked up by.
+    """
+    new_names = new_names or {}
+    fixes = {dm.normalize_name(name): category for name, category in CATEGORY_FIXES.items()}
+    result = []
+    for ing in data['ingredients']:
+        if ing['id'] in merged_ids:
+            continue
+        category = fixes.get(dm.normalize_name(new_names.get(ing['id']) or ing['name']))
+        if category and ing['category'] != category:
+            result.append((ing, category))
+    return result
+
+
+def clean_ingredients(data, apply=False):
+    """Merge duplicates and fix categories; only reports unless apply is set."""
+    merge_plan = plan_merges(data)
+    merged_ids = {dup['id'] for _, _, duplicates, _ in merge_plan for dup in duplicates}
+    unconvertible_count = sum(len(unconvertible) for *_, unconvertible in merge_plan)
+
+    for survivor, new_name, duplicates, unconvertible in merge_plan:
+        target = new_name or survivor['name']
+        for dup in duplicates:
+            print(f"Merging: '{dup['name']}' (ID {dup['id']}) → '{target}' (ID {survivor['id']})"
+                  f"{describe_stock_move(dup, survivor)}")
+        for dup in unconvertible:
+            print(f"⚠ Not merging: '{dup['name']}' (ID {dup['id']}) into '{target}' (ID {survivor['id']}) - "
+                  f"{dup['amount']:g} {dup.get('measurement', 'pieces')} cannot be converted to "
+                  f"{survivor.get('measurement', 'pieces')}; set a weight per piece or merge by hand")
+        if new_name:
+            print(f"Renaming: '{survivor['name']}' (ID {survivor['id']}) → '{new_name}'")
+
+    new_names = {survivor['id']: new_name for survivor, new_name, _, _ in merge_plan if new_name}
+    category_fixes = plan_category_fixes(data, merged_ids, new_names)
+    for ing, category in category_fixes:
+        print(f"Fixed category: '{new_names.get(ing['id'], ing['name'])}' {ing['category']} → {category}")
+
+    if apply:
+        # One transaction: recipes are re-pointed and duplicates removed together
+        with dm.transaction():
+            for survivor, new_name, _, _ in merge_plan:
+                if new_name:
+                    dm.update_ingredient(survivor['id'], name=new_name)
+            for ing, category in category_fixes:
+                dm.update_ingredient(ing['id'], category=category)
+            result = dm.merge_ingredients({
+                dup['id']: survivor['id'] for survivor, _, duplicates, _ in merge_plan for dup in duplicates
+            })
+        recipes_updated = result['recipes_updated']
 
     print(f"\n{'='*60}")
-    print(f"Removed {removed_count} duplicate ingredients")
-    print(f"Final ingredient count: {len(cleaned_ingredients)}")
+    if apply:
+        print(f"Removed {len(merged_ids)} duplicate ingredients")
+        print(f"Recipes pointed at surviving ingredients: {recipes_updated}")
+        print(f"Final ingredient count: {len(dm.get_ingredients())}")
+    else:
+        print(f"Found {len(merged_ids)} duplicate ingredients in {len(merge_plan)} clusters")
+        if unconvertible_count:
+            print(f"Not mergeable (stock in another measurement): {unconvertible_count}")
+        print(f"Category fixes: {len(category_fixes)}")
+        print("Review only - run with --apply to make these changes")
     print(f"{'='*60}")
 
-    return data
 
 def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--apply', action='store_true', help="merge duplicates and fix categories")
+    args = parser.parse_args()
+
     print("="*60)
     print("Cleaning ingredient data...")
     print("="*60)
 
-    # Load data
-    data = load_data()
+    data = dm.load_data()
     print(f"Original ingredient count: {len(data['ingredients'])}\n")
 
-    # Clean ingredients
-    data = clean_ingredients(data)
+    clean_ingredients(data, apply=args.apply)
 
-    # Save cleaned data
-    save_data(data)
-    print("\nCleaned data saved to storage_data.json")
+    if args.apply:
+        print("\nCleaned data saved")
 
 if __name__ == "__main__":
     main()
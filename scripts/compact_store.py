@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Fold the journal of the active store (STORAGE_BACKEND=json/arrow) into its snapshot
+Run it before copying, committing or deploying data/storage_data.json, which on
+its own misses the edits still in data/storage_data.journal.
+Usage: python scripts/compact_store.py
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import data_manager as dm
+
+
+def main():
+    print("=" * 60)
+    print(f"Compacting {dm.STORAGE_BACKEND} storage...")
+    print("=" * 60)
+
+    if dm.compact():
+        print("\nJournal folded into the snapshot")
+    else:
+        print("\nNo journal - the snapshot is already complete")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
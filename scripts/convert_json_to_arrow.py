@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Convert storage_data.json into the Arrow store (storage_data.arrow/)
+Run once, then start the app with STORAGE_BACKEND=arrow
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import data_manager as dm
+from storage_backends import ArrowBackend, JsonBackend
+
+
+def main():
+    print("=" * 60)
+    print("Converting JSON storage to Arrow...")
+    print("=" * 60)
+
+    if not dm.DATA_FILE.exists():
+        print(f"No JSON file found at {dm.DATA_FILE}")
+        return
+
+    if dm.ARROW_DIR.exists():
+        print(f"{dm.ARROW_DIR} already exists - delete it first to re-convert")
+        return
+
+    data = JsonBackend(dm.DATA_FILE).read()
+    data, _ = dm.migrate_data(data)
+
+    ArrowBackend(dm.ARROW_DIR).write(data)
+
+    print(f"\nIngredients: {len(data['ingredients'])}")
+    print(f"Recipes: {len(data['recipes'])}")
+    print(f"Saved to {dm.ARROW_DIR}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Convert storage_data.json into the SQLite store (storage_data.db)
+Run once, then start the app with STORAGE_BACKEND=sqlite
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import data_manager as dm
+from storage_backends import JsonBackend, SqliteBackend
+
+
+def fix_duplicate_ids(items: list, label: str) -> None:
+    """Give items that share an ID a new unique ID (SQLite needs unique keys)."""
+    seen = set()
+    next_id = max((item['id'] for item in items), default=0) + 1
+    for item in items:
+        if item['id'] in seen:
+            print(f"⚠ Duplicate {label} ID {item['id']} ('{item['name']}') → ID {next_id}")
+            item['id'] = next_id
+            next_id += 1
+        seen.add(item['id'])
+
+
+def main():
+    print("=" * 60)
+    print("Converting JSON storage to SQLite...")
+    print("=" * 60)
+
+    if not dm.DATA_FILE.exists():
+        print(f"No JSON file found at {dm.DATA_FILE}")
+        return
+
+    if dm.DB_FILE.exists():
+        print(f"{dm.DB_FILE} already exists - delete it first to re-convert")
+        return
+
+    data = JsonBackend(dm.DATA_FILE).read()
+    data, _ = dm.migrate_data(data)
+
+    fix_duplicate_ids(data['ingredients'], 'ingredient')
+    fix_duplicate_ids(data['recipes'], 'recipe')
+
+    SqliteBackend(dm.DB_FILE).write(data)
+
+    print(f"\nIngredients: {len(data['ingredients'])}")
+    print(f"Recipes: {len(data['recipes'])}")
+    print(f"Saved to {dm.DB_FILE}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
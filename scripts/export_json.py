@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+Export the active store (STORAGE_BACKEND=json/sqlite/arrow) as one JSON document
+Usage: python scripts/export_json.py [output.json]   (default: storage_data.export.json)
+"""
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import data_manager as dm
+from storage_backends import atomic_write_json
+
+
+def main():
+    output = Path(sys.argv[1]) if len(sys.argv) > 1 else dm.DATA_FILE.with_suffix('.export.json')
+
+    print("=" * 60)
+    print(f"Exporting {dm.STORAGE_BACKEND} storage to JSON...")
+    print("=" * 60)
+
+    data = dm.load_data()
+    atomic_write_json(output, data)
+
+    print(f"\nIngredients: {len(data['ingredients'])}")
+    print(f"Recipes: {len(data['recipes'])}")
+    print(f"Saved to {output}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,21 @@
 #!/usr/bin/env python3
 """
 Import ingredients from Excel file (source.xlsx) into storage_data.json
+Sheets that are unchanged since the last import are skipped (use --force to re-import)
 """
-import json
+import argparse
+import sys
+from itertools import islice
 from pathlib import Path
-from openpyxl import load_workbook
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import data_manager as dm
+from excel_import import iter_sheets
+from keyword_matcher import KeywordMatcher
 
 DATA_DIR = Path(__file__).parent.parent / "data"
 EXCEL_FILE = DATA_DIR / "source.xlsx"
-JSON_FILE = DATA_DIR / "storage_data.json"
 
 # Category mapping based on keywords
 CATEGORY_KEYWORDS = {
@@ -19,7 +26,7 @@ CATEGORY_KEYWORDS = {
               "mango", "strawberry", "blueberry", "raspberry", "lemon", "lime", "pineapple"],
     "Meat": ["beef", "chicken", "pork", "lamb", "turkey", "fish", "salmon", "tuna",
             "steak", "bacon", "sausage", "ham", "meat", "fleisch"],
-    "Dairy": ["milk", "cheese", "yogurt", "butter", "cream", "eggs", "egg", "ei",
+    "Dairy": ["milk", "cheese", "yogurt", "butter", "cream", "eggs", "egg", "ei", "eier",
              "käse", "milch", "sahne"],
     "Grains": ["rice", "pasta", "bread", "flour", "oats", "quinoa", "wheat", "noodle",
               "spaghetti", "couscous", "bulgur", "reis", "mehl"],
@@ -32,6 +39,21 @@ CATEGORY_KEYWORDS = {
     "Other": []
 }
 
+# When keywords of several categories match, the first category in this list
+# wins: "Onions TK" is Frozen, not Vegetables. Remaining categories follow in
+# CATEGORY_KEYWORDS order.
+CATEGORY_PRIORITY = ["Frozen", "Canned Goods"]
+
+# Short keywords that only match as whole words ("tk" in "Onions TK",
+# "ham" but not "champignons", "ei" but not "reis")
+WHOLE_WORD_KEYWORDS = ["tk", "ei", "ham", "tea", "jar", "dose", "sage"]
+
+CATEGORY_MATCHER = KeywordMatcher(
+    {category: keywords for category, keywords in CATEGORY_KEYWORDS.items() if category != "Other"},
+    priority=CATEGORY_PRIORITY,
+    whole_word=WHOLE_WORD_KEYWORDS
+)
+
 # Unit mapping to simplified measurements
 UNIT_MAPPING = {
     'kg': 'kg', 'kilogram': 'kg', 'g': 'kg', 'gram': 'kg', 'grams': 'kg',
@@ -52,158 +74,107 @@ def map_unit_to_measurement(unit: str) -> str:
 
 def smart_map_category(name: str) -> str:
     """Smart category mapping based on ingredient name."""
-    name_lower = name.lower()
-    for category, keywords in CATEGORY_KEYWORDS.items():
-        if category == "Other":
-            continue
-        if any(keyword in name_lower for keyword in keywords):
-            return category
-    return "Other"  # Default category
-
-
-def load_json_data() -> dict:
-    """Load existing storage data."""
-    if JSON_FILE.exists():
-        with open(JSON_FILE, 'r') as f:
-            return json.load(f)
-    return {
-        "ingredients": [],
-        "recipes": [],
-        "categories": [
-            "Vegetables", "Fruits", "Meat", "Dairy", "Grains",
-            "Spices", "Beverages", "Canned Goods", "Frozen", "Other"
-        ],
-        "units": ["kg", "liter", "pieces"]
-    }
-
-
-def save_json_data(data: dict):
-    """Save storage data to JSON."""
-    with open(JSON_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
+    return CATEGORY_MATCHER.match(name, default="Other")
 
 
-def get_next_ingredient_id(data: dict) -> int:
-    """Get the next available ingredient ID."""
-    if not data['ingredients']:
-        return 1
-    return max(ing['id'] for ing in data['ingredients']) + 1
+def smart_map_categories(names: list) -> list:
+    """Map a batch of ingredient names to categories."""
+    return CATEGORY_MATCHER.match_many(names, default="Other")
 
 
-def read_excel_ingredients():
-    """Read ingredients from all sheets in Excel file."""
-    wb = load_workbook(EXCEL_FILE, read_only=True)
-
-    ingredients = []
-    seen_names = set()  # Track unique ingredients across all sheets
-
-    # Process all sheets
-    for sheet_name in wb.sheetnames:
-        sheet = wb[sheet_name]
-        print(f"Reading sheet: {sheet_name}")
-
-        # Read data rows (starting from row 7)
-        row_count = 0
-        for row in sheet.iter_rows(min_row=7, values_only=True):
-            # Column A (index 0) = ingredient name
-            # Column C (index 2) = unit
-            if not row or not row[0]:  # Skip empty rows or rows without ingredient name
-                continue
-
-            name = str(row[0]).strip()
-
-            # Skip invalid entries
-            if name.lower() in ['none', '', 'as usual'] or name == 'None':
-                continue
-
-            # Skip duplicates (case-insensitive)
-            if name.lower() in seen_names:
-                continue
-
-            seen_names.add(name.lower())
-            row_count += 1
-
-            # Column C = unit (handle None)
-            unit = row[2] if len(row) > 2 and row[2] else 'pieces'
+def parse_ingredient_rows(rows):
+    """Yield (name, unit) for the ingredient rows of a sheet (data starts at row 7)."""
+    for row in islice(rows, 6, None):
+        # Column A (index 0) = ingredient name
+        # Column C (index 2) = unit
+        if not row or not row[0]:  # Skip empty rows or rows without ingredient name
+            continue
 
-            ingredients.append({
-                'name': name,
-                'unit': unit,
-                'category': None  # Will use smart mapping
-            })
+        name = str(row[0]).strip()
 
-        print(f"  Found {row_count} unique ingredients in this sheet")
+        # Skip invalid entries
+        if name.lower() in ['none', '', 'as usual'] or name == 'None':
+            continue
 
-    print(f"\nExtracted {len(ingredients)} unique ingredients from {len(wb.sheetnames)} sheets")
-    return ingredients
+        # Column C = unit (handle None)
+        unit = row[2] if len(row) > 2 and row[2] else 'pieces'
+        yield name, unit
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Import ingredients from source.xlsx")
+    parser.add_argument('--force', action='store_true', help="re-import sheets even if unchanged")
+    parser.add_argument('--jobs', type=int, default=None, help="parallel sheet readers (default: CPU count)")
+    args = parser.parse_args()
+
     print("=" * 60)
     print("Starting ingredient import from Excel...")
     print("=" * 60)
 
-    # Load existing data
-    data = load_json_data()
-    existing_names = {ing['name'].lower() for ing in data['ingredients']}
-    print(f"\nCurrent ingredients in storage: {len(data['ingredients'])}")
+    import_hashes = dm.get_meta('import_hashes', {})
+    known_hashes = {} if args.force else import_hashes.get('ingredients', {})
+    print(f"\nCurrent ingredients in storage: {len(dm.get_ingredients())}")
 
-    # Read Excel
-    excel_ingredients = read_excel_ingredients()
-
-    # Import new ingredients
     added = 0
     skipped = 0
-    next_id = get_next_ingredient_id(data)
-
-    print(f"\n{'=' * 60}")
-    print("Processing ingredients...")
-    print("=" * 60)
-
-    for excel_ing in excel_ingredients:
-        name = excel_ing['name']
-
-        # Skip duplicates
-        if name.lower() in existing_names:
-            print(f"⊘ Skipping '{name}' (already exists)")
-            skipped += 1
-            continue
-
-        # Map measurement
-        measurement = map_unit_to_measurement(excel_ing['unit'])
-
-        # Smart category mapping
-        category = excel_ing['category'] if excel_ing['category'] else smart_map_category(name)
-
-        # Add ingredient
-        ingredient = {
-            'id': next_id,
-            'name': name,
-            'category': category,
-            'measurement': measurement,
-            'amount': 1.0
-        }
+    unchanged_sheets = 0
+    seen_names = set()  # Track unique ingredients across all sheets
+    sheet_hashes = dict(import_hashes.get('ingredients', {}))
+
+    # One transaction: all sheets are committed with a single write
+    with dm.transaction():
+        for sheet_name, content_hash, rows in iter_sheets(EXCEL_FILE, known_hashes, args.jobs):
+            print(f"\nReading sheet: {sheet_name}")
+            if rows is None:
+                print("  ⊘ Unchanged since last import")
+                unchanged_sheets += 1
+                continue
 
-        data['ingredients'].append(ingredient)
-        print(f"✓ Added: {name} ({category}, {measurement}, 1.0)")
-        added += 1
-        next_id += 1
+            sheet_rows = []
+            for name, unit in parse_ingredient_rows(rows):
+                # Skip duplicates (case-insensitive)
+                if name.lower() in seen_names:
+                    continue
+                seen_names.add(name.lower())
+                sheet_rows.append((name, unit))
+
+            categories = smart_map_categories([name for name, _ in sheet_rows])
+            new_ingredients = [
+                {
+                    'name': name,
+                    'category': category,
+                    'measurement': map_unit_to_measurement(unit),
+                    'amount': 1.0
+                }
+                for (name, unit), category in zip(sheet_rows, categories)
+            ]
+
+            with dm.stock_source('import', reason=f"{EXCEL_FILE.name}: {sheet_name}"):
+                result = dm.upsert_ingredients(new_ingredients, update_existing=False)
+            for ing in result['added']:
+                print(f"✓ Added: {ing['name']} ({ing['category']}, {ing['measurement']}, 1.0)")
+            for ing in result['skipped']:
+                print(f"⊘ Skipping '{ing['name']}' (already exists)")
+            added += len(result['added'])
+            skipped += len(result['skipped'])
+            sheet_hashes[sheet_name] = content_hash
+
+        if sheet_hashes != import_hashes.get('ingredients', {}):
+            dm.set_meta('import_hashes', {**import_hashes, 'ingredients': sheet_hashes})
 
-    # Save updated data
+    print(f"\n{'=' * 60}")
     if added > 0:
-        save_json_data(data)
-        print(f"\n{'=' * 60}")
-        print("Saved updated data to storage_data.json")
+        print("Saved updated data")
     else:
-        print(f"\n{'=' * 60}")
-        print("No new ingredients to add - no changes made")
+        print("No new ingredients to add")
 
     print("=" * 60)
     print("\n=== IMPORT SUMMARY ===")
-    print(f"Total unique ingredients in Excel: {len(excel_ingredients)}")
+    print(f"Unique ingredients in changed sheets: {len(seen_names)}")
+    print(f"Unchanged sheets skipped: {unchanged_sheets}")
     print(f"Added: {added}")
     print(f"Skipped (duplicates): {skipped}")
-    print(f"Total ingredients in storage: {len(data['ingredients'])}")
+    print(f"Total ingredients in storage: {len(dm.get_ingredients())}")
     print("=" * 60)
 
 
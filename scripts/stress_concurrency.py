@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Stress test concurrent writers against a scratch copy of the store
+Many processes increment ingredient amounts at the same time; the final
+amounts must equal the number of increments, i.e. no update may be lost.
+
+Usage: python scripts/stress_concurrency.py [--backend json|sqlite] [--workers 8] [--increments 200]
+"""
+import argparse
+import multiprocessing
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+import data_manager as dm
+from storage_backends import JsonBackend, SqliteBackend
+
+NUM_INGREDIENTS = 5
+
+
+def make_backend(kind: str, directory: Path):
+    """Create the backend under test inside directory."""
+    if kind == 'sqlite':
+        return SqliteBackend(directory / "storage_data.db")
+    return JsonBackend(directory / "storage_data.json", compact_bytes=16 * 1024)
+
+
+def writer(kind: str, directory: str, worker_id: int, increments: int) -> int:
+    """Increment random ingredients; returns the number of conflicts retried."""
+    dm.set_backend(make_backend(kind, Path(directory)))
+    rng = random.Random(worker_id)
+    conflicts = 0
+
+    for i in range(increments):
+        ing_id = rng.randint(1, NUM_INGREDIENTS)
+
+        if i % 2 == 0:
+            # Optimistic: read, then update with the revision we saw
+            while True:
+                ing = dm.get_ingredient(ing_id)
+                try:
+                    dm.update_ingredient(ing_id, expected_revision=ing['revision'], amount=ing['amount'] + 1)
+                    break
+                except dm.ConflictError:
+                    conflicts += 1
+        else:
+            # Pessimistic: read-modify-write inside a locked transaction
+            with dm.transaction():
+                ing = dm.get_ingredient(ing_id)
+                dm.update_ingredient(ing_id, amount=ing['amount'] + 1)
+
+    return conflicts
+
+
+def reader(kind: str, directory: str, stop_at: float) -> int:
+    """Reload the store from disk until stop_at; returns the number of reads."""
+    dm.set_backend(make_backend(kind, Path(directory)))
+    reads = 0
+    while time.time() < stop_at:
+        dm.invalidate_cache()
+        data = dm.load_data()
+        assert len(data['ingredients']) == NUM_INGREDIENTS, "reader saw an incomplete store"
+        reads += 1
+    return reads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', choices=['json', 'sqlite'], default='json')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--increments', type=int, default=200)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print(f"Stress test: {args.workers} writers x {args.increments} increments ({args.backend})")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as directory:
+        dm.set_backend(make_backend(args.backend, Path(directory)))
+        for i in range(NUM_INGREDIENTS):
+            dm.add_ingredient(f"Ingredient {i + 1}", "Other", "pieces", 0)
+
+        start = time.time()
+        with multiprocessing.Pool(args.workers + 1) as pool:
+            reads = pool.apply_async(reader, (args.backend, directory, start + 2))
+            results = [
+                pool.apply_async(writer, (args.backend, directory, worker_id, args.increments))
+                for worker_id in range(args.workers)
+            ]
+            conflicts = sum(result.get() for result in results)
+            reads = reads.get()
+        elapsed = time.time() - start
+
+        dm.invalidate_cache()
+        total = sum(ing['amount'] for ing in dm.get_ingredients())
+
+    expected = args.workers * args.increments
+    print(f"Increments applied: {total:.0f} / {expected}")
+    print(f"Conflicts detected and retried: {conflicts}")
+    print(f"Concurrent full reloads: {reads}")
+    print(f"Elapsed: {elapsed:.2f}s")
+    print("=" * 60)
+
+    if total != expected:
+        print("FAILED: updates were lost")
+        sys.exit(1)
+    print("OK: no lost updates")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,120 @@
-import json
+import atexit
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from functools import wraps
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+import instrumentation
+import lots
+import meal_planning
+import plan_optimizer
+import stock_ledger
+import units
+from instrumentation import instrument
+from inventory_index import InventoryIndex
+from lots import ExpiryIndex
+from name_index import NameIndex, normalize_name
+from search_index import SearchIndex
+from stock_alerts import StockAlerts
+from storage_backends import ArrowBackend, Change, JsonBackend, SqliteBackend, replay_changes
+
+try:
+    import fcntl
+except ImportError:  # Windows: only in-process locking
+    fcntl = None
 
 DATA_FILE = Path(__file__).parent.parent / "data" / "storage_data.json"
+DB_FILE = DATA_FILE.with_suffix('.db')
+ARROW_DIR = DATA_FILE.with_suffix('.arrow')
+
+# Storage backend: "json" (default), "sqlite" or "arrow"
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'json')
+
+# Seconds of quiet before write-behind mode flushes; 0 writes every mutation
+# through (see set_write_behind)
+WRITE_BEHIND_DELAY = float(os.environ.get('WRITE_BEHIND_DELAY', '0'))
+
+_backend = None
+
+# Parsed snapshot of the store, reused until the backend reports a change on
+# disk. For files the key is (mtime_ns, size, inode), so edits from other
+# processes are picked up.
+_snapshot: Optional[Dict] = None
+_snapshot_key: Optional[Tuple] = None
+
+# Bumped whenever the snapshot is replaced or mutated; see get_data_version()
+_data_version = 0
+
+# Id -> entity indexes for the snapshot object they were built from. Rebuilt
+# when a different snapshot is loaded and kept current by _commit().
+_indexed_snapshot: Optional[Dict] = None
+_ingredients_by_id: Dict[int, Dict] = {}
+_recipes_by_id: Dict[int, Dict] = {}
+
+# Ingredient name index (exact + trigram), built on first name lookup
+_ingredient_names: Optional[NameIndex] = None
+
+# Ingredients sorted by name (overall and per category) for paginated listings
+_inventory: Optional[InventoryIndex] = None
+
+# Full-text index over ingredients and recipes, built on first search
+_search_index: Optional[SearchIndex] = None
+
+# Ingredients below their min_stock, built on first use
+_stock_alerts: Optional[StockAlerts] = None
+
+# Dated stock lots sorted by expiry date, built on first use
+_lots_by_expiry: Optional[ExpiryIndex] = None
+
+# Stock expiring within this many days is what meal planning tries to use up
+EXPIRING_SOON_DAYS = 3
+
+# Recipe x ingredient matrix for meal plans, built from the indexed snapshot
+# on first use and dropped whenever the data changes.
+_requirement_matrix: Optional[meal_planning.RequirementMatrix] = None
+
+# Serializes mutations across Streamlit session threads. A transaction holds
+# it until commit, and _pending collects the changes made by the thread
+# _pending_owner; _pending_sources keeps the stock_source each changed
+# ingredient had when it was changed, for the ledger at commit.
+_lock = threading.RLock()
+_pending: Optional[List[Change]] = None
+_pending_owner: Optional[int] = None
+_pending_sources: Dict[int, Tuple[str, str]] = {}
+
+# Advisory lock file shared with other processes, held while _lock_depth > 0
+_lock_file = None
+_lock_depth = 0
+
+# Write-behind mode: committed changes not yet handed to the backend, and when
+# the first and the latest of them were made. The flusher thread waits on
+# _flush_signal, which is never held while taking _lock.
+_write_behind_delay = WRITE_BEHIND_DELAY
+_write_behind_max_wait = 4 * WRITE_BEHIND_DELAY
+_unflushed: List[Change] = []
+# Revision each entity with unflushed changes had in the store before the
+# first of them (0 if it did not exist), keyed by (kind, id)
+_unflushed_base: Dict[Tuple[str, int], int] = {}
+_unflushed_first: Optional[float] = None
+_unflushed_last: Optional[float] = None
+_flush_signal = threading.Condition()
+_flush_thread: Optional[threading.Thread] = None
+
+# Stock movement history next to the active backend's store, and the source
+# and reason this thread's stock changes are recorded with (see stock_source)
+_ledger: Optional[stock_ledger.StockLedger] = None
+_stock_context = threading.local()
+
+
+class ConflictError(Exception):
+    """Raised when an entity was changed by someone else since it was read."""
 
 
 def migrate_ingredient_data(data: Dict) -> Dict:
@@ -70,10 +182,278 @@ def migrate_ingredient_data(data: Dict) -> Dict:
     return data
 
 
+# Current layout of storage_data.json. Bump this and append a step to
+# MIGRATIONS whenever the stored structure changes.
+SCHEMA_VERSION = 1
+
+# Ordered (target_version, step) pairs. A step runs only when the stored
+# schema_version is below its target version.
+MIGRATIONS: List[Tuple[int, Callable[[Dict], Dict]]] = [
+    (1, migrate_ingredient_data),
+]
+
+
+def migrate_data(data: Dict) -> Tuple[Dict, bool]:
+    """Run pending migration steps in order.
+
+    A step may change data in place or return a new document. Returns (the
+    migrated document, whether any step ran); use the returned document.
+    """
+    version = data.get('schema_version', 0)
+    if version >= SCHEMA_VERSION:
+        return data, False
+
+    for target_version, step in MIGRATIONS:
+        if version < target_version:
+            data = step(data)
+            version = target_version
+
+    data['schema_version'] = version
+    return data, True
+
+
+def get_backend():
+    """Return the active storage backend, creating it on first use."""
+    global _backend
+    if _backend is None:
+        if STORAGE_BACKEND == 'sqlite':
+            _backend = SqliteBackend(DB_FILE)
+        elif STORAGE_BACKEND == 'json':
+            _backend = JsonBackend(DATA_FILE)
+        elif STORAGE_BACKEND == 'arrow':
+            _backend = ArrowBackend(ARROW_DIR)
+        else:
+            raise ValueError(f"Unknown storage backend: {STORAGE_BACKEND}")
+    return _backend
+
+
+def set_backend(backend) -> None:
+    """Use a specific storage backend instance (e.g. SqliteBackend(path))."""
+    global _backend, _ledger
+    flush()
+    _backend = backend
+    _ledger = None
+    invalidate_cache()
+
+
+def _set_snapshot(data: Dict, key: Optional[Tuple]) -> None:
+    """Cache data as the current snapshot and bump the data version."""
+    global _snapshot, _snapshot_key, _data_version
+    _snapshot, _snapshot_key = data, key
+    _data_version += 1
+
+
+def get_data_version() -> int:
+    """Return a token that changes whenever the stored data changes.
+
+    Suitable as a cache key for derived views (e.g. st.cache_data), since it
+    also changes when another process modifies the store.
+    """
+    load_data()
+    return _data_version
+
+
+def invalidate_cache() -> None:
+    """Drop the cached snapshot so the next load_data() re-reads the file."""
+    global _snapshot, _snapshot_key, _indexed_snapshot
+    flush()
+    _snapshot = None
+    _snapshot_key = None
+    _indexed_snapshot = None
+
+
+def _indexes(data: Dict) -> Tuple[Dict[int, Dict], Dict[int, Dict]]:
+    """Return (ingredients_by_id, recipes_by_id) for data, building them if needed."""
+    global _indexed_snapshot, _ingredients_by_id, _recipes_by_id, _requirement_matrix
+    global _ingredient_names, _inventory, _search_index, _stock_alerts, _lots_by_expiry
+    # Built and published under _lock: writers hold it while they change
+    # data and patch the indexes, so a build never sees a half-done change
+    # and never replaces an index patched after it started. Same for the
+    # lazy indexes below.
+    with _lock:
+        if data is not _indexed_snapshot:
+            instrumentation.count('indexes.rebuild')
+            # setdefault keeps the first entity for duplicated ids, like a linear scan would
+            _ingredients_by_id = {}
+            for ing in data['ingredients']:
+                _ingredients_by_id.setdefault(ing['id'], ing)
+            _recipes_by_id = {}
+            for recipe in data['recipes']:
+                _recipes_by_id.setdefault(recipe['id'], recipe)
+            _indexed_snapshot = data
+            _requirement_matrix = None
+            _ingredient_names = None
+            _inventory = None
+            _search_index = None
+            _stock_alerts = None
+            _lots_by_expiry = None
+        return _ingredients_by_id, _recipes_by_id
+
+
+def _name_index(data: Dict) -> NameIndex:
+    """Return the ingredient name index for data, building it if needed."""
+    global _ingredient_names
+    with _lock:
+        ingredients_by_id = _indexes(data)[0]
+        if _ingredient_names is None:
+            instrumentation.count('name_index.rebuild')
+            _ingredient_names = NameIndex(ingredients_by_id.values())
+        return _ingredient_names
+
+
+def _inventory_index(data: Dict) -> InventoryIndex:
+    """Return the sorted ingredient listing for data, building it if needed."""
+    global _inventory
+    with _lock:
+        ingredients_by_id = _indexes(data)[0]
+        if _inventory is None:
+            instrumentation.count('inventory_index.rebuild')
+            _inventory = InventoryIndex(ingredients_by_id.values())
+        return _inventory
+
+
+def _full_text_index(data: Dict) -> SearchIndex:
+    """Return the full-text index for data, building it if needed."""
+    global _search_index
+    with _lock:
+        ingredients_by_id, recipes_by_id = _indexes(data)
+        if _search_index is None:
+            instrumentation.count('search_index.rebuild')
+            _search_index = SearchIndex()
+            _search_index.add_many('ingredient', ingredients_by_id.values())
+            _search_index.add_many('recipe', recipes_by_id.values())
+        return _search_index
+
+
+def _low_stock_index(data: Dict) -> StockAlerts:
+    """Return the low-stock alerts for data, building them if needed."""
+    global _stock_alerts
+    with _lock:
+        ingredients_by_id = _indexes(data)[0]
+        if _stock_alerts is None:
+            instrumentation.count('stock_alerts.rebuild')
+            _stock_alerts = StockAlerts(ingredients_by_id.values())
+        return _stock_alerts
+
+
+def _expiry_index(data: Dict) -> ExpiryIndex:
+    """Return the lots of data sorted by expiry date, building them if needed."""
+    global _lots_by_expiry
+    with _lock:
+        ingredients_by_id = _indexes(data)[0]
+        if _lots_by_expiry is None:
+            instrumentation.count('expiry_index.rebuild')
+            _lots_by_expiry = ExpiryIndex(ingredients_by_id.values())
+        return _lots_by_expiry
+
+
+def _update_indexes(data: Dict, changes: List[Change]) -> None:
+    """Apply changes to the id indexes if they were built for data."""
+    global _requirement_matrix
+    if data is not _indexed_snapshot:
+        return
+    for kind, op, payload in changes:
+        if kind in ('ingredient', 'recipe') and _requirement_matrix is not None:
+            # Stock changes patch the stock vector; anything else changes the shape
+            if not (kind == 'ingredient' and op == 'put' and _requirement_matrix.update_stock(payload)):
+                _requirement_matrix = None
+        if kind == 'ingredient':
+            index = _ingredients_by_id
+            for lookup in (_ingredient_names, _inventory):
+                if lookup is not None:
+                    if op == 'put':
+                        lookup.add(payload)
+                    else:
+                        lookup.remove(payload)
+            for tracker in (_stock_alerts, _lots_by_expiry):
+                if tracker is not None:
+                    if op == 'put':
+                        tracker.update(payload)
+                    else:
+                        tracker.remove(payload)
+        elif kind == 'recipe':
+            index = _recipes_by_id
+        else:
+            continue
+        if _search_index is not None:
+            if op == 'put':
+                _search_index.add(kind, payload)
+            else:
+                _search_index.remove(kind, payload)
+        if op == 'put':
+            index.setdefault(payload['id'], payload)
+        else:
+            index.pop(payload, None)
+
+
+@contextmanager
+def _store_lock() -> Iterator[None]:
+    """Hold the thread lock and an exclusive advisory lock on the store.
+
+    The file lock (fcntl.flock on a .lock file next to the store) keeps
+    other processes from writing at the same time. Re-entrant within a thread.
+    """
+    global _lock_file, _lock_depth
+    with _lock:
+        if _lock_depth == 0 and fcntl is not None:
+            lock_path = get_backend().lock_path
+            lock_path.parent.mkdir(parents=True, exist_ok=True)
+            _lock_file = open(lock_path, 'a')
+            fcntl.flock(_lock_file, fcntl.LOCK_EX)
+        _lock_depth += 1
+        try:
+            yield
+        finally:
+            _lock_depth -= 1
+            if _lock_depth == 0 and _lock_file is not None:
+                fcntl.flock(_lock_file, fcntl.LOCK_UN)
+                _lock_file.close()
+                _lock_file = None
+
+
+@instrument
 def load_data() -> Dict:
-    """Load data from JSON file."""
-    if not DATA_FILE.exists():
-        return {
+    """Load data from the storage backend.
+
+    The parsed document is cached and shared between callers until the store
+    changes on disk, so callers that modify it must persist with save_data().
+    Other threads wait while a transaction is in progress.
+    """
+    if _pending is not None and _pending_owner != threading.get_ident():
+        # Another thread's transaction is editing the snapshot in place; wait
+        # until it has committed or rolled back
+        with _lock:
+            return _load_data()
+    return _load_data()
+
+
+def _load_data() -> Dict:
+    """load_data() in the thread owning the transaction, if there is one."""
+    if _pending is not None or _unflushed:
+        # Inside this thread's transaction, or holding unflushed write-behind
+        # changes: the in-memory snapshot is newer than the store
+        return _snapshot
+
+    key = get_backend().fingerprint()
+    if _snapshot is not None and key == _snapshot_key:
+        instrumentation.count('load_data.cache_hit')
+        return _snapshot
+
+    instrumentation.count('load_data.cache_miss')
+    # Re-read under the store lock so a concurrent writer cannot interleave
+    with _store_lock():
+        return _reload_data()
+
+
+def _reload_data() -> Dict:
+    """Read the store into a new snapshot, migrating it if needed."""
+    key = get_backend().fingerprint()
+    if _snapshot is not None and key == _snapshot_key:
+        return _snapshot
+
+    if key is None:
+        _set_snapshot({
+            "schema_version": SCHEMA_VERSION,
             "ingredients": [],
             "recipes": [],
             "categories": [
@@ -93,32 +473,420 @@ def load_data() -> Dict:
                 "liter",
                 "pieces"
             ]
-        }
-
-    with open(DATA_FILE, 'r') as f:
-        data = json.load(f)
+        }, None)
+        return _snapshot
 
-    # Migrate old data structure if needed
-    original_data = json.dumps(data)
-    data = migrate_ingredient_data(data)
+    with instrumentation.timed('backend.read'):
+        data = get_backend().read()
 
-    # Save migrated data if changes were made
-    if json.dumps(data) != original_data:
+    # Migrate old data structure if the stored schema is behind
+    data, migrated = migrate_data(data)
+    if migrated:
         save_data(data)
+    else:
+        _set_snapshot(data, key)
 
     return data
 
 
+@instrument
 def save_data(data: Dict) -> None:
-    """Save data to JSON file."""
-    DATA_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with open(DATA_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
+    """Save the full document and refresh the cached snapshot."""
+    global _indexed_snapshot
+    backend = get_backend()
+    with _store_lock():
+        flush()
+        try:
+            with instrumentation.timed('backend.write'):
+                backend.write(data)
+        except BaseException:
+            invalidate_cache()
+            raise
+        _set_snapshot(data, backend.fingerprint())
+        # Any amount may have changed; record the differences
+        _start_ledger(data)
+        ids = {ing['id'] for ing in data['ingredients']}
+        gone = [ing_id for ing_id, amount in _get_ledger().stock().items() if amount and ing_id not in ids]
+        _record_stock([('ingredient', 'put', ing) for ing in data['ingredients']]
+                      + [('ingredient', 'delete', ing_id) for ing_id in gone], reason='save_data')
+        _get_ledger().sync()
+    # The caller may have edited data freely, so rebuild indexes on next use
+    _indexed_snapshot = None
+
+
+@instrument
+def compact() -> bool:
+    """Fold the store's journal into its snapshot file(s). Returns True if there was one.
+
+    Afterwards data/storage_data.json (or the Arrow directory) holds every
+    edit on its own, e.g. before copying or committing it.
+    """
+    backend = get_backend()
+    with _store_lock():
+        flush()
+        data = load_data()
+        if not backend.compact(data):
+            return False
+        _set_snapshot(data, backend.fingerprint())
+        return True
+
+
+def _commit(data: Dict, changes: List[Change], sources: Optional[Dict[int, Tuple[str, str]]] = None) -> None:
+    """Persist changes already applied to data and refresh the cached snapshot.
+
+    sources maps ingredient ids to the (source, reason) their stock change
+    is recorded with, instead of this thread's current stock_source.
+    """
+    if _pending is not None:
+        if _write_behind_delay > 0:
+            _note_base_revisions(data, changes)
+        for kind, op, payload in changes:
+            if kind == 'ingredient':
+                _pending_sources[payload['id'] if op == 'put' else payload] = _current_stock_source()
+        _pending.extend(changes)
+        _update_indexes(data, changes)
+        return
+
+    if _write_behind_delay > 0:
+        # Visible right away; the flusher thread persists it shortly
+        _note_base_revisions(data, changes)
+        _unflushed.extend(changes)
+        _set_snapshot(data, _snapshot_key)
+        _update_indexes(data, changes)
+        _record_stock(changes, sources=sources)
+        _schedule_flush()
+        return
+
+    backend = get_backend()
+    try:
+        with instrumentation.timed('backend.apply'):
+            backend.apply(data, changes)
+    except BaseException:
+        # data already holds the edits; drop it and the indexes so the next
+        # read shows what the store really has
+        invalidate_cache()
+        raise
+    instrumentation.count('changes_written', len(changes))
+    _set_snapshot(data, backend.fingerprint())
+    _update_indexes(data, changes)
+    _record_stock(changes, sources=sources)
+    _get_ledger().sync()
+
+
+def _change_target(change: Change) -> Tuple[str, Any]:
+    """The (kind, id) of the entity a change is for, or ('meta', key) for a setting."""
+    kind, op, payload = change
+    if kind == 'meta':
+        return kind, payload['key']
+    return kind, payload['id'] if op == 'put' else payload
+
+
+def _note_base_revisions(data: Dict, changes: List[Change]) -> None:
+    """Remember the stored revision of entities getting their first unflushed change.
+
+    Called before the indexes are updated, so a deleted entity is still in
+    them. Every put follows exactly one _bump_revision (new entities start
+    at revision 1), so the stored revision is one below the put's.
+    """
+    entities = dict(zip(('ingredient', 'recipe'), _indexes(data)))
+    for change in changes:
+        kind, op, payload = change
+        target = _change_target(change)
+        if kind == 'meta' or target in _unflushed_base:
+            continue
+        if op == 'put':
+            _unflushed_base[target] = payload.get('revision', 0) - 1
+        elif payload in entities[kind]:
+            _unflushed_base[target] = entities[kind][payload].get('revision', 0)
+
+
+def _find_conflicts(data: Dict) -> Dict[Tuple[str, int], Optional[Dict]]:
+    """Entities with unflushed changes that another process changed in the meantime.
+
+    Maps (kind, id) to the version in data, the store's current content
+    (None if it was deleted there).
+    """
+    stored = {
+        'ingredient': {ing['id']: ing for ing in data['ingredients']},
+        'recipe': {recipe['id']: recipe for recipe in data['recipes']},
+    }
+    conflicts = {}
+    for (kind, entity_id), base in _unflushed_base.items():
+        entity = stored[kind].get(entity_id)
+        if (entity.get('revision', 0) if entity else 0) != base:
+            conflicts[(kind, entity_id)] = entity
+    return conflicts
+
+
+def _coalesce(changes: List[Change]) -> List[Change]:
+    """Keep only the last change per entity (or setting), in their original order."""
+    last: Dict[Tuple, int] = {}
+    for i, change in enumerate(changes):
+        last[_change_target(change)] = i
+    return [changes[i] for i in sorted(last.values())]
+
+
+def _schedule_flush() -> None:
+    """Note an unflushed change and wake the flusher thread, starting it on first use."""
+    global _unflushed_first, _unflushed_last, _flush_thread
+    now = time.monotonic()
+    with _flush_signal:
+        if _unflushed_first is None:
+            _unflushed_first = now
+        _unflushed_last = now
+        if _flush_thread is None:
+            _flush_thread = threading.Thread(target=_flush_loop, name='data_manager-flush', daemon=True)
+            _flush_thread.start()
+            atexit.register(flush)
+        _flush_signal.notify()
+
+
+def _flush_loop() -> None:
+    """Flusher thread: flush once edits pause for the delay, or after max_wait at the latest."""
+    global _unflushed_first, _unflushed_last
+    while True:
+        with _flush_signal:
+            while _unflushed_first is None:
+                _flush_signal.wait()
+            due = min(_unflushed_last + _write_behind_delay, _unflushed_first + _write_behind_max_wait)
+            remaining = due - time.monotonic()
+            if remaining > 0:
+                _flush_signal.wait(remaining)
+                continue
+        try:
+            flush()
+        except ConflictError:
+            # The other process's versions were kept and the rest written
+            pass
+        except Exception:
+            # Keep the changes and retry after another delay
+            instrumentation.count('write_behind.errors')
+            with _flush_signal:
+                _unflushed_first = _unflushed_last = time.monotonic()
+
+
+@instrument
+def flush() -> None:
+    """Durability barrier: write all changes held back by write-behind mode.
+
+    Returns once they are on disk. A no-op in write-through mode. If another
+    process changed the store since, the changes are replayed on top of its
+    data. Entities that process changed too keep its version and lose the
+    changes made here, like an update with a stale expected_revision: the
+    other changes are written and ConflictError is raised, naming them.
+    """
+    global _unflushed, _unflushed_first, _unflushed_last, _requirement_matrix
+    if not _unflushed:
+        return
+    with _store_lock():
+        if not _unflushed:
+            return
+        changes = _coalesce(_unflushed)
+        backend = get_backend()
+        data = _snapshot
+        conflicts = {}
+        with instrumentation.timed('backend.apply'):
+            if backend.fingerprint() != _snapshot_key:
+                instrumentation.count('write_behind.rebase')
+                data = backend.read()
+                conflicts = _find_conflicts(data)
+                changes = [change for change in changes if _change_target(change) not in conflicts]
+                replay_changes(data, changes)
+            backend.apply(data, changes)
+        if conflicts:
+            # The ledger already has the lost stock changes; move it to the kept versions
+            _record_stock([('ingredient', 'put', entity) if entity else ('ingredient', 'delete', entity_id)
+                           for (kind, entity_id), entity in conflicts.items() if kind == 'ingredient'],
+                          reason='write-behind conflict')
+        _get_ledger().sync()
+        instrumentation.count('changes_written', len(changes))
+        instrumentation.count('write_behind.flushes')
+        _unflushed = []
+        _unflushed_base.clear()
+        with _flush_signal:
+            _unflushed_first = _unflushed_last = None
+        # Rebuilt from what is now on disk, should a matrix still have been
+        # built from columns older than the edits
+        _requirement_matrix = None
+        _set_snapshot(data, backend.fingerprint())
+
+    if conflicts:
+        instrumentation.count('write_behind.conflicts', len(conflicts))
+        names = ', '.join(f"{kind} '{entity['name']}'" if entity else f"{kind} {entity_id} (deleted)"
+                          for (kind, entity_id), entity in conflicts.items())
+        raise ConflictError(f"Changed by someone else before these changes were written, not saved: {names}")
+
+
+@instrument
+def set_write_behind(delay: float, max_wait: Optional[float] = None) -> None:
+    """Turn write-behind mode on (delay > 0, in seconds) or off (delay 0).
+
+    In write-behind mode mutations only update the in-memory data and return;
+    a background thread writes them in one batch once no change came for delay
+    seconds, or max_wait (default 4 * delay) after the first unwritten change.
+    Call flush() where changes must be on disk; pending changes are also
+    flushed at exit, before transactions and on switching modes or backends.
+    A crash (not a normal exit) loses up to max_wait seconds of edits.
+    """
+    global _write_behind_delay, _write_behind_max_wait
+    flush()
+    _write_behind_delay = max(0.0, delay)
+    _write_behind_max_wait = max_wait if max_wait is not None else 4 * _write_behind_delay
+
+
+def _get_ledger() -> stock_ledger.StockLedger:
+    """Return the stock ledger of the active backend."""
+    global _ledger
+    if _ledger is None:
+        _ledger = stock_ledger.StockLedger(get_backend().ledger_path)
+    return _ledger
+
+
+def _stock_amount(ingredient: Dict) -> float:
+    return float(ingredient.get('amount') or 0)
+
+
+def _start_ledger(data: Optional[Dict] = None) -> None:
+    """Give the ledger the stock of data (default: the store) as its opening balance.
+
+    Runs before the first change, so the ledger starts from the stock as it was.
+    """
+    ledger = _get_ledger()
+    if not ledger.started():
+        data = data if data is not None else load_data()
+        ledger.start({ing['id']: _stock_amount(ing) for ing in data['ingredients']})
+
+
+def _current_stock_source() -> Tuple[str, str]:
+    """The (source, reason) set by this thread's innermost stock_source block."""
+    return getattr(_stock_context, 'value', None) or ('manual', '')
+
+
+def _record_stock(changes: List[Change], reason: Optional[str] = None,
+                  sources: Optional[Dict[int, Tuple[str, str]]] = None) -> None:
+    """Record how committed changes moved the stock in the ledger (synced by the caller).
+
+    Each ingredient's change is recorded with its (source, reason) in sources,
+    else with the current stock_source; reason, if given, replaces the reason.
+    """
+    # Amounts after the changes; a deleted ingredient has none left
+    amounts = {}
+    for kind, op, payload in changes:
+        if kind == 'ingredient':
+            if op == 'put':
+                amounts[payload['id']] = _stock_amount(payload)
+            else:
+                amounts[payload] = 0.0
+    if not amounts:
+        return
+    ledger = _get_ledger()
+    stock = ledger.stock()
+    current = _current_stock_source()
+    deltas_by_source: Dict[Tuple[str, str], Dict[int, float]] = {}
+    for ing_id, amount in amounts.items():
+        context = (sources or {}).get(ing_id, current)
+        deltas_by_source.setdefault(context, {})[ing_id] = amount - stock.get(ing_id, 0.0)
+    for (source, context_reason), deltas in deltas_by_source.items():
+        ledger.record(deltas, source, reason if reason is not None else context_reason)
+
+
+@contextmanager
+def stock_source(source: str, reason: str = "") -> Iterator[None]:
+    """Record the stock changes this thread makes in the block with source and reason.
+
+    source is 'manual' (the default), 'cook' or 'import'. Inside a
+    transaction, changes keep the source they were made with. Usage:
+        with dm.stock_source('import', reason='source.xlsx'):
+            dm.upsert_ingredients(rows)
+    """
+    if source not in stock_ledger.SOURCES:
+        raise ValueError(f"Unknown stock source: {source}")
+    previous = getattr(_stock_context, 'value', None)
+    _stock_context.value = (source, reason)
+    try:
+        yield
+    finally:
+        _stock_context.value = previous
+
+
+@contextmanager
+def transaction() -> Iterator[Dict]:
+    """Group mutations into a single write, or roll all of them back on error.
+
+    Usage:
+        with dm.transaction():
+            for ing_id, amount in restock.items():
+                dm.update_ingredient(ing_id, amount=amount)
+
+    Nested transactions join the outer one. Other threads' reads and
+    mutations, and other processes' mutations, wait until the transaction ends.
+    """
+    global _pending, _pending_owner
+    with _store_lock():
+        if _pending is not None:
+            yield _snapshot
+            return
+
+        # Rollback re-reads the store, so it must hold everything before the transaction
+        flush()
+        data = load_data()
+        _start_ledger(data)
+        _pending = []
+        _pending_owner = threading.get_ident()
+        _pending_sources.clear()
+        try:
+            yield data
+        except BaseException:
+            # Nothing was persisted, so re-reading the store discards the edits
+            _pending = _pending_owner = None
+            _unflushed_base.clear()
+            invalidate_cache()
+            raise
+
+        changes, _pending = _pending, None
+        _pending_owner = None
+        sources = dict(_pending_sources)
+        _pending_sources.clear()
+        if changes:
+            _commit(data, changes, sources)
+
+
+def _locked(func: Callable) -> Callable:
+    """Run a mutation while holding the store lock, on freshly loaded data."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with _store_lock():
+            _start_ledger()
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def _bump_revision(entity: Dict) -> None:
+    """Increase the entity's revision; every stored write gets a new one."""
+    entity['revision'] = entity.get('revision', 0) + 1
+
+
+def _check_revision(entity: Dict, expected_revision: Optional[int]) -> None:
+    """Raise ConflictError if entity is no longer at expected_revision."""
+    if expected_revision is not None and entity.get('revision', 0) != expected_revision:
+        raise ConflictError(
+            f"'{entity['name']}' was changed by someone else "
+            f"(revision {entity.get('revision', 0)}, expected {expected_revision})"
+        )
 
 
 # Ingredient operations
-def add_ingredient(name: str, category: str, measurement: str, amount: float) -> Dict:
-    """Add a new ingredient."""
+@instrument
+@_locked
+def add_ingredient(name: str, category: str, measurement: str, amount: float,
+                   density: Optional[float] = None, piece_grams: Optional[float] = None,
+                   min_stock: Optional[float] = None) -> Dict:
+    """Add a new ingredient.
+
+    density (kg per liter) and piece_grams (average weight of one piece) are
+    optional and used to convert the stock to grams; see units.py. An amount
+    below min_stock (in the same measurement) raises a low-stock alert.
+    """
     data = load_data()
 
     # Generate new ID
@@ -129,39 +897,241 @@ def add_ingredient(name: str, category: str, measurement: str, amount: float) ->
         'name': name,
         'category': category,
         'measurement': measurement,
-        'amount': amount
+        'amount': amount,
+        'revision': 1
     }
+    if density:
+        ingredient['density'] = density
+    if piece_grams:
+        ingredient['piece_grams'] = piece_grams
+    if min_stock:
+        ingredient['min_stock'] = min_stock
 
     data['ingredients'].append(ingredient)
-    save_data(data)
+    _commit(data, [('ingredient', 'put', ingredient)])
     return ingredient
 
 
-def update_ingredient(ingredient_id: int, **kwargs) -> Optional[Dict]:
-    """Update an existing ingredient."""
-    data = load_data()
+@instrument
+@_locked
+def update_ingredient(ingredient_id: int, expected_revision: Optional[int] = None, **kwargs) -> Optional[Dict]:
+    """Update an existing ingredient.
 
-    for ingredient in data['ingredients']:
-        if ingredient['id'] == ingredient_id:
-            ingredient.update(kwargs)
-            save_data(data)
-            return ingredient
+    If expected_revision is given and the stored ingredient has a different
+    revision, ConflictError is raised and nothing is changed.
+    """
+    data = load_data()
+    ingredient = _indexes(data)[0].get(ingredient_id)
+
+    if ingredient:
+        _check_revision(ingredient, expected_revision)
+        previous_amount = ingredient.get('amount')
+        ingredient.update(kwargs)
+        if 'amount' in kwargs or 'lots' in kwargs:
+            # A lower amount counts as used up, soonest expiring lots first
+            lots.normalize(ingredient, previous_amount if 'lots' not in kwargs else None)
+        _bump_revision(ingredient)
+        _commit(data, [('ingredient', 'put', ingredient)])
+        return ingredient
 
     return None
 
 
+@instrument
+@_locked
 def delete_ingredient(ingredient_id: int) -> bool:
     """Delete an ingredient."""
     data = load_data()
-    original_count = len(data['ingredients'])
+    if ingredient_id not in _indexes(data)[0]:
+        return False
+
     data['ingredients'] = [ing for ing in data['ingredients'] if ing['id'] != ingredient_id]
+    _commit(data, [('ingredient', 'delete', ingredient_id)])
+    return True
+
+
+@instrument
+@_locked
+def merge_ingredients(merges: Dict[int, int]) -> Dict[str, Any]:
+    """Merge duplicate ingredients into surviving ones with a single write.
+
+    merges maps duplicate id -> surviving id. Recipes are rewritten in one pass
+    to reference the survivors (quantities of a recipe that used both are
+    added up), the duplicate's stock is added to the survivor, converted
+    through grams if their measurements differ, and the duplicates are
+    deleted. A duplicate whose stock cannot be converted (pieces without a
+    weight) is left alone and listed in 'skipped'. Returns counts of removed
+    ingredients and updated recipes, and the skipped duplicate ids.
+    """
+    def survivor_of(ing_id):
+        # Follow chains like a -> b -> c
+        seen = set()
+        while ing_id in merges and ing_id not in seen:
+            seen.add(ing_id)
+            ing_id = merges[ing_id]
+        return ing_id
+
+    with transaction():
+        data = load_data()
+        ingredients_by_id, recipes_by_id = _indexes(data)
+        targets = {dup_id: survivor_of(dup_id) for dup_id in merges}
+        targets = {
+            dup_id: keep_id for dup_id, keep_id in targets.items()
+            if dup_id != keep_id and dup_id in ingredients_by_id and keep_id in ingredients_by_id
+        }
+        # Stock is never dropped: duplicates it cannot be moved from stay
+        skipped = sorted(
+            dup_id for dup_id, keep_id in targets.items()
+            if ingredients_by_id[dup_id].get('amount')
+            and units.convert(1.0, ingredients_by_id[dup_id], ingredients_by_id[keep_id]) is None
+        )
+        for dup_id in skipped:
+            del targets[dup_id]
+
+        recipes_updated = 0
+        for recipe in recipes_by_id.values():
+            if not any(ring['ingredient_id'] in targets for ring in recipe['ingredients']):
+                continue
+            merged = {}
+            for ring in recipe['ingredients']:
+                ing_id = targets.get(ring['ingredient_id'], ring['ingredient_id'])
+                if ing_id in merged:
+                    merged[ing_id]['quantity_grams'] += ring['quantity_grams']
+                else:
+                    merged[ing_id] = {**ring, 'ingredient_id': ing_id}
+            recipe['ingredients'] = list(merged.values())
+            recipes_updated += 1
+            _bump_revision(recipe)
+            _commit(data, [('recipe', 'put', recipe)])
+
+        for dup_id, keep_id in targets.items():
+            duplicate, survivor = ingredients_by_id[dup_id], ingredients_by_id[keep_id]
+            if duplicate.get('amount'):
+                survivor['amount'] = (survivor.get('amount') or 0) + units.convert(duplicate['amount'], duplicate, survivor)
+                lots.merge_lots(survivor, [
+                    {**lot, 'amount': units.convert(lot['amount'], duplicate, survivor)}
+                    for lot in duplicate.get('lots', [])
+                ])
+                _bump_revision(survivor)
+                _commit(data, [('ingredient', 'put', survivor)])
+
+        data['ingredients'] = [ing for ing in data['ingredients'] if ing['id'] not in targets]
+        _commit(data, [('ingredient', 'delete', dup_id) for dup_id in targets])
+
+    return {'ingredients_removed': len(targets), 'recipes_updated': recipes_updated, 'skipped': skipped}
+
+
+# Stock lots and consumption
+def _iso_date(value: Optional[Union[date, str]]) -> Optional[str]:
+    """ISO date of a date or datetime; strings are assumed to be ISO dates already."""
+    if isinstance(value, datetime):
+        value = value.date()
+    return value.isoformat() if isinstance(value, date) else value
+
+
+@instrument
+@_locked
+def add_stock(ingredient_id: int, amount: float, expires: Optional[Union[date, str]] = None) -> Optional[Dict]:
+    """Add amount (in the ingredient's measurement) to its stock.
+
+    With an expiry date the amount is kept as a lot, so it is used before
+    later expiring stock. Returns the ingredient, or None if there is none.
+    """
+    data = load_data()
+    ingredient = _indexes(data)[0].get(ingredient_id)
+    if ingredient is None:
+        return None
+    lots.add_lot(ingredient, amount, _iso_date(expires))
+    _bump_revision(ingredient)
+    _commit(data, [('ingredient', 'put', ingredient)])
+    return ingredient
 
-    if len(data['ingredients']) < original_count:
-        save_data(data)
-        return True
-    return False
 
+@instrument
+@_locked
+def consume_ingredient(ingredient_id: int, amount: float) -> Optional[Dict]:
+    """Use amount of an ingredient's stock, first-expired-first-out.
 
+    Returns {'taken': [{'amount', 'expires'}, ...], 'missing': the part of
+    amount that was not in stock}; undated stock is taken last (expires
+    None). None if the ingredient does not exist.
+    """
+    data = load_data()
+    ingredient = _indexes(data)[0].get(ingredient_id)
+    if ingredient is None:
+        return None
+    taken, missing = lots.consume(ingredient, amount)
+    _bump_revision(ingredient)
+    _commit(data, [('ingredient', 'put', ingredient)])
+    return {'taken': taken, 'missing': missing}
+
+
+@instrument
+@_locked
+def cook_recipe(recipe_id: int, num_people: int) -> Optional[Dict]:
+    """Take a recipe's ingredients for num_people out of stock, first-expired-first-out.
+
+    The stock changes are recorded with source 'cook'. Returns {'used':
+    {ingredient_id: amount}, 'missing': {ingredient_id: amount}, 'unconverted':
+    [ingredient_id, ...]} with amounts in each ingredient's measurement;
+    unconverted ingredients (pieces without a weight) are left as they are.
+    None if the recipe does not exist.
+    """
+    recipe = _indexes(load_data())[1].get(recipe_id)
+    if recipe is None:
+        return None
+    result = {'used': {}, 'missing': {}, 'unconverted': []}
+    # The ledger records the changes when the transaction commits
+    with stock_source('cook', reason=recipe['name']), transaction() as data:
+        ingredients_by_id = _indexes(data)[0]
+        for ring in recipe['ingredients']:
+            ingredient = ingredients_by_id.get(ring['ingredient_id'])
+            if ingredient is None:
+                continue
+            amount = units.from_grams(ingredient, ring['quantity_grams'] * num_people)
+            if amount is None:
+                result['unconverted'].append(ingredient['id'])
+                continue
+            _, missing = lots.consume(ingredient, amount)
+            result['used'][ingredient['id']] = amount - missing
+            if missing > lots.EPSILON:
+                result['missing'][ingredient['id']] = missing
+            _bump_revision(ingredient)
+            _commit(data, [('ingredient', 'put', ingredient)])
+    return result
+
+
+@instrument
+def get_expiring(days: int = EXPIRING_SOON_DAYS, limit: Optional[int] = None,
+                 include_expired: bool = True, today: Optional[date] = None) -> List[Dict]:
+    """Up to limit stock lots expiring within days from today, soonest first.
+
+    Each entry is {'ingredient', 'expires' (ISO date), 'amount', 'expired'}.
+    Only the lots found are visited (a bisect on the expiry index), not the
+    inventory.
+    """
+    today = (today or date.today()).isoformat()
+    until = (date.fromisoformat(today) + timedelta(days=days)).isoformat()
+    found = _expiry_index(load_data()).expiring(until, None if include_expired else today, limit)
+    return [
+        {'ingredient': ing, 'expires': expires, 'amount': lot['amount'], 'expired': expires < today}
+        for expires, ing, lot in found
+    ]
+
+
+def _expiring_grams(data: Dict, matrix: meal_planning.RequirementMatrix) -> np.ndarray:
+    """Grams per matrix column of stock expiring within EXPIRING_SOON_DAYS (and not yet expired)."""
+    today = date.today()
+    grams = np.zeros(len(matrix.ingredient_ids))
+    until = (today + timedelta(days=EXPIRING_SOON_DAYS)).isoformat()
+    for _, ing, lot in _expiry_index(data).expiring(until, since=today.isoformat()):
+        col = matrix.ingredient_col.get(ing['id'])
+        if col is not None:
+            grams[col] += lot['amount']
+    return np.nan_to_num(grams * matrix.conversions.factors, nan=0.0)
+
+
+@instrument
 def get_ingredients(category: Optional[str] = None) -> List[Dict]:
     """Get all ingredients, optionally filtered by category."""
     data = load_data()
@@ -173,7 +1143,71 @@ def get_ingredients(category: Optional[str] = None) -> List[Dict]:
     return ingredients
 
 
+@instrument
+def query_ingredients(category: Optional[str] = None, search: str = "",
+                      offset: int = 0, limit: Optional[int] = None) -> Dict:
+    """Get one page of ingredients sorted by name.
+
+    Filters by category and by a case-insensitive name substring. Returns
+    {'total': number of matches, 'items': matches[offset:offset + limit]}.
+    """
+    total, items = _inventory_index(load_data()).query(category, search, offset, limit)
+    return {'total': total, 'items': items}
+
+
+@instrument
+def get_low_stock(limit: Optional[int] = None) -> List[Dict]:
+    """Ingredients whose amount is below their min_stock, emptiest first.
+
+    Each entry is {'ingredient': ..., 'ratio': amount / min_stock}. Only the
+    alerts are visited, not the whole inventory.
+    """
+    return [
+        {'ingredient': ing, 'ratio': ratio}
+        for ratio, ing in _low_stock_index(load_data()).alerts(limit)
+    ]
+
+
+@instrument
+def get_ingredient(ingredient_id: int) -> Optional[Dict]:
+    """Get a specific ingredient by ID."""
+    return _indexes(load_data())[0].get(ingredient_id)
+
+
+@instrument
+def find_ingredient(name: str, fuzzy: bool = True, threshold: float = 0.5) -> Optional[Dict]:
+    """Find an ingredient by name.
+
+    Exact (case-insensitive) matches win; otherwise, if fuzzy is set, the most
+    similar name with a trigram similarity of at least threshold is returned.
+    """
+    index = _name_index(load_data())
+    if not fuzzy:
+        return index.exact(name)
+    return index.find(name, threshold)
+
+
+@instrument
+def similar_ingredients(name: str, limit: int = 5, threshold: float = 0.3) -> List[Tuple[float, Dict]]:
+    """Return up to limit (similarity, ingredient) pairs for name, best first."""
+    return _name_index(load_data()).fuzzy(name, threshold, limit)
+
+
+@instrument
+def search(query: str, kinds: Optional[Iterable[str]] = None, limit: int = 20) -> List[Dict]:
+    """Full-text search over ingredient names and categories and recipe names, tags and comments.
+
+    All words of query must match; the last may be a prefix ("coconut mi" finds
+    "Coconut milk"). kinds restricts the results to 'ingredient' and/or
+    'recipe'. Returns up to limit {'kind', 'item', 'score'} dicts, best first.
+    """
+    matches = _full_text_index(load_data()).search(query, kinds, limit)
+    return [{'kind': kind, 'item': item, 'score': score} for score, kind, item in matches]
+
+
 # Recipe operations
+@instrument
+@_locked
 def add_recipe(name: str, comments: str, ingredients: List[Dict], vegie: str = "no", tag: str = "") -> Dict:
     """Add a new recipe (per person, grams only)."""
     data = load_data()
@@ -187,63 +1221,132 @@ def add_recipe(name: str, comments: str, ingredients: List[Dict], vegie: str = "
         'comments': comments,
         'ingredients': ingredients,  # [{'ingredient_id': int, 'quantity_grams': float}]
         'vegie': vegie,
-        'tag': tag
+        'tag': tag,
+        'revision': 1
     }
 
     data['recipes'].append(recipe)
-    save_data(data)
+    _commit(data, [('recipe', 'put', recipe)])
     return recipe
 
 
-def update_recipe(recipe_id: int, **kwargs) -> Optional[Dict]:
-    """Update an existing recipe."""
+@instrument
+@_locked
+def update_recipe(recipe_id: int, expected_revision: Optional[int] = None, **kwargs) -> Optional[Dict]:
+    """Update an existing recipe.
+
+    If expected_revision is given and the stored recipe has a different
+    revision, ConflictError is raised and nothing is changed.
+    """
     data = load_data()
+    recipe = _indexes(data)[1].get(recipe_id)
 
-    for recipe in data['recipes']:
-        if recipe['id'] == recipe_id:
-            recipe.update(kwargs)
-            save_data(data)
-            return recipe
+    if recipe:
+        _check_revision(recipe, expected_revision)
+        recipe.update(kwargs)
+        _bump_revision(recipe)
+        _commit(data, [('recipe', 'put', recipe)])
+        return recipe
 
     return None
 
 
+@instrument
+@_locked
 def delete_recipe(recipe_id: int) -> bool:
     """Delete a recipe."""
     data = load_data()
-    original_count = len(data['recipes'])
-    data['recipes'] = [recipe for recipe in data['recipes'] if recipe['id'] != recipe_id]
+    if recipe_id not in _indexes(data)[1]:
+        return False
 
-    if len(data['recipes']) < original_count:
-        save_data(data)
-        return True
-    return False
+    data['recipes'] = [recipe for recipe in data['recipes'] if recipe['id'] != recipe_id]
+    _commit(data, [('recipe', 'delete', recipe_id)])
+    return True
 
 
+@instrument
 def get_recipes() -> List[Dict]:
     """Get all recipes."""
     data = load_data()
     return data['recipes']
 
 
+@instrument
 def get_recipe(recipe_id: int) -> Optional[Dict]:
     """Get a specific recipe by ID."""
-    data = load_data()
-    for recipe in data['recipes']:
-        if recipe['id'] == recipe_id:
-            return recipe
-    return None
+    return _indexes(load_data())[1].get(recipe_id)
+
+
+# Bulk import operations
+def _upsert(kind: str, rows: Iterable[Dict], update_existing: bool) -> Dict[str, List[Dict]]:
+    """Insert or update entities of kind, matched by normalized name, in one write."""
+    key = 'ingredients' if kind == 'ingredient' else 'recipes'
+    result = {'added': [], 'updated': [], 'skipped': []}
+
+    with transaction():
+        data = load_data()
+        by_name = {}
+        for item in data[key]:
+            by_name.setdefault(normalize_name(item['name']), item)
+        next_id = max([item.get('id', 0) for item in data[key]], default=0) + 1
+
+        for row in rows:
+            fields = {k: v for k, v in row.items() if k not in ('id', 'revision')}
+            norm_name = normalize_name(fields['name'])
+            existing = by_name.get(norm_name)
+
+            if existing is None:
+                item = {'id': next_id, **fields, 'revision': 1}
+                next_id += 1
+                data[key].append(item)
+                by_name[norm_name] = item
+                _commit(data, [(kind, 'put', item)])
+                result['added'].append(item)
+            elif update_existing:
+                previous_amount = existing.get('amount')
+                existing.update(fields)
+                if kind == 'ingredient':
+                    lots.normalize(existing, previous_amount)
+                _bump_revision(existing)
+                _commit(data, [(kind, 'put', existing)])
+                result['updated'].append(existing)
+            else:
+                result['skipped'].append(existing)
+
+    return result
+
+
+@instrument
+@_locked
+def upsert_ingredients(rows: Iterable[Dict], update_existing: bool = True) -> Dict[str, List[Dict]]:
+    """Insert or update many ingredients with a single write.
+
+    Rows are matched to stored ingredients by normalized name. Returns the
+    affected ingredients as {'added': [...], 'updated': [...], 'skipped': [...]};
+    existing ingredients are skipped unless update_existing is set.
+    """
+    return _upsert('ingredient', rows, update_existing)
+
+
+@instrument
+@_locked
+def upsert_recipes(rows: Iterable[Dict], update_existing: bool = True) -> Dict[str, List[Dict]]:
+    """Insert or update many recipes with a single write, matched by normalized name."""
+    return _upsert('recipe', rows, update_existing)
 
 
 # Meal planning calculations
+@instrument
 def calculate_meal_requirements(recipe_id: int, num_people: int) -> Dict:
     """Calculate ingredient requirements for a recipe scaled to number of people."""
-    data = load_data()
-    recipe = get_recipe(recipe_id)
+    ingredients_by_id, recipes_by_id = _indexes(load_data())
+    recipe = recipes_by_id.get(recipe_id)
 
     if not recipe:
         return {'error': 'Recipe not found'}
 
+    matrix = _get_requirement_matrix()
+
     # Recipes are per person, so scale is just num_people
     scale = num_people
 
@@ -253,28 +1356,22 @@ def calculate_meal_requirements(recipe_id: int, num_people: int) -> Dict:
         required_qty_grams = recipe_ing['quantity_grams'] * scale
 
         # Find ingredient in storage
-        storage_ing = next((ing for ing in data['ingredients'] if ing['id'] == ing_id), None)
+        storage_ing = ingredients_by_id.get(ing_id)
 
         if storage_ing:
             measurement = storage_ing.get('measurement', 'pieces')
             amount = storage_ing.get('amount', 0)
 
-            # Convert storage amount to grams for comparison
-            if measurement == 'kg':
-                available_qty_grams = amount * 1000
-                conversion_note = f"{amount:.1f} kg"
-                can_compare = True
+            # Convert storage amount to grams using the precompiled factors
+            available_qty_grams = matrix.available_grams[matrix.ingredient_col[ing_id]]
+            conversion_note = units.describe(storage_ing)
+            can_compare = bool(not np.isnan(available_qty_grams))
+            if can_compare:
+                available_qty_grams = float(available_qty_grams)
                 warning = None
-            elif measurement == 'liter':
-                available_qty_grams = amount * 1000
-                conversion_note = f"{amount:.1f} liter (water-based estimate)"
-                can_compare = True
-                warning = None
-            else:  # pieces
+            else:
                 available_qty_grams = 0
-                conversion_note = f"{amount:.1f} pieces"
-                can_compare = False
-                warning = "Cannot auto-convert pieces to grams - manual check required"
+                warning = "No weight per piece set - add one on the Ingredients page or check manually"
 
             is_sufficient = available_qty_grams >= required_qty_grams if can_compare else False
             shortfall = max(0, required_qty_grams - available_qty_grams) if can_compare else required_qty_grams
@@ -300,6 +1397,98 @@ def calculate_meal_requirements(recipe_id: int, num_people: int) -> Dict:
     }
 
 
+@instrument
+def calculate_plan_requirements(plan: List[meal_planning.PlanEntry]) -> Dict:
+    """Calculate total requirements and a shopping list for a multi-recipe meal plan.
+
+    plan is a list of (recipe_id, num_people, date) entries, e.g. a weekly plan.
+    """
+    return meal_planning.aggregate_plan(_get_requirement_matrix(), plan)
+
+
+def _get_requirement_matrix() -> meal_planning.RequirementMatrix:
+    """Return the recipe x ingredient matrix of the current data, building it if needed."""
+    global _requirement_matrix
+    with _lock:
+        data = load_data()
+        ingredients_by_id, recipes_by_id = _indexes(data)
+        if _requirement_matrix is None:
+            instrumentation.count('requirement_matrix.rebuild')
+            # Columnar backends can hand over the unchanged snapshot's columns
+            # directly; not while edits are only in memory, which the backend
+            # has not seen
+            columns_of = getattr(get_backend(), 'columns', None)
+            unchanged = _pending is None and not _unflushed
+            columns = columns_of(data) if columns_of is not None and unchanged else None
+            if columns is not None:
+                _requirement_matrix = meal_planning.RequirementMatrix.from_columns(ingredients_by_id, recipes_by_id, columns)
+            if _requirement_matrix is None:
+                _requirement_matrix = meal_planning.RequirementMatrix(ingredients_by_id, recipes_by_id)
+        return _requirement_matrix
+
+
+@instrument
+def get_available_grams() -> Dict[int, Optional[float]]:
+    """Return the stock of every ingredient in grams (None where no weight is known)."""
+    matrix = _get_requirement_matrix()
+    return {
+        ing_id: None if np.isnan(grams) else float(grams)
+        for ing_id, grams in zip(matrix.ingredient_ids, matrix.available_grams)
+    }
+
+
+@instrument
+def get_feasible_recipes(min_servings: int = 1, limit: Optional[int] = None) -> List[Dict]:
+    """Rank recipes by how many servings the current stock supports.
+
+    Returns {'recipe_id', 'name', 'max_servings', 'limiting_ingredient',
+    'expiring_grams', 'unchecked_ingredients'} dicts for recipes with at
+    least min_servings, most servings first, except that recipes using more
+    stock expiring within EXPIRING_SOON_DAYS (expiring_grams per serving)
+    come before them. Recipes whose stock cannot be fully converted to grams
+    list the unconverted ingredients; max_servings then only covers the
+    others (None if there are none).
+    """
+    data = load_data()
+    _, recipes_by_id = _indexes(data)
+    matrix = _get_requirement_matrix()
+    return meal_planning.rank_recipes(matrix, recipes_by_id, min_servings, limit, _expiring_grams(data, matrix))
+
+
+@instrument
+def optimize_meal_plan(num_people: int, num_days: Optional[int] = None, meals_per_day: int = 1,
+                       vegie_only: bool = False, tags: Optional[Iterable[str]] = None,
+                       max_repeats: int = 1, max_per_tag: Optional[int] = None,
+                       start_date: Optional[date] = None, time_budget: float = 1.0) -> Dict:
+    """Suggest a meal plan for num_people that makes the most of the current stock.
+
+    With num_days, plans num_days * meals_per_day meals and buys as little as
+    possible; without it, plans as many meals as the stock covers with
+    nothing to buy. vegie_only, tags, max_repeats and max_per_tag constrain
+    the recipes (see plan_optimizer.optimize); the search stops after about
+    time_budget seconds. Returns the calculate_plan_requirements result for
+    the plan plus 'plan' (the (recipe_id, num_people, date) entries, dated
+    from start_date if given), 'shortfall_grams' and 'unfilled' (meals no
+    recipe could be found for).
+    """
+    data = load_data()
+    _, recipes_by_id = _indexes(data)
+    matrix = _get_requirement_matrix()
+    num_meals = num_days * meals_per_day if num_days is not None else None
+    solution = plan_optimizer.optimize(matrix, recipes_by_id, num_people, num_meals, vegie_only, tags,
+                                       max_repeats, max_per_tag, time_budget,
+                                       expiring_grams=_expiring_grams(data, matrix))
+
+    plan = [
+        (recipe_id, num_people, start_date + timedelta(days=i // meals_per_day) if start_date else None)
+        for i, recipe_id in enumerate(solution['recipe_ids'])
+    ]
+    result = meal_planning.aggregate_plan(matrix, plan)
+    result.update(plan=plan, shortfall_grams=solution['shortfall_grams'], unfilled=solution['unfilled'])
+    return result
+
+
+@instrument
 def get_categories() -> List[str]:
     """Get list of categories."""
     data = load_data()
@@ -320,6 +1509,7 @@ def get_categories() -> List[str]:
     return categories
 
 
+@instrument
 def get_units() -> List[str]:
     """Get list of units."""
     data = load_data()
@@ -336,3 +1526,58 @@ def get_units() -> List[str]:
             "ml"
         ]
     return units
+
+
+# Stock history
+def _timestamp(when, end_of_day: bool = True) -> float:
+    """Epoch seconds of a datetime, or of the end (or start) of a date."""
+    if not isinstance(when, datetime):
+        when = datetime.combine(when, datetime.max.time() if end_of_day else datetime.min.time())
+    return when.timestamp()
+
+
+@instrument
+def get_stock_at(when) -> Optional[Dict[int, float]]:
+    """Stock per ingredient id at a point in time (a datetime, or a date for the end of that day).
+
+    Built from the nearest earlier ledger checkpoint plus the events after it.
+    Returns None for times before the ledger was started.
+    """
+    with _lock:
+        return _get_ledger().stock_at(_timestamp(when))
+
+
+@instrument
+def get_stock_history(ingredient_id: Optional[int] = None, since=None, until=None,
+                      limit: Optional[int] = None) -> List[Dict]:
+    """Stock events, oldest first: {'seq', 'time' (datetime), 'ingredient_id', 'delta', 'source', 'reason'}.
+
+    Optionally of one ingredient, between since and until (datetimes or
+    dates), and only the latest limit events.
+    """
+    with _lock:
+        events = _get_ledger().events(
+            ingredient_id,
+            _timestamp(since, end_of_day=False) if since is not None else None,
+            _timestamp(until) if until is not None else None,
+        )
+        history = deque(events, maxlen=limit) if limit is not None else list(events)
+    return [{**event, 'time': datetime.fromtimestamp(event['time'])} for event in history]
+
+
+# Settings stored next to the data (e.g. import bookkeeping)
+@instrument
+def get_meta(key: str, default: Any = None) -> Any:
+    """Get a top-level setting from the store."""
+    return load_data().get(key, default)
+
+
+@instrument
+@_locked
+def set_meta(key: str, value: Any) -> None:
+    """Store a JSON-serializable top-level setting."""
+    if key in ('ingredients', 'recipes'):
+        raise ValueError(f"'{key}' is not a setting")
+    data = load_data()
+    data[key] = value
+    _commit(data, [('meta', 'put', {'key': key, 'value': value})])
@@ -0,0 +1,229 @@
+"""
+Duplicate ingredient detection.
+
+Names are grouped into blocks by cheap keys (a prefix and a phonetic key), so
+only names sharing a block are compared. Within a block, names are sorted and
+each is compared with its next WINDOW neighbours only (sorted neighbourhood),
+so even very large blocks cost linear time. This is an approximation: two
+duplicates more than WINDOW names apart in every sort order are missed. The
+block is therefore sorted twice, by name and by its words in reverse order,
+so brand variants like "Berber Basil" / "Berberxo Basil", which sit far
+apart by name, are neighbours in the second pass. Pairs that are similar
+enough are joined with union-find, giving clusters of duplicates that each
+merge into one surviving ingredient.
+"""
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from name_index import normalize_name, similarity, trigrams
+
+# Minimum trigram similarity of two whole names to count as duplicates
+NAME_THRESHOLD = 0.6
+
+# Minimum similarity for a word of one name to match a word of the other;
+# at 0.5 "Chicken" matched "Chickpeas"
+WORD_THRESHOLD = 0.6
+
+# Names with a word the other lacks ("Onions TK", "Carrots julienne") are
+# different products; a word shorter than this never counts as matched by
+# a different word
+MIN_FUZZY_WORD = 4
+
+# Number of following names in sorted block order each name is compared with,
+# per sort order. On the 100k synthetic store the two orders with a window of
+# 10 find every pair a full comparison finds, in a third of its time.
+WINDOW = 10
+
+
+def _compact(name: str) -> str:
+    """Normalized name with everything but letters and digits removed."""
+    return re.sub(r'[\W_]+', '', normalize_name(name))
+
+
+def phonetic_key(word: str) -> str:
+    """Rough sound-alike key: consonant skeleton with similar sounds folded.
+
+    "Koriander" and "Coriander", or "Carotts" and "Carrots", get the same key.
+    """
+    word = _compact(word)
+    for old, new in (('ph', 'f'), ('ck', 'k'), ('ch', 'k'), ('c', 'k'), ('q', 'k'), ('z', 's'), ('v', 'f')):
+        word = word.replace(old, new)
+    key = word[:1]
+    for char in word[1:]:
+        if char not in 'aeiouy' and char != key[-1]:
+            key += char
+    return key
+
+
+def blocking_keys(name: str) -> Set[Tuple[str, str]]:
+    """Keys that put likely duplicates of name in the same block."""
+    compact = _compact(name)
+    words = normalize_name(name).split()
+    if not compact or not words:
+        return set()
+    return {('prefix', compact[:4]), ('sound', phonetic_key(words[0])[:4])}
+
+
+def _words_match(words_a: List[str], words_b: List[str]) -> bool:
+    """True if every word of either name has a close counterpart in the other."""
+    def covered(words, others):
+        for word in words:
+            if word in others:
+                continue
+            if len(word) < MIN_FUZZY_WORD:
+                return False
+            if not any(len(other) >= MIN_FUZZY_WORD and similarity(word, other) >= WORD_THRESHOLD
+                       for other in others):
+                return False
+        return True
+
+    return covered(words_a, words_b) and covered(words_b, words_a)
+
+
+class _Profile(NamedTuple):
+    """A name prepared once for many comparisons."""
+    norm: str
+    compact: str
+    grams: Set[str]
+
+
+def _profile(name: str) -> _Profile:
+    norm = normalize_name(name)
+    compact = _compact(name)
+    return _Profile(norm, compact, trigrams(norm))
+
+
+def _dice(a: Set[str], b: Set[str]) -> float:
+    return 2 * len(a & b) / (len(a) + len(b)) if a and b else 0.0
+
+
+def _profiles_match(a: _Profile, b: _Profile) -> bool:
+    if a.norm == b.norm:
+        return True
+    # "Coconutmilk" vs "Coconut milk": same letters, different spacing. Only
+    # exactly the same: "Coriander TK" is close enough to "Coriander"
+    if a.compact == b.compact:
+        return True
+    # "quiona" vs "Quinoa": the same letters with some swapped
+    if _is_transposition(a.compact, b.compact):
+        return True
+    if _dice(a.grams, b.grams) < NAME_THRESHOLD:
+        return False
+    return _words_match(a.norm.split(), b.norm.split())
+
+
+# Orders a block is sorted in for the neighbourhood comparisons: by name,
+# and by words last to first ("Basil Berberxo")
+_SORT_KEYS = (
+    lambda profile: profile.compact,
+    lambda profile: ' '.join(reversed(profile.norm.split())),
+)
+
+
+def is_duplicate(a: str, b: str) -> bool:
+    """Decide whether two ingredient names mean the same ingredient."""
+    return _profiles_match(_profile(a), _profile(b))
+
+
+def _is_transposition(a: str, b: str) -> bool:
+    """True if b is a with a few letters swapped, keeping the first letter."""
+    if len(a) != len(b) or len(a) < MIN_FUZZY_WORD or a[0] != b[0] or sorted(a) != sorted(b):
+        return False
+    return sum(x != y for x, y in zip(a, b)) <= 3
+
+
+class UnionFind:
+    """Disjoint sets over hashable items with path halving."""
+
+    def __init__(self):
+        self._parent = {}
+
+    def find(self, item):
+        """Return the representative of item's set."""
+        parent = self._parent.setdefault(item, item)
+        while parent != item:
+            grandparent = self._parent[parent]
+            self._parent[item] = grandparent
+            item, parent = grandparent, self._parent[grandparent]
+        return item
+
+    def union(self, a, b) -> None:
+        """Join the sets of a and b."""
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self._parent[root_b] = root_a
+
+    def groups(self) -> List[List]:
+        """Return all sets with more than one member."""
+        groups = {}
+        for item in self._parent:
+            groups.setdefault(self.find(item), []).append(item)
+        return [members for members in groups.values() if len(members) > 1]
+
+
+def find_duplicate_clusters(ingredients: Iterable[Dict],
+                            forced: Optional[Dict[str, Iterable[str]]] = None) -> List[List[Dict]]:
+    """Group ingredients that look like duplicates of each other.
+
+    forced maps a canonical name to names that must always merge into it
+    (e.g. translations the similarity check cannot see). Returns clusters of
+    two or more ingredients, each sorted by id.
+    """
+    ingredients = list(ingredients)
+    by_id = {ing['id']: ing for ing in ingredients}
+    profiles = {ing['id']: _profile(ing['name']) for ing in ingredients}
+    uf = UnionFind()
+
+    blocks: Dict[Tuple[str, str], List[int]] = {}
+    for ing in ingredients:
+        uf.find(ing['id'])
+        for key in blocking_keys(ing['name']):
+            blocks.setdefault(key, []).append(ing['id'])
+
+    for ids in blocks.values():
+        for sort_key in _SORT_KEYS:
+            ids.sort(key=lambda ing_id: sort_key(profiles[ing_id]))
+            for i, a in enumerate(ids):
+                for b in ids[i + 1:i + 1 + WINDOW]:
+                    if uf.find(a) != uf.find(b) and _profiles_match(profiles[a], profiles[b]):
+                        uf.union(a, b)
+
+    if forced:
+        by_name = {}
+        for ing in ingredients:
+            by_name.setdefault(normalize_name(ing['name']), []).append(ing['id'])
+        for keep_name, names in forced.items():
+            ids = [ing_id for name in [keep_name, *names] for ing_id in by_name.get(normalize_name(name), [])]
+            for ing_id in ids[1:]:
+                uf.union(ids[0], ing_id)
+
+    return [sorted((by_id[ing_id] for ing_id in group), key=lambda ing: ing['id']) for group in uf.groups()]
+
+
+def choose_survivor(cluster: List[Dict], usage: Dict[int, int],
+                    forced: Optional[Dict[str, Iterable[str]]] = None) -> Tuple[Dict, Optional[str]]:
+    """Pick the ingredient of a cluster that the others merge into.
+
+    A member named like a forced canonical name wins, else the one used by the
+    most recipes, then the lowest id. Returns (survivor, new_name), where
+    new_name is the canonical name the survivor should take, if any.
+    """
+    for keep_name, names in (forced or {}).items():
+        aliases = {normalize_name(name) for name in [keep_name, *names]}
+        members = [ing for ing in cluster if normalize_name(ing['name']) in aliases]
+        if members:
+            exact = [ing for ing in members if normalize_name(ing['name']) == normalize_name(keep_name)]
+            survivor = (exact or members)[0]
+            return survivor, keep_name if survivor['name'] != keep_name else None
+
+    survivor = min(cluster, key=lambda ing: (-usage.get(ing['id'], 0), ing['id']))
+    return survivor, None
+
+
+def recipe_usage(recipes: Iterable[Dict]) -> Dict[int, int]:
+    """Count how many recipes use each ingredient id."""
+    usage = {}
+    for recipe in recipes:
+        for ing_id in {ring['ingredient_id'] for ring in recipe['ingredients']}:
+            usage[ing_id] = usage.get(ing_id, 0) + 1
+    return usage
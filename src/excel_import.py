@@ -0,0 +1,118 @@
+"""
+Incremental reading of Excel workbooks for the import scripts.
+
+An .xlsx file is a zip archive with one XML member per sheet. Change
+detection hashes each sheet's raw XML (plus the shared strings table, where
+its text lives) straight from the archive, before anything is parsed, so an
+unchanged sheet costs a zip read instead of a parse. Only changed sheets are
+parsed with openpyxl's read_only mode, in a process pool when there are
+several of them; each worker opens the workbook once.
+"""
+import hashlib
+import os
+import posixpath
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from xml.etree import ElementTree
+
+from openpyxl import load_workbook
+
+# (sheet_name, content_hash, rows or None if unchanged)
+SheetResult = Tuple[str, str, Optional[Iterable[tuple]]]
+
+MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+REL_ID = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+PACKAGE_REL = '{http://schemas.openxmlformats.org/package/2006/relationships}Relationship'
+SHARED_STRINGS = 'xl/sharedStrings.xml'
+
+# Bytes read from a zip member at a time while hashing
+CHUNK_SIZE = 1 << 16
+
+
+def _sheet_members(archive: zipfile.ZipFile) -> Dict[str, str]:
+    """Map sheet names, in workbook order, to their XML member in the archive."""
+    targets = {}
+    for rel in ElementTree.fromstring(archive.read('xl/_rels/workbook.xml.rels')).iter(PACKAGE_REL):
+        target = rel.get('Target')
+        # Targets are relative to xl/ unless absolute within the package
+        targets[rel.get('Id')] = target.lstrip('/') if target.startswith('/') else posixpath.join('xl', target)
+
+    workbook = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+    return {sheet.get('name'): targets[sheet.get(REL_ID)] for sheet in workbook.iter(f'{MAIN_NS}sheet')}
+
+
+def _hash_member(archive: zipfile.ZipFile, name: str, digest) -> None:
+    with archive.open(name) as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+
+
+def sheet_hashes(path: Path) -> Dict[str, str]:
+    """Hash every sheet's raw XML and the shared strings, in workbook order, without parsing cells."""
+    with zipfile.ZipFile(path) as archive:
+        shared = hashlib.sha256()
+        if SHARED_STRINGS in archive.namelist():
+            _hash_member(archive, SHARED_STRINGS, shared)
+
+        hashes = {}
+        for name, member in _sheet_members(archive).items():
+            digest = shared.copy()
+            _hash_member(archive, member, digest)
+            hashes[name] = digest.hexdigest()
+        return hashes
+
+
+def sheet_names(path: Path) -> List[str]:
+    """List the sheet names of a workbook."""
+    with zipfile.ZipFile(path) as archive:
+        return list(_sheet_members(archive))
+
+
+# The workbook a pool worker opened once, in _open_worker_workbook
+_worker_workbook = None
+
+
+def _open_worker_workbook(path: Path) -> None:
+    global _worker_workbook
+    _worker_workbook = load_workbook(path, read_only=True)
+
+
+def _read_rows(sheet_name: str) -> List[tuple]:
+    """Read one sheet in a pool worker; rows are sent back as a list."""
+    return list(_worker_workbook[sheet_name].iter_rows(values_only=True))
+
+
+def iter_sheets(path: Path, known_hashes: Dict[str, str], jobs: Optional[int] = None) -> Iterator[SheetResult]:
+    """Yield every sheet of the workbook in workbook order.
+
+    known_hashes maps sheet names to hashes from the previous import; those
+    sheets are yielded with rows None, unparsed. Rows of changed sheets are
+    value tuples starting at row 1. With more than one changed sheet and
+    jobs != 1 they are parsed in a process pool and each sheet is yielded as
+    soon as it and all sheets before it are done; otherwise the rows are a
+    stream read while the caller iterates over them, which must happen
+    before the next sheet is requested.
+    """
+    hashes = sheet_hashes(path)
+    changed = {name for name, content_hash in hashes.items() if known_hashes.get(name) != content_hash}
+    jobs = min(jobs or os.cpu_count() or 1, len(changed))
+
+    if jobs <= 1:
+        wb = load_workbook(path, read_only=True) if changed else None
+        try:
+            for name, content_hash in hashes.items():
+                if name in changed:
+                    yield name, content_hash, wb[name].iter_rows(values_only=True)
+                else:
+                    yield name, content_hash, None
+        finally:
+            if wb is not None:
+                wb.close()
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_open_worker_workbook, initargs=(path,)) as pool:
+        futures = {name: pool.submit(_read_rows, name) for name in hashes if name in changed}
+        for name, content_hash in hashes.items():
+            yield name, content_hash, futures[name].result() if name in futures else None
@@ -0,0 +1,156 @@
+"""
+Lightweight instrumentation of the data layer.
+
+data_manager and the storage backends record how often each operation runs,
+how long it takes (as a histogram), bytes read and written, and cache hits and
+misses. Recording is a few dict updates per call, so it is always on; the
+numbers are per process and cumulative. Take a snapshot() before and after a
+piece of work and diff() them to see what that work cost.
+
+Hooks are opt-in callbacks invoked after every timed operation, e.g. to log
+slow calls:
+
+    def log_slow(name, seconds):
+        if seconds > 0.5:
+            print(f"slow: {name} took {seconds:.2f}s")
+
+    instrumentation.add_hook(log_slow)
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Iterator, List
+
+# Upper bounds (ms) of the timing histogram buckets; the last bucket is open
+BUCKETS_MS = [0.01, 0.1, 1, 10, 100, 1000]
+
+Hook = Callable[[str, float], None]
+
+_lock = threading.Lock()
+_counters: Dict[str, int] = {}
+_timings: Dict[str, Dict] = {}
+_hooks: List[Hook] = []
+
+
+def count(name: str, n: int = 1) -> None:
+    """Add n to the counter name (e.g. 'load_data.cache_hit', 'json.bytes_read')."""
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def record(name: str, seconds: float) -> None:
+    """Record one run of operation name that took seconds."""
+    ms = seconds * 1000
+    with _lock:
+        timing = _timings.get(name)
+        if timing is None:
+            timing = _timings[name] = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                                       'buckets': [0] * (len(BUCKETS_MS) + 1)}
+        timing['count'] += 1
+        timing['total_ms'] += ms
+        timing['max_ms'] = max(timing['max_ms'], ms)
+        timing['buckets'][bisect_left(BUCKETS_MS, ms)] += 1
+        hooks = list(_hooks)
+
+    for hook in hooks:
+        hook(name, seconds)
+
+
+@contextmanager
+def timed(name: str) -> Iterator[None]:
+    """Time the enclosed block as one run of operation name."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+def instrument(func: Callable) -> Callable:
+    """Decorator: time every call of func under its function name."""
+    name = func.__name__
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record(name, time.perf_counter() - start)
+    return wrapper
+
+
+def add_hook(hook: Hook) -> Hook:
+    """Call hook(name, seconds) after every timed operation. Returns hook."""
+    with _lock:
+        _hooks.append(hook)
+    return hook
+
+
+def remove_hook(hook: Hook) -> None:
+    """Stop calling a hook added with add_hook()."""
+    with _lock:
+        if hook in _hooks:
+            _hooks.remove(hook)
+
+
+def snapshot() -> Dict:
+    """Return a copy of all counters and timings."""
+    with _lock:
+        return {
+            'counters': dict(_counters),
+            'timings': {
+                name: {**timing, 'buckets': list(timing['buckets'])}
+                for name, timing in _timings.items()
+            },
+        }
+
+
+def diff(before: Dict, after: Dict) -> Dict:
+    """Return what happened between two snapshots, in snapshot() format."""
+    counters = {
+        name: value - before['counters'].get(name, 0)
+        for name, value in after['counters'].items()
+        if value != before['counters'].get(name, 0)
+    }
+    timings = {}
+    for name, timing in after['timings'].items():
+        old = before['timings'].get(name)
+        if old is None:
+            timings[name] = timing
+        elif timing['count'] != old['count']:
+            timings[name] = {
+                'count': timing['count'] - old['count'],
+                'total_ms': timing['total_ms'] - old['total_ms'],
+                # The maximum of the interval itself is not tracked
+                'max_ms': timing['max_ms'],
+                'buckets': [new - prev for new, prev in zip(timing['buckets'], old['buckets'])],
+            }
+    return {'counters': counters, 'timings': timings}
+
+
+def reset() -> None:
+    """Clear all counters and timings (hooks stay registered)."""
+    with _lock:
+        _counters.clear()
+        _timings.clear()
+
+
+def timing_rows(stats: Dict) -> List[Dict]:
+    """Flatten the timings of a snapshot into table rows, slowest total first."""
+    labels = [f"≤{bound:g}ms" for bound in BUCKETS_MS] + [f">{BUCKETS_MS[-1]:g}ms"]
+    rows = []
+    for name, timing in stats['timings'].items():
+        row = {
+            'operation': name,
+            'calls': timing['count'],
+            'total ms': round(timing['total_ms'], 3),
+            'mean ms': round(timing['total_ms'] / timing['count'], 3) if timing['count'] else 0.0,
+            'max ms': round(timing['max_ms'], 3),
+        }
+        row.update(zip(labels, timing['buckets']))
+        rows.append(row)
+    rows.sort(key=lambda row: -row['total ms'])
+    return rows
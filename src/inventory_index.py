@@ -0,0 +1,82 @@
+"""
+Sorted ingredient listing for paginated views.
+
+Keeps ingredient ids ordered by normalized name, once for the whole inventory
+and once per category, so a page of a (category-filtered) listing is a slice
+instead of a sort over everything. Entries are inserted and removed with
+bisect as ingredients change.
+"""
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from name_index import normalize_name
+
+# (normalized name, id): sort key of one listing entry
+Entry = Tuple[str, int]
+
+
+class InventoryIndex:
+    """Ingredients sorted by name, overall and per category."""
+
+    def __init__(self, items: Iterable[Dict] = ()):
+        self._items: Dict[int, Dict] = {}
+        self._entries: Dict[int, Tuple[Entry, str]] = {}
+        self._all: List[Entry] = []
+        self._by_category: Dict[str, List[Entry]] = {}
+
+        # Bulk build: sort once instead of inserting one by one
+        for item in items:
+            if item['id'] not in self._items:
+                entry = (normalize_name(item['name']), item['id'])
+                self._items[item['id']] = item
+                self._entries[item['id']] = (entry, item.get('category', ''))
+                self._all.append(entry)
+                self._by_category.setdefault(item.get('category', ''), []).append(entry)
+        self._all.sort()
+        for entries in self._by_category.values():
+            entries.sort()
+
+    def add(self, item: Dict) -> None:
+        """Index item, replacing any previous entry with the same id."""
+        self.remove(item['id'])
+        entry = (normalize_name(item['name']), item['id'])
+        category = item.get('category', '')
+        self._items[item['id']] = item
+        self._entries[item['id']] = (entry, category)
+        insort(self._all, entry)
+        insort(self._by_category.setdefault(category, []), entry)
+
+    def remove(self, item_id: int) -> None:
+        """Drop the item with item_id from the index."""
+        if item_id not in self._entries:
+            return
+        # Use the name and category as indexed; the item may have changed in place
+        entry, category = self._entries.pop(item_id)
+        del self._items[item_id]
+        _discard(self._all, entry)
+        entries = self._by_category[category]
+        _discard(entries, entry)
+        if not entries:
+            del self._by_category[category]
+
+    def query(self, category: Optional[str] = None, search: str = "",
+              offset: int = 0, limit: Optional[int] = None) -> Tuple[int, List[Dict]]:
+        """Return (total matches, items[offset:offset + limit]) in name order.
+
+        search keeps names containing it (case-insensitive).
+        """
+        entries = self._all if category is None else self._by_category.get(category, [])
+        end = None if limit is None else offset + limit
+
+        search = normalize_name(search)
+        if search:
+            entries = [entry for entry in entries if search in entry[0]]
+
+        return len(entries), [self._items[item_id] for _, item_id in entries[offset:end]]
+
+
+def _discard(entries: List[Entry], entry: Entry) -> None:
+    """Remove entry from a sorted list if present."""
+    i = bisect_left(entries, entry)
+    if i < len(entries) and entries[i] == entry:
+        del entries[i]
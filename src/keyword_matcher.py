@@ -0,0 +1,105 @@
+"""
+Multi-keyword matching with an Aho-Corasick automaton.
+
+All keywords are compiled into one automaton, so a name is scanned once no
+matter how many labels and keywords there are. Each keyword belongs to a label
+(e.g. a category); when several labels match, the one with the best priority
+wins.
+"""
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+class KeywordMatcher:
+    """Find which labels' keywords occur in a text.
+
+    keywords maps label -> keywords. priority lists labels from most to least
+    important (default: the order of keywords). Keywords in whole_word only
+    match when not surrounded by letters or digits, so e.g. "tk" matches
+    "Onions TK" but not a word that merely contains "tk". Matching is
+    case-insensitive.
+    """
+
+    def __init__(self, keywords: Dict[str, Iterable[str]], priority: Optional[List[str]] = None,
+                 whole_word: Iterable[str] = ()):
+        priority = list(priority or [])
+        priority += [label for label in keywords if label not in priority]
+        self._rank = {label: rank for rank, label in enumerate(priority)}
+        self._labels = priority
+        whole_word = {kw.lower() for kw in whole_word}
+
+        # Trie: per state a dict of transitions, its failure link, and the
+        # (keyword length, label rank, whole word) outputs ending there
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[int, int, bool]]] = [[]]
+
+        for label, label_keywords in keywords.items():
+            for keyword in label_keywords:
+                keyword = keyword.lower()
+                if keyword:
+                    self._add(keyword, self._rank[label], keyword in whole_word)
+        self._build_failure_links()
+
+    def _add(self, keyword: str, rank: int, whole_word: bool) -> None:
+        """Insert one keyword into the trie."""
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = next_state
+        self._out[state].append((len(keyword), rank, whole_word))
+
+    def _build_failure_links(self) -> None:
+        """Breadth-first pass that links each state to its longest proper suffix state."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                # Inherit matches of the suffix state so no output is missed
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+
+    def find_all(self, text: str) -> Iterator[Tuple[int, int, str]]:
+        """Yield (start, end, label) for every keyword occurrence in text."""
+        text = text.lower()
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for length, rank, whole_word in self._out[state]:
+                start, end = i - length + 1, i + 1
+                if whole_word and not _is_word(text, start, end):
+                    continue
+                yield start, end, self._labels[rank]
+
+    def match(self, text: str, default: Optional[str] = None) -> Optional[str]:
+        """Return the highest-priority label with a keyword in text, else default."""
+        best_rank = None
+        for _, _, label in self.find_all(text):
+            rank = self._rank[label]
+            if best_rank is None or rank < best_rank:
+                best_rank = rank
+                if rank == 0:
+                    break
+        return self._labels[best_rank] if best_rank is not None else default
+
+    def match_many(self, texts: Iterable[str], default: Optional[str] = None) -> List[Optional[str]]:
+        """Match a batch of texts."""
+        return [self.match(text, default) for text in texts]
+
+
+def _is_word(text: str, start: int, end: int) -> bool:
+    """True if text[start:end] is not directly preceded or followed by a letter or digit."""
+    return (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum())
@@ -0,0 +1,156 @@
+"""
+Stock lots with expiry dates.
+
+An ingredient may keep its stock in lots, [{'amount': 1.5, 'expires':
+'2025-03-01'}, ...], sorted by expiry date. 'amount' stays the total stock;
+whatever the lots do not cover is stock without a known expiry date.
+Consumption is first-expired-first-out: the lot that expires first is used
+first, undated stock last.
+
+ExpiryIndex keeps the lots of all ingredients sorted by expiry date, so "what
+expires in the next N days" is a bisect plus the k lots found instead of a
+pass over the inventory. Like the other indexes it is updated per changed
+ingredient.
+"""
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# (expires, ingredient id, position in the ingredient's lots): sort key of one lot
+Entry = Tuple[str, int, int]
+
+# Lots with less left than this are used up (float rounding)
+EPSILON = 1e-9
+
+
+def dated_amount(item: Dict) -> float:
+    """Stock of item held in lots with an expiry date."""
+    return sum(lot['amount'] for lot in item.get('lots', []))
+
+
+def _insert(lots: List[Dict], amount: float, expires: str) -> None:
+    """Insert a lot in expiry order, merging it into a lot with the same date."""
+    dates = [lot['expires'] for lot in lots]
+    i = bisect_left(dates, expires)
+    if i < len(lots) and lots[i]['expires'] == expires:
+        lots[i]['amount'] += amount
+    else:
+        lots.insert(i, {'amount': amount, 'expires': expires})
+
+
+def add_lot(item: Dict, amount: float, expires: Optional[str] = None) -> None:
+    """Add stock to item, as a lot if it has an expiry date (ISO format)."""
+    item['amount'] = (item.get('amount') or 0) + amount
+    if expires:
+        _insert(item.setdefault('lots', []), amount, expires)
+
+
+def merge_lots(item: Dict, lots: Iterable[Dict]) -> None:
+    """Move lots into item's lots; item['amount'] must already include them."""
+    for lot in lots:
+        _insert(item.setdefault('lots', []), lot['amount'], lot['expires'])
+
+
+def _take(item: Dict, amount: float) -> List[Dict]:
+    """Remove up to amount from item's lots, soonest expiry first; returns what was taken."""
+    lots = item.get('lots', [])
+    taken = []
+    while lots and amount > 0:
+        used = min(amount, lots[0]['amount'])
+        taken.append({'amount': used, 'expires': lots[0]['expires']})
+        amount -= used
+        lots[0]['amount'] -= used
+        if lots[0]['amount'] <= EPSILON:
+            lots.pop(0)
+    return taken
+
+
+def consume(item: Dict, amount: float) -> Tuple[List[Dict], float]:
+    """Use amount of item's stock first-expired-first-out.
+
+    Returns (the lots taken, the amount that was not in stock). Undated stock
+    is used after all lots and shows up as a taken lot with expires None.
+    """
+    stock = item.get('amount') or 0
+    used = min(amount, max(stock, 0))
+    taken = _take(item, used)
+    undated = used - sum(lot['amount'] for lot in taken)
+    if undated > EPSILON:
+        taken.append({'amount': undated, 'expires': None})
+    item['amount'] = stock - used
+    return taken, amount - used
+
+
+def normalize(item: Dict, previous_amount: Optional[float] = None) -> None:
+    """Make item's lots consistent after a direct edit of 'amount' or 'lots'.
+
+    Lots are sorted and empty ones dropped. A lower amount than before is
+    taken from the lots first-expired-first-out, as if it had been consumed,
+    and the lots never hold more than the amount.
+    """
+    if 'lots' not in item:
+        return
+    lots = [lot for lot in item['lots'] if lot.get('amount', 0) > EPSILON and lot.get('expires')]
+    item['lots'] = sorted(lots, key=lambda lot: lot['expires'])
+    amount = item.get('amount') or 0
+    if previous_amount is not None and amount < previous_amount:
+        _take(item, previous_amount - amount)
+    excess = dated_amount(item) - amount
+    if excess > EPSILON:
+        _take(item, excess)
+    if not item['lots']:
+        del item['lots']
+
+
+class ExpiryIndex:
+    """The dated lots of all ingredients, sorted by expiry date."""
+
+    def __init__(self, items: Iterable[Dict] = ()):
+        self._items: Dict[int, Dict] = {}
+        self._entries: Dict[int, List[Entry]] = {}
+        self._lots: Dict[Entry, Dict] = {}
+        self._sorted: List[Entry] = []
+
+        for item in items:
+            if item.get('lots') and item['id'] not in self._items:
+                self._index(item, self._sorted.append)
+        self._sorted.sort()
+
+    def _index(self, item: Dict, insert) -> None:
+        entries = []
+        for position, lot in enumerate(item['lots']):
+            entry = (lot['expires'], item['id'], position)
+            self._lots[entry] = lot
+            entries.append(entry)
+            insert(entry)
+        self._items[item['id']] = item
+        self._entries[item['id']] = entries
+
+    def update(self, item: Dict) -> None:
+        """Re-index the lots of item (added or changed)."""
+        self.remove(item['id'])
+        if item.get('lots'):
+            self._index(item, lambda entry: insort(self._sorted, entry))
+
+    def remove(self, item_id: int) -> None:
+        """Drop the lots of item_id."""
+        # The entries as indexed; the lots may have changed in place
+        entries = self._entries.pop(item_id, None)
+        if entries is None:
+            return
+        del self._items[item_id]
+        for entry in entries:
+            del self._lots[entry]
+            i = bisect_left(self._sorted, entry)
+            del self._sorted[i]
+
+    def expiring(self, until: str, since: Optional[str] = None,
+                 limit: Optional[int] = None) -> List[Tuple[str, Dict, Dict]]:
+        """Up to limit (expires, item, lot) of the lots expiring on or before until, soonest first.
+
+        With since, lots that expired before it are left out.
+        """
+        start = bisect_left(self._sorted, (since,)) if since else 0
+        end = bisect_right(self._sorted, (until, float('inf')))
+        if limit is not None:
+            end = min(end, start + limit)
+        return [(entry[0], self._items[entry[1]], self._lots[entry]) for entry in self._sorted[start:end]]
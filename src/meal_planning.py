@@ -0,0 +1,267 @@
+"""
+Multi-recipe meal plan aggregation.
+
+Recipes are stored as a sparse recipe x ingredient matrix (grams per person),
+so the total demand of a whole plan is computed in one NumPy pass instead of
+one calculate_meal_requirements call per recipe. The same matrix, divided into
+the stock vector, gives the number of servings every recipe can make.
+"""
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from units import ConversionTable
+
+# Sort key for plan entries without a date
+NO_DATE = np.iinfo(np.int64).max
+
+PlanEntry = Tuple[int, int, Optional[Union[date, str]]]
+
+
+class RequirementMatrix:
+    """Recipe x ingredient matrix of grams per person in CSR layout.
+
+    Row r holds recipe recipe_ids[r]; its non-zero entries are
+    cols[indptr[r]:indptr[r + 1]] with grams[indptr[r]:indptr[r + 1]].
+    Columns index ingredient_ids.
+    """
+
+    def __init__(self, ingredients_by_id: Dict[int, Dict], recipes_by_id: Dict[int, Dict]):
+        self.ingredient_ids = list(ingredients_by_id)
+        self.ingredient_col = {ing_id: col for col, ing_id in enumerate(self.ingredient_ids)}
+        self.recipe_ids = list(recipes_by_id)
+        self.recipe_row = {recipe_id: row for row, recipe_id in enumerate(self.recipe_ids)}
+
+        indptr = [0]
+        cols = []
+        grams = []
+        for recipe in recipes_by_id.values():
+            for ring in recipe['ingredients']:
+                col = self.ingredient_col.get(ring['ingredient_id'])
+                # Skip references to ingredients that no longer exist
+                if col is not None:
+                    cols.append(col)
+                    grams.append(ring['quantity_grams'])
+            indptr.append(len(cols))
+
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.cols = np.asarray(cols, dtype=np.int64)
+        self.grams = np.asarray(grams, dtype=np.float64)
+
+        # Stock in grams per column; NaN where the measurement cannot be converted
+        self.ingredients = [ingredients_by_id[ing_id] for ing_id in self.ingredient_ids]
+        self.conversions = ConversionTable(self.ingredients)
+        self.available_grams = self.conversions.available_grams()
+
+    @classmethod
+    def from_columns(cls, ingredients_by_id: Dict[int, Dict], recipes_by_id: Dict[int, Dict],
+                     columns: Dict[str, np.ndarray]) -> Optional['RequirementMatrix']:
+        """Build the matrix from columnar storage (see ArrowBackend.columns) in vectorized passes.
+
+        columns must describe the same data as the dicts. Returns None if
+        ids are duplicated, where the dict-based build decides which entity wins.
+        """
+        ingredient_ids = columns['ingredient_id']
+        recipe_ids = columns['recipe_id']
+        if len(ingredient_ids) != len(ingredients_by_id) or len(recipe_ids) != len(recipes_by_id):
+            return None
+
+        matrix = cls.__new__(cls)
+        matrix.ingredient_ids = ingredient_ids.tolist()
+        matrix.ingredient_col = {ing_id: col for col, ing_id in enumerate(matrix.ingredient_ids)}
+        matrix.recipe_ids = recipe_ids.tolist()
+        matrix.recipe_row = {recipe_id: row for row, recipe_id in enumerate(matrix.recipe_ids)}
+
+        # Map ingredient ids to columns with a sorted lookup; unknown ids are dropped
+        ring_ids = columns['ring_ingredient_id']
+        order = np.argsort(ingredient_ids, kind='stable')
+        found = np.searchsorted(ingredient_ids, ring_ids, sorter=order)
+        found = np.minimum(found, max(len(order) - 1, 0))
+        known = ingredient_ids[order[found]] == ring_ids if len(order) else np.zeros(len(ring_ids), dtype=bool)
+
+        rows = np.repeat(np.arange(len(recipe_ids)), columns['num_ingredients'])
+        matrix.indptr = np.concatenate([[0], np.cumsum(np.bincount(rows[known], minlength=len(recipe_ids)))])
+        matrix.cols = order[found[known]].astype(np.int64)
+        matrix.grams = np.asarray(columns['quantity_grams'][known], dtype=np.float64)
+
+        matrix.ingredients = [ingredients_by_id[ing_id] for ing_id in matrix.ingredient_ids]
+        matrix.conversions = ConversionTable.from_columns(
+            columns['measurement'], columns['amount'], columns['density'], columns['piece_grams'])
+        matrix.available_grams = matrix.conversions.available_grams()
+        return matrix
+
+    def update_stock(self, ingredient: Dict) -> bool:
+        """Refresh the stock of a changed ingredient in place.
+
+        Returns False if the ingredient has no column (it is new), in which
+        case the matrix must be rebuilt.
+        """
+        col = self.ingredient_col.get(ingredient['id'])
+        if col is None:
+            return False
+        self.ingredients[col] = ingredient
+        self.conversions.update(col, ingredient)
+        self.available_grams[col] = self.conversions.amounts[col] * self.conversions.factors[col]
+        return True
+
+
+def _date_ordinal(value: Optional[Union[date, str]]) -> int:
+    """Convert a plan date (date, ISO string or None) to a sortable ordinal."""
+    if value is None or value == '':
+        return NO_DATE
+    if isinstance(value, str):
+        value = date.fromisoformat(value)
+    return value.toordinal()
+
+
+def aggregate_plan(matrix: RequirementMatrix, plan: Iterable[PlanEntry]) -> Dict:
+    """Compute total demand, shortfall and a shopping list for a meal plan.
+
+    plan is a list of (recipe_id, num_people, date) entries; date may be None.
+    """
+    plan = list(plan)
+    known = [entry for entry in plan if entry[0] in matrix.recipe_row]
+    missing_recipes = sorted({entry[0] for entry in plan if entry[0] not in matrix.recipe_row})
+
+    n_cols = len(matrix.ingredient_ids)
+    if known:
+        rows = np.array([matrix.recipe_row[entry[0]] for entry in known], dtype=np.int64)
+        people = np.array([entry[1] for entry in known], dtype=np.float64)
+        dates = np.array([_date_ordinal(entry[2]) for entry in known], dtype=np.int64)
+
+        # Expand every plan entry into its recipe's non-zero matrix entries
+        starts = matrix.indptr[rows]
+        counts = matrix.indptr[rows + 1] - starts
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        positions = np.repeat(starts, counts) + offsets
+        cols = matrix.cols[positions]
+
+        demand = np.bincount(cols, weights=matrix.grams[positions] * np.repeat(people, counts), minlength=n_cols)
+        first_needed = np.full(n_cols, NO_DATE, dtype=np.int64)
+        np.minimum.at(first_needed, cols, np.repeat(dates, counts))
+    else:
+        demand = np.zeros(n_cols)
+        first_needed = np.full(n_cols, NO_DATE, dtype=np.int64)
+
+    available = matrix.available_grams
+    can_compare = ~np.isnan(available)
+    shortfall = np.where(can_compare, np.maximum(0.0, demand - np.nan_to_num(available)), demand)
+
+    requirements = []
+    for col in np.flatnonzero(demand > 0):
+        ing = matrix.ingredients[col]
+        requirements.append({
+            'ingredient_id': matrix.ingredient_ids[col],
+            'name': ing['name'],
+            'required_quantity': float(demand[col]),
+            'available_quantity': float(available[col]) if can_compare[col] else 0.0,
+            'measurement': ing.get('measurement', 'pieces'),
+            'raw_amount': ing.get('amount', 0),
+            'can_compare': bool(can_compare[col]),
+            'is_sufficient': bool(can_compare[col] and shortfall[col] == 0),
+            'shortfall': float(shortfall[col]),
+            'first_needed': (
+                date.fromordinal(int(first_needed[col])).isoformat()
+                if first_needed[col] != NO_DATE else None
+            )
+        })
+    requirements.sort(key=lambda req: req['name'].lower())
+
+    return {
+        'num_meals': len(known),
+        'total_servings': int(sum(entry[1] for entry in known)),
+        'missing_recipes': missing_recipes,
+        'requirements': requirements,
+        'shopping_list': [req for req in requirements if req['shortfall'] > 0]
+    }
+
+
+def max_servings(matrix: RequirementMatrix) -> Dict[str, np.ndarray]:
+    """Servings every recipe can make from the current stock, in one pass.
+
+    The servings of a recipe are the smallest ratio of stock to grams per
+    person over its ingredients. Ingredients whose stock cannot be converted
+    to grams are left out of the minimum and counted instead. Returns arrays
+    indexed by matrix row: 'servings' (floored; -1 where nothing could be
+    checked), 'limiting_col' (-1 where none) and 'unknown' (count).
+    """
+    n_rows = len(matrix.recipe_ids)
+    counts = np.diff(matrix.indptr)
+    rows = np.repeat(np.arange(n_rows), counts)
+
+    # Ratios of unknown stock or zero-gram lines can never be the minimum
+    available = matrix.available_grams[matrix.cols]
+    unknown = np.isnan(available)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratios = np.where(unknown | (matrix.grams <= 0), np.inf, available / matrix.grams)
+
+    # Minimum per CSR segment, then the first entry of each segment that
+    # reaches it is the recipe's limiting ingredient
+    non_empty = counts > 0
+    row_min = np.minimum.reduceat(ratios, matrix.indptr[:-1][non_empty]) if len(ratios) else ratios
+    at_min = np.flatnonzero(ratios == np.repeat(row_min, counts[non_empty]))
+    first = at_min[np.flatnonzero(np.diff(rows[at_min], prepend=-1))]
+
+    servings = np.full(n_rows, -1, dtype=np.int64)
+    limiting_col = np.full(n_rows, -1, dtype=np.int64)
+    checked = np.isfinite(ratios[first])
+    checked_rows = np.flatnonzero(non_empty)[checked]
+    servings[checked_rows] = np.floor(np.maximum(ratios[first][checked], 0.0))
+    limiting_col[checked_rows] = matrix.cols[first][checked]
+
+    return {
+        'servings': servings,
+        'limiting_col': limiting_col,
+        'unknown': np.bincount(rows[unknown], minlength=n_rows),
+    }
+
+
+def expiring_use(matrix: RequirementMatrix, expiring_grams: np.ndarray) -> np.ndarray:
+    """Grams of soon-expiring stock (grams per column) one serving of every recipe uses."""
+    rows = np.repeat(np.arange(len(matrix.recipe_ids)), np.diff(matrix.indptr))
+    use = np.minimum(matrix.grams, expiring_grams[matrix.cols])
+    return np.bincount(rows, weights=use, minlength=len(matrix.recipe_ids))
+
+
+def rank_recipes(matrix: RequirementMatrix, recipes_by_id: Dict[int, Dict],
+                 min_servings: int = 0, limit: Optional[int] = None,
+                 expiring_grams: Optional[np.ndarray] = None) -> List[Dict]:
+    """Recipes ranked by the servings the stock supports, most first.
+
+    Fully checked recipes come first. Recipes with ingredients whose stock
+    cannot be converted to grams follow, as their servings are only an upper
+    bound; those with nothing that could be checked come last (max_servings
+    None). Recipes without ingredients are left out. Given the grams of
+    stock that expire soon per column, recipes using more of it rank first
+    within each of these groups.
+    """
+    result = max_servings(matrix)
+    servings = result['servings']
+    unknown = result['unknown']
+    expiring = (expiring_use(matrix, expiring_grams) if expiring_grams is not None
+                else np.zeros(len(matrix.recipe_ids)))
+
+    keep = np.flatnonzero((servings >= min_servings) | ((servings < 0) & (unknown > 0)))
+    # lexsort sorts by its last key first: fully checked or not, expiring
+    # stock used, servings (descending; -1 ends up last), then the number of
+    # unchecked ingredients
+    ranked = keep[np.lexsort((unknown[keep], -servings[keep], -expiring[keep], unknown[keep] > 0))][:limit]
+
+    rows = []
+    for row in ranked:
+        recipe = recipes_by_id[matrix.recipe_ids[row]]
+        col = result['limiting_col'][row]
+        start, end = matrix.indptr[row], matrix.indptr[row + 1]
+        rows.append({
+            'recipe_id': recipe['id'],
+            'name': recipe['name'],
+            'max_servings': int(servings[row]) if servings[row] >= 0 else None,
+            'limiting_ingredient': matrix.ingredients[col]['name'] if col >= 0 else None,
+            'expiring_grams': float(expiring[row]),
+            'unchecked_ingredients': [
+                matrix.ingredients[c]['name']
+                for c in matrix.cols[start:end][np.isnan(matrix.available_grams[matrix.cols[start:end]])]
+            ] if unknown[row] else [],
+        })
+    return rows
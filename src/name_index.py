@@ -0,0 +1,105 @@
+"""
+Name index for matching ingredient names.
+
+Offers an O(1) exact lookup on the normalized name and a trigram index for
+fuzzy lookups, so misspellings like "Carotts" still find "Carrots" without
+comparing against every stored name.
+"""
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+def normalize_name(name: str) -> str:
+    """Normalize ingredient name for comparison."""
+    return name.lower().strip()
+
+
+def trigrams(name: str) -> Set[str]:
+    """Return the character trigrams of a normalized name, padded at both ends."""
+    padded = f"  {' '.join(name.split())} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(a: str, b: str) -> float:
+    """Dice coefficient of the trigram sets of two names (1.0 = same trigrams)."""
+    grams_a, grams_b = trigrams(normalize_name(a)), trigrams(normalize_name(b))
+    if not grams_a or not grams_b:
+        return 0.0
+    return 2 * len(grams_a & grams_b) / (len(grams_a) + len(grams_b))
+
+
+class NameIndex:
+    """Exact and fuzzy lookup of items (dicts with 'id' and 'name') by name."""
+
+    def __init__(self, items: Iterable[Dict] = ()):
+        self._items: Dict[int, Dict] = {}
+        self._names: Dict[int, str] = {}
+        self._grams: Dict[int, Set[str]] = {}
+        self._exact: Dict[str, List[int]] = {}
+        self._postings: Dict[str, Set[int]] = {}
+        for item in items:
+            self.add(item)
+
+    def add(self, item: Dict) -> None:
+        """Index item, replacing any previous entry with the same id."""
+        if item['id'] in self._items:
+            self.remove(item['id'])
+
+        norm_name = normalize_name(item['name'])
+        grams = trigrams(norm_name)
+        self._items[item['id']] = item
+        self._names[item['id']] = norm_name
+        self._grams[item['id']] = grams
+        self._exact.setdefault(norm_name, []).append(item['id'])
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(item['id'])
+
+    def remove(self, item_id: int) -> None:
+        """Drop the item with item_id from the index."""
+        if self._items.pop(item_id, None) is None:
+            return
+
+        # Use the name as indexed; the item itself may have been renamed in place
+        norm_name = self._names.pop(item_id)
+        ids = self._exact[norm_name]
+        ids.remove(item_id)
+        if not ids:
+            del self._exact[norm_name]
+
+        for gram in self._grams.pop(item_id):
+            postings = self._postings[gram]
+            postings.discard(item_id)
+            if not postings:
+                del self._postings[gram]
+
+    def exact(self, name: str) -> Optional[Dict]:
+        """Return the first item whose normalized name equals name's."""
+        ids = self._exact.get(normalize_name(name))
+        return self._items[ids[0]] if ids else None
+
+    def fuzzy(self, name: str, threshold: float = 0.5, limit: int = 5) -> List[Tuple[float, Dict]]:
+        """Return up to limit (score, item) pairs with similarity >= threshold, best first."""
+        grams = trigrams(normalize_name(name))
+        if not grams:
+            return []
+
+        # Count shared trigrams using only the postings of name's trigrams
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+
+        scored = []
+        for item_id, count in shared.items():
+            score = 2 * count / (len(grams) + len(self._grams[item_id]))
+            if score >= threshold:
+                scored.append((score, self._items[item_id]))
+        scored.sort(key=lambda pair: (-pair[0], pair[1]['id']))
+        return scored[:limit]
+
+    def find(self, name: str, threshold: float = 0.5) -> Optional[Dict]:
+        """Return the exact match for name, else the best fuzzy match above threshold."""
+        item = self.exact(name)
+        if item is not None:
+            return item
+        matches = self.fuzzy(name, threshold, limit=1)
+        return matches[0][1] if matches else None
@@ -0,0 +1,284 @@
+"""
+Meal plans optimized against the current stock.
+
+Either fills a fixed number of meals so that as little as possible has to be
+bought, or finds as many meals as the stock alone can cover. Candidates are
+scored on the RequirementMatrix: the extra shortfall every recipe would add to
+the plan so far is one vectorized pass over their CSR entries. A greedy
+construction is then improved by local search until no move helps or the
+time budget runs out.
+
+Stock that cannot be converted to grams (pieces without a piece weight)
+counts as not available, so such ingredients end up on the shopping list.
+Given the stock that expires soon, plans that are otherwise equally good are
+broken in favour of the one using more of it.
+"""
+import random
+import time
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from meal_planning import RequirementMatrix
+
+# Plans longer than this are not searched when maximizing meals
+MAX_PLAN_MEALS = 100
+
+# Shortfall (grams) below which a meal counts as covered by stock
+EPSILON = 1e-9
+
+# Local search moves without improvement before maximizing gives up early
+PATIENCE = 200
+
+
+class _Candidates:
+    """The recipes a plan may use, expanded into flat entry arrays for one head-count."""
+
+    def __init__(self, matrix: RequirementMatrix, rows: np.ndarray, num_people: int,
+                 expiring_grams: Optional[np.ndarray] = None):
+        counts = matrix.indptr[rows + 1] - matrix.indptr[rows]
+        keep = counts > 0
+        self.rows = rows[keep]
+        counts = counts[keep]
+
+        starts = matrix.indptr[self.rows]
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        positions = np.repeat(starts, counts) + offsets
+
+        self.cols = matrix.cols[positions]
+        self.grams = matrix.grams[positions] * num_people
+        self.entry_start = np.cumsum(counts) - counts
+        self.entry_end = self.entry_start + counts
+        self.available = np.nan_to_num(matrix.available_grams, nan=0.0)
+        self.expiring = (np.minimum(np.nan_to_num(expiring_grams, nan=0.0), self.available)
+                         if expiring_grams is not None else np.zeros(len(self.available)))
+        self.prefers_expiring = bool(self.expiring.any())
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def entries(self, i: int) -> slice:
+        return slice(self.entry_start[i], self.entry_end[i])
+
+    def added_shortfall(self, demand: np.ndarray) -> np.ndarray:
+        """Extra grams to buy if each candidate were added to a plan with demand."""
+        if not len(self):
+            return np.zeros(0)
+        before = demand[self.cols] - self.available[self.cols]
+        delta = np.maximum(0.0, before + self.grams) - np.maximum(0.0, before)
+        return np.add.reduceat(delta, self.entry_start)
+
+    def stock_pressure(self, demand: np.ndarray) -> np.ndarray:
+        """Share of the remaining stock each candidate would use, summed over its ingredients."""
+        if not len(self):
+            return np.zeros(0)
+        remaining = self.available[self.cols] - demand[self.cols]
+        share = np.divide(self.grams, remaining, out=np.full(len(self.grams), np.inf), where=remaining > 0)
+        share[self.grams <= 0] = 0.0
+        return np.add.reduceat(share, self.entry_start)
+
+    def expiring_use(self, demand: np.ndarray) -> np.ndarray:
+        """Extra grams of soon-expiring stock each candidate would use in a plan with demand."""
+        if not len(self):
+            return np.zeros(0)
+        before = np.minimum(demand[self.cols], self.expiring[self.cols])
+        after = np.minimum(demand[self.cols] + self.grams, self.expiring[self.cols])
+        return np.add.reduceat(after - before, self.entry_start)
+
+    def add(self, demand: np.ndarray, i: int, sign: float = 1.0) -> None:
+        """Add (or with sign=-1 remove) one meal of candidate i to demand."""
+        entries = self.entries(i)
+        np.add.at(demand, self.cols[entries], sign * self.grams[entries])
+
+
+class _Plan:
+    """Candidate indexes of the planned meals with the demand and limits they imply."""
+
+    def __init__(self, candidates: _Candidates, tags: List[str], max_repeats: int, max_per_tag: Optional[int]):
+        self.candidates = candidates
+        self.max_repeats = max_repeats
+        self.max_per_tag = max_per_tag
+        self.meals: List[int] = []
+        self.demand = np.zeros(len(candidates.available))
+        self.repeats = np.zeros(len(candidates), dtype=np.int64)
+
+        # Tags as numbers; untagged recipes are not limited by max_per_tag
+        tag_numbers: Dict[str, int] = {}
+        self.tag_of = np.array([tag_numbers.setdefault(tag, len(tag_numbers)) for tag in tags], dtype=np.int64)
+        self.limited_tags = np.array([bool(tag) for tag in tag_numbers], dtype=bool)
+        self.tag_counts = np.zeros(len(tag_numbers), dtype=np.int64)
+
+    def copy(self) -> '_Plan':
+        plan = _Plan.__new__(_Plan)
+        plan.__dict__.update(self.__dict__)
+        plan.meals = list(self.meals)
+        plan.demand = self.demand.copy()
+        plan.repeats = self.repeats.copy()
+        plan.tag_counts = self.tag_counts.copy()
+        return plan
+
+    def blocked(self) -> np.ndarray:
+        """Candidates that may not be added without breaking a constraint."""
+        blocked = self.repeats >= self.max_repeats
+        if self.max_per_tag is not None:
+            full = self.limited_tags & (self.tag_counts >= self.max_per_tag)
+            blocked |= full[self.tag_of]
+        return blocked
+
+    def add(self, i: int, slot: Optional[int] = None) -> None:
+        self.candidates.add(self.demand, i)
+        self.repeats[i] += 1
+        self.tag_counts[self.tag_of[i]] += 1
+        if slot is None:
+            self.meals.append(i)
+        else:
+            self.meals.insert(slot, i)
+
+    def remove(self, slot: int) -> int:
+        i = self.meals.pop(slot)
+        self.candidates.add(self.demand, i, -1.0)
+        self.repeats[i] -= 1
+        self.tag_counts[self.tag_of[i]] -= 1
+        return i
+
+    def shortfall(self) -> float:
+        return float(np.maximum(0.0, self.demand - self.candidates.available).sum())
+
+    def expiring_used(self) -> float:
+        return float(np.minimum(self.demand, self.candidates.expiring).sum())
+
+
+def _best_addition(plan: _Plan, covered_only: bool) -> Optional[int]:
+    """Candidate to add next: least extra shortfall, then most stock used up.
+
+    With covered_only, only candidates the remaining stock fully covers
+    qualify, and the one using the smallest share of it wins.
+    """
+    cost = plan.candidates.added_shortfall(plan.demand)
+    cost[plan.blocked()] = np.inf
+    if covered_only:
+        pressure = plan.candidates.stock_pressure(plan.demand)
+        pressure[cost > EPSILON] = np.inf
+        best = int(np.argmin(pressure)) if len(pressure) else -1
+        return best if best >= 0 and np.isfinite(pressure[best]) else None
+
+    if not len(cost) or not np.isfinite(cost.min()):
+        return None
+    # Among equally cheap meals prefer the ones using up expiring stock, then
+    # the ones eating into the stock most
+    tied = np.flatnonzero(cost <= cost.min() + EPSILON)
+    if plan.candidates.prefers_expiring:
+        rescued = plan.candidates.expiring_use(plan.demand)[tied]
+        tied = tied[rescued >= rescued.max() - EPSILON]
+    used = plan.candidates.stock_pressure(plan.demand)[tied]
+    used[~np.isfinite(used)] = 0.0
+    return int(tied[np.argmax(used)])
+
+
+def _fill(plan: _Plan, num_meals: int) -> None:
+    """Greedy: add the cheapest meal until num_meals are planned."""
+    while len(plan.meals) < num_meals:
+        best = _best_addition(plan, covered_only=False)
+        if best is None:
+            break
+        plan.add(best)
+
+
+def _improve(plan: _Plan, deadline: float) -> None:
+    """Local search: replace single meals by the best alternative while that lowers the shortfall."""
+    improved = True
+    while improved:
+        improved = False
+        for slot in range(len(plan.meals)):
+            if time.perf_counter() >= deadline:
+                return
+            current = plan.remove(slot)
+            cost = plan.candidates.added_shortfall(plan.demand)
+            cost[plan.blocked()] = np.inf
+            best = int(np.argmin(cost))
+            if cost[best] < cost[current] - EPSILON:
+                improved = True
+                current = best
+            elif plan.candidates.prefers_expiring:
+                # Same shortfall, more expiring stock used
+                rescued = plan.candidates.expiring_use(plan.demand)
+                rescued[cost > cost[current] + EPSILON] = -np.inf
+                best = int(np.argmax(rescued))
+                if rescued[best] > rescued[current] + EPSILON:
+                    improved = True
+                    current = best
+            plan.add(current, slot)
+
+
+def _fill_covered(plan: _Plan, max_meals: int) -> None:
+    """Greedy: add meals the stock covers, lightest on the remaining stock first."""
+    while len(plan.meals) < max_meals:
+        best = _best_addition(plan, covered_only=True)
+        if best is None:
+            break
+        plan.add(best)
+
+
+def _maximize(plan: _Plan, max_meals: int, deadline: float, seed: int) -> _Plan:
+    """Ruin and recreate: drop a few random meals, refill greedily, keep the longest plan.
+
+    Of equally long plans, the one using the most expiring stock is kept.
+    """
+    rng = random.Random(seed)
+    _fill_covered(plan, max_meals)
+    best = plan
+    stale = 0
+    while plan.meals and len(best.meals) < max_meals and stale < PATIENCE and time.perf_counter() < deadline:
+        trial = plan.copy()
+        for _ in range(min(len(trial.meals), rng.randint(1, 3))):
+            trial.remove(rng.randrange(len(trial.meals)))
+        _fill_covered(trial, max_meals)
+        if len(trial.meals) >= len(plan.meals):
+            # Sideways moves keep the search moving across equally long plans
+            plan = trial
+        if len(plan.meals) > len(best.meals) or (
+                len(plan.meals) == len(best.meals) and plan.expiring_used() > best.expiring_used() + EPSILON):
+            best, stale = plan, 0
+        else:
+            stale += 1
+    return best
+
+
+def optimize(matrix: RequirementMatrix, recipes_by_id: Dict[int, Dict], num_people: int,
+             num_meals: Optional[int] = None, vegie_only: bool = False, tags: Optional[Iterable[str]] = None,
+             max_repeats: int = 1, max_per_tag: Optional[int] = None, time_budget: float = 1.0,
+             seed: int = 0, expiring_grams: Optional[np.ndarray] = None) -> Dict:
+    """Choose recipes for a meal plan.
+
+    With num_meals, plans that many meals for num_people and minimizes the
+    grams that have to be bought. Without it, plans as many meals as the
+    stock covers with nothing to buy (up to MAX_PLAN_MEALS). Only recipes
+    with vegie 'yes' qualify if vegie_only; tags restricts the recipe tags.
+    A recipe is used at most max_repeats times and a tag at most
+    max_per_tag times. expiring_grams (per matrix column) is the stock that
+    expires soon; ties go to plans using more of it. Returns {'recipe_ids',
+    'shortfall_grams', 'unfilled'}.
+    """
+    allowed_tags = set(tags) if tags is not None else None
+    rows = np.array([
+        row for row, recipe_id in enumerate(matrix.recipe_ids)
+        if (not vegie_only or recipes_by_id[recipe_id].get('vegie') == 'yes')
+        and (allowed_tags is None or recipes_by_id[recipe_id].get('tag', '') in allowed_tags)
+    ], dtype=np.int64)
+
+    candidates = _Candidates(matrix, rows, num_people, expiring_grams)
+    candidate_tags = [recipes_by_id[matrix.recipe_ids[row]].get('tag', '') for row in candidates.rows]
+    plan = _Plan(candidates, candidate_tags, max_repeats, max_per_tag)
+    deadline = time.perf_counter() + time_budget
+
+    if num_meals is None:
+        plan = _maximize(plan, MAX_PLAN_MEALS, deadline, seed)
+    else:
+        _fill(plan, num_meals)
+        _improve(plan, deadline)
+
+    return {
+        'recipe_ids': [matrix.recipe_ids[candidates.rows[i]] for i in plan.meals],
+        'shortfall_grams': plan.shortfall(),
+        'unfilled': (num_meals - len(plan.meals)) if num_meals is not None else 0,
+    }
@@ -0,0 +1,175 @@
+"""
+Full-text search over ingredients and recipes.
+
+An inverted index maps every word of the indexed fields to the documents
+containing it, weighted by field (a match in a name counts more than one in a
+comment). The vocabulary is kept sorted, so the last word of a query also
+matches as a prefix ("onio" finds "Onions") with a bisect instead of a scan.
+Documents are added and removed one at a time as the data changes.
+"""
+import heapq
+import re
+from bisect import bisect_left, insort
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+# Field weights per document kind
+FIELD_WEIGHTS = {
+    'ingredient': {'name': 3.0, 'category': 1.0},
+    'recipe': {'name': 3.0, 'tag': 2.0, 'comments': 1.0},
+}
+
+# Score factor for a word that only matches as a prefix
+PREFIX_FACTOR = 0.5
+
+# Shorter last words are matched exactly only; one or two letters would
+# expand to a large part of the vocabulary
+MIN_PREFIX = 2
+
+_WORD = re.compile(r'\w+')
+
+# (kind, id), e.g. ('recipe', 12)
+DocKey = Tuple[str, Hashable]
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase words."""
+    return _WORD.findall(str(text).lower()) if text else []
+
+
+class SearchIndex:
+    """Inverted index of words to (kind, id) documents with field weights."""
+
+    def __init__(self):
+        self._docs: Dict[DocKey, Dict] = {}
+        self._doc_terms: Dict[DocKey, Dict[str, float]] = {}
+        self._postings: Dict[str, Dict[DocKey, float]] = {}
+        # The same postings grouped by weight (dicts used as ordered sets), so
+        # the best matches of a single word are found without scoring them all
+        self._tiers: Dict[str, Dict[float, Dict[DocKey, None]]] = {}
+        self._vocabulary: List[str] = []
+
+    def add(self, kind: str, item: Dict) -> None:
+        """Index item (a dict with 'id'), replacing any previous version of it."""
+        key = (kind, item['id'])
+        self.remove(kind, item['id'])
+
+        terms: Dict[str, float] = {}
+        for field, weight in FIELD_WEIGHTS[kind].items():
+            for term in tokenize(item.get(field, '')):
+                terms[term] = terms.get(term, 0.0) + weight
+
+        self._docs[key] = item
+        self._doc_terms[key] = terms
+        for term, weight in terms.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                self._tiers[term] = {}
+                insort(self._vocabulary, term)
+            postings[key] = weight
+            self._tiers[term].setdefault(weight, {})[key] = None
+
+    def add_many(self, kind: str, items: Iterable[Dict]) -> None:
+        """Index many items."""
+        for item in items:
+            self.add(kind, item)
+
+    def remove(self, kind: str, item_id: Hashable) -> None:
+        """Drop a document from the index."""
+        key = (kind, item_id)
+        terms = self._doc_terms.pop(key, None)
+        if terms is None:
+            return
+        del self._docs[key]
+        for term, weight in terms.items():
+            postings = self._postings[term]
+            del postings[key]
+            tier = self._tiers[term][weight]
+            del tier[key]
+            if not tier:
+                del self._tiers[term][weight]
+            if not postings:
+                del self._postings[term]
+                del self._tiers[term]
+                i = bisect_left(self._vocabulary, term)
+                del self._vocabulary[i]
+
+    def _prefix_terms(self, prefix: str) -> List[str]:
+        """Vocabulary words starting with prefix."""
+        start = bisect_left(self._vocabulary, prefix)
+        end = bisect_left(self._vocabulary, prefix + '\uffff', start)
+        return self._vocabulary[start:end]
+
+    def _matching_terms(self, word: str, prefix: bool) -> Dict[str, float]:
+        """Vocabulary words matching one query word, with their score factor."""
+        terms = {word: 1.0} if word in self._postings else {}
+        if prefix and len(word) >= MIN_PREFIX:
+            for term in self._prefix_terms(word):
+                terms.setdefault(term, PREFIX_FACTOR)
+        return terms
+
+    def search(self, query: str, kinds: Optional[Iterable[str]] = None,
+               limit: int = 20) -> List[Tuple[float, str, Dict]]:
+        """Return up to limit (score, kind, item) matches for query, best first.
+
+        Every word of query must match; the last one may match as a prefix.
+        Equal scores keep the order in which documents were indexed.
+        """
+        words = tokenize(query)
+        if not words or limit <= 0:
+            return []
+        kinds: Optional[Set[str]] = set(kinds) if kinds is not None else None
+
+        matches = [self._matching_terms(word, prefix=i == len(words) - 1) for i, word in enumerate(words)]
+        if not all(matches):
+            return []
+
+        # Candidates come from the rarest word, visited by weight tier, best
+        # first; the other words are looked up in each candidate's own words.
+        # Once no remaining document can beat the current top results, stop.
+        sizes = [sum(len(self._postings[term]) for term in terms) for terms in matches]
+        rarest = matches.pop(sizes.index(min(sizes)))
+        bound = sum(max(max(self._tiers[term]) * factor for term, factor in terms.items()) for terms in matches)
+        tiers = sorted(
+            ((weight * factor, keys) for term, factor in rarest.items() for weight, keys in self._tiers[term].items()),
+            key=lambda tier: -tier[0],
+        )
+
+        scores: Dict[DocKey, float] = {}
+        top: List[float] = []  # min-heap of the best limit scores so far
+        for tier_score, keys in tiers:
+            for key in keys:
+                if len(top) == limit and tier_score + bound <= top[0]:
+                    return self._ranked(scores, limit)
+                # A document's first (best scored) tier is its score
+                if key in scores or (kinds is not None and key[0] not in kinds):
+                    continue
+                score = tier_score + self._other_words_score(key, matches)
+                if not score > tier_score and matches:
+                    scores[key] = 0.0
+                    continue
+                scores[key] = score
+                if len(top) < limit:
+                    heapq.heappush(top, score)
+                elif score > top[0]:
+                    heapq.heapreplace(top, score)
+
+        return self._ranked(scores, limit)
+
+    def _other_words_score(self, key: DocKey, matches: List[Dict[str, float]]) -> float:
+        """Sum of the best match of every other query word in a document; 0 if one is missing."""
+        doc_terms = self._doc_terms[key]
+        total = 0.0
+        for terms in matches:
+            best = max((weight * terms[term] for term, weight in doc_terms.items() if term in terms), default=0.0)
+            if not best:
+                return 0.0
+            total += best
+        return total
+
+    def _ranked(self, scores: Dict[DocKey, float], limit: int) -> List[Tuple[float, str, Dict]]:
+        """The limit best scored documents as (score, kind, item)."""
+        best = heapq.nlargest(limit, ((key, score) for key, score in scores.items() if score),
+                              key=lambda pair: pair[1])
+        return [(score, key[0], self._docs[key]) for key, score in best]
+
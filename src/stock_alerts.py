@@ -0,0 +1,65 @@
+"""
+Low-stock alerts.
+
+An ingredient with a min_stock threshold is low while its amount is below it.
+Only low ingredients are indexed, sorted by amount / min_stock, so listing the
+alerts costs O(alerts) however large the inventory is. Mutations update the
+entry of the ingredient they touch with bisect.
+"""
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# (amount / min_stock, id): sort key of one alert, emptiest first
+Entry = Tuple[float, int]
+
+
+def stock_ratio(item: Dict) -> Optional[float]:
+    """amount / min_stock if the item is below its threshold, else None."""
+    min_stock = item.get('min_stock') or 0
+    amount = item.get('amount') or 0
+    if min_stock <= 0 or amount >= min_stock:
+        return None
+    return amount / min_stock
+
+
+class StockAlerts:
+    """Ingredients below their min_stock, ordered by how much of it is left."""
+
+    def __init__(self, items: Iterable[Dict] = ()):
+        self._items: Dict[int, Dict] = {}
+        self._entries: Dict[int, Entry] = {}
+        self._low: List[Entry] = []
+
+        for item in items:
+            ratio = stock_ratio(item)
+            if ratio is not None and item['id'] not in self._items:
+                self._items[item['id']] = item
+                self._entries[item['id']] = (ratio, item['id'])
+                self._low.append((ratio, item['id']))
+        self._low.sort()
+
+    def __len__(self) -> int:
+        return len(self._low)
+
+    def update(self, item: Dict) -> None:
+        """Re-check item (added or changed) against its threshold."""
+        self.remove(item['id'])
+        ratio = stock_ratio(item)
+        if ratio is not None:
+            self._items[item['id']] = item
+            self._entries[item['id']] = (ratio, item['id'])
+            insort(self._low, (ratio, item['id']))
+
+    def remove(self, item_id: int) -> None:
+        """Drop the alert of item_id, if any."""
+        # The entry as indexed; the item may have changed in place
+        entry = self._entries.pop(item_id, None)
+        if entry is None:
+            return
+        del self._items[item_id]
+        i = bisect_left(self._low, entry)
+        del self._low[i]
+
+    def alerts(self, limit: Optional[int] = None) -> List[Tuple[float, Dict]]:
+        """Up to limit (ratio, item) pairs, lowest ratio first."""
+        return [(ratio, self._items[item_id]) for ratio, item_id in self._low[:limit]]
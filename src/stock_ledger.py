@@ -0,0 +1,216 @@
+"""
+Append-only ledger of stock movements.
+
+Every change of an ingredient's amount is recorded as an event
+{'seq', 'time', 'ingredient_id', 'delta', 'source', 'reason'} in a JSON lines
+file. Every CHECKPOINT_EVERY events the whole stock is written to a checkpoint
+file named after its sequence number, time and event file offset, so the stock
+at any moment is the nearest earlier checkpoint plus the events after it; the
+history is never replayed from the start. The first checkpoint is the opening
+stock of an existing store.
+
+Deltas are computed against the ledger's own running stock, so the ledger
+stays consistent with the store even if an event was lost (e.g. by a crash
+between writing the store and the ledger): the next change makes up for it.
+"""
+import json
+import os
+import time
+from bisect import bisect_right
+from itertools import chain
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import instrumentation
+from storage_backends import atomic_write_json
+
+# Events between two checkpoints: bounds the events read for a point-in-time query
+CHECKPOINT_EVERY = 1000
+
+# Where stock changes come from
+SOURCES = ('manual', 'cook', 'import')
+
+# (time, seq, event file offset, path) of one checkpoint file
+Checkpoint = Tuple[float, int, int, Path]
+
+
+class StockLedger:
+    """Stock events in path, checkpoints in the directory path + '.checkpoints'."""
+
+    def __init__(self, path: Path, checkpoint_every: int = CHECKPOINT_EVERY):
+        self.path = Path(path)
+        self.checkpoint_dir = self.path.with_name(self.path.name + '.checkpoints')
+        self.checkpoint_every = checkpoint_every
+        self._stock: Optional[Dict[int, float]] = None
+        self._seq = 0
+        self._time = 0.0
+        self._end = 0  # bytes of the event file already read into _stock
+        self._buffer: List[Dict] = []
+        self._started = False
+
+    def started(self) -> bool:
+        """Whether the ledger has an opening checkpoint."""
+        if not self._started:
+            self._started = self.checkpoint_dir.exists() and any(self.checkpoint_dir.glob('*.json'))
+        return self._started
+
+    def start(self, stock: Dict[int, float]) -> None:
+        """Record stock as the opening checkpoint unless the ledger already has history."""
+        if self.started():
+            return
+        self._stock = dict(stock)
+        self._seq = 0
+        self._time = round(time.time(), 6)
+        self._end = self.path.stat().st_size if self.path.exists() else 0
+        self._write_checkpoint()
+        self._started = True
+
+    def _checkpoints(self) -> List[Checkpoint]:
+        """All checkpoints, oldest first."""
+        if not self.checkpoint_dir.exists():
+            return []
+        checkpoints = []
+        for path in self.checkpoint_dir.glob('*.json'):
+            seq, time_us, offset = path.stem.split('-')
+            checkpoints.append((int(time_us) / 1e6, int(seq), int(offset), path))
+        checkpoints.sort(key=lambda checkpoint: checkpoint[1])
+        return checkpoints
+
+    def _write_checkpoint(self) -> None:
+        instrumentation.count('ledger.checkpoints')
+        self.checkpoint_dir.mkdir(parents=True, exist_ok=True)
+        path = self.checkpoint_dir / f"{self._seq:012d}-{int(round(self._time * 1e6))}-{self._end}.json"
+        atomic_write_json(path, {str(ing_id): amount for ing_id, amount in self._stock.items()})
+
+    @staticmethod
+    def _load_checkpoint(checkpoint: Checkpoint) -> Dict[int, float]:
+        """Return the stock saved in a checkpoint."""
+        with open(checkpoint[3], 'r', encoding='utf-8') as f:
+            return {int(ing_id): amount for ing_id, amount in json.load(f).items()}
+
+    def _read_events(self, offset: int) -> Iterator[Tuple[Dict, int]]:
+        """Yield (event, offset after it) for the events from byte offset on."""
+        if not self.path.exists():
+            return
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                offset += len(line)
+                if not line.endswith(b'\n'):
+                    # Torn last line of an interrupted append
+                    return
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                yield event, offset
+
+    def _refresh(self) -> None:
+        """Load the running stock, and pick up events other processes appended."""
+        if self._stock is None:
+            checkpoints = self._checkpoints()
+            if not checkpoints:
+                self._stock = {}
+                return
+            self._time, self._seq, self._end, _ = checkpoints[-1]
+            self._stock = self._load_checkpoint(checkpoints[-1])
+        elif not self.path.exists() or self.path.stat().st_size <= self._end:
+            return
+
+        for event, offset in self._read_events(self._end):
+            if event['seq'] <= self._seq:
+                continue
+            ing_id = event['ingredient_id']
+            self._stock[ing_id] = self._stock.get(ing_id, 0.0) + event['delta']
+            self._seq, self._time, self._end = event['seq'], event['time'], offset
+
+    def stock(self) -> Dict[int, float]:
+        """Current stock per ingredient id, including recorded but unsynced events."""
+        self._refresh()
+        return self._stock
+
+    def record(self, deltas: Dict[int, float], source: str, reason: str = "") -> None:
+        """Apply stock deltas (ingredient id -> change) now; sync() writes them."""
+        if source not in SOURCES:
+            raise ValueError(f"Unknown stock source: {source}")
+        self._refresh()
+        now = round(time.time(), 6)
+        for ing_id, delta in deltas.items():
+            if not delta:
+                continue
+            self._stock[ing_id] = self._stock.get(ing_id, 0.0) + delta
+            self._buffer.append({'time': now, 'ingredient_id': ing_id, 'delta': delta,
+                                 'source': source, 'reason': reason})
+
+    def sync(self) -> None:
+        """Append the recorded events to the event file, checkpointing when due."""
+        if not self._buffer:
+            return
+        self._refresh()
+        events, self._buffer = self._buffer, []
+        lines = []
+        for event in events:
+            self._seq += 1
+            # Keep times ordered even if the clock goes back
+            self._time = max(self._time, event['time'])
+            lines.append(json.dumps({'seq': self._seq, **event, 'time': self._time}) + '\n')
+        data = ''.join(lines).encode('utf-8')
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'a+b') as f:
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    # Terminate a torn line left by an interrupted append
+                    data = b'\n' + data
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+            self._end = f.tell()
+        instrumentation.count('ledger.events', len(events))
+
+        checkpoints = self._checkpoints()
+        if not checkpoints or self._seq - checkpoints[-1][1] >= self.checkpoint_every:
+            self._write_checkpoint()
+
+    def stock_at(self, when: float) -> Optional[Dict[int, float]]:
+        """Stock per ingredient id at time when (seconds since the epoch).
+
+        Returns None if when is before the ledger's opening checkpoint.
+        """
+        if not self.started():
+            return None
+        self._refresh()
+        if when >= (self._buffer[-1]['time'] if self._buffer else self._time):
+            return dict(self._stock)
+
+        checkpoints = self._checkpoints()
+        i = bisect_right([checkpoint[0] for checkpoint in checkpoints], when)
+        if i == 0:
+            return None
+        stock = self._load_checkpoint(checkpoints[i - 1])
+        events = (event for event, _ in self._read_events(checkpoints[i - 1][2]))
+        for event in chain(events, self._buffer):
+            if event['time'] > when:
+                break
+            ing_id = event['ingredient_id']
+            stock[ing_id] = stock.get(ing_id, 0.0) + event['delta']
+        return stock
+
+    def events(self, ingredient_id: Optional[int] = None, since: Optional[float] = None,
+               until: Optional[float] = None) -> Iterator[Dict]:
+        """Yield the written events in order, optionally of one ingredient and within [since, until]."""
+        offset = 0
+        if since is not None:
+            # Start at the last checkpoint before since instead of the beginning
+            checkpoints = self._checkpoints()
+            i = bisect_right([checkpoint[0] for checkpoint in checkpoints], since)
+            if i > 0:
+                offset = checkpoints[i - 1][2]
+        for event, _ in self._read_events(offset):
+            if until is not None and event['time'] > until:
+                return
+            if since is not None and event['time'] < since:
+                continue
+            if ingredient_id is None or event['ingredient_id'] == ingredient_id:
+                yield event
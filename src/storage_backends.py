@@ -0,0 +1,570 @@
+"""
+Storage backends for data_manager.
+
+A backend persists the storage document ({'ingredients': [...], 'recipes': [...],
+plus top-level settings such as 'categories' and 'units'}). data_manager keeps
+the parsed document in memory and hands each mutation to the backend as a list
+of changes, so backends that can update single rows do not rewrite everything.
+"""
+import json
+import os
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import instrumentation
+from name_index import normalize_name
+
+# A change is (kind, op, payload):
+#   ('ingredient', 'put', ingredient_dict)   ('ingredient', 'delete', ingredient_id)
+#   ('recipe', 'put', recipe_dict)           ('recipe', 'delete', recipe_id)
+#   ('meta', 'put', {'key': str, 'value': json_value})
+Change = Tuple[str, str, object]
+
+
+def file_fingerprint(path: Path) -> Optional[Tuple[int, int, int]]:
+    """Return (mtime_ns, size, inode) for path, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def atomic_write_json(path: Path, data: Dict) -> None:
+    """Write data to path via a temp file and os.replace, so readers never see a partial file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+        instrumentation.count('json.bytes_written', f.tell())
+    os.replace(tmp_path, path)
+
+
+class JsonBackend:
+    """Stores the document as a JSON snapshot plus an append-only journal.
+
+    Each batch of mutations is appended to the journal as one JSON line; once
+    the journal grows past compact_bytes it is folded into a new snapshot.
+    Loading reads the snapshot and replays the journal on top of it.
+    """
+
+    def __init__(self, path: Path, compact_bytes: int = 256 * 1024):
+        self.path = Path(path)
+        self.journal_path = self.path.with_suffix('.journal')
+        self.lock_path = self.path.with_suffix('.lock')
+        self.ledger_path = self.path.with_suffix('.ledger')
+        self.compact_bytes = compact_bytes
+
+    def fingerprint(self) -> Optional[Tuple]:
+        """Return a value that changes whenever the snapshot or journal changes."""
+        snapshot_key = file_fingerprint(self.path)
+        if snapshot_key is None:
+            return None
+        return (snapshot_key, file_fingerprint(self.journal_path))
+
+    def read(self) -> Dict:
+        """Read the snapshot and replay the journal tail."""
+        with instrumentation.timed('json.parse_snapshot'), open(self.path, 'r') as f:
+            data = json.load(f)
+            instrumentation.count('json.bytes_read', f.tell())
+
+        self._replay_journal(data)
+        return data
+
+    def _replay_journal(self, data: Dict) -> bool:
+        """Apply the journal to data. Returns True if it held any changes."""
+        if not self.journal_path.exists():
+            return False
+        with instrumentation.timed('json.replay_journal'), open(self.journal_path, 'r') as f:
+            replay_changes(data, _read_journal(f))
+            size = f.tell()
+        instrumentation.count('json.bytes_read', size)
+        return size > 0
+
+    def write(self, data: Dict) -> None:
+        """Write a new snapshot and clear the journal."""
+        atomic_write_json(self.path, data)
+        if self.journal_path.exists():
+            self.journal_path.unlink()
+
+    def compact(self, data: Dict) -> bool:
+        """Fold a non-empty journal into a new snapshot of data. Returns True if it did."""
+        if not self.journal_path.exists() or self.journal_path.stat().st_size == 0:
+            return False
+        instrumentation.count('json.compactions')
+        self.write(data)
+        return True
+
+    def apply(self, data: Dict, changes: List[Change]) -> None:
+        """Append changes to the journal, compacting when it gets too large."""
+        if not self.path.exists():
+            self.write(data)
+            return
+
+        # One line per call, so a torn append drops the whole batch, never part of it
+        line = json.dumps({'changes': [
+            {'kind': kind, 'op': op, 'value': value} for kind, op, value in changes
+        ]}) + '\n'
+        line = line.encode('utf-8')
+        with open(self.journal_path, 'a+b') as f:
+            if f.seek(0, os.SEEK_END) > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b'\n':
+                    # Terminate a torn line left by an interrupted append
+                    line = b'\n' + line
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+            journal_size = f.tell()
+        instrumentation.count('json.bytes_written', len(line))
+
+        if journal_size > self.compact_bytes:
+            instrumentation.count('json.compactions')
+            self.write(data)
+
+
+def _read_journal(f) -> Iterator[Change]:
+    """Yield the changes recorded in an open journal file."""
+    for line in f:
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            # Torn line from an interrupted append
+            continue
+        for change in record['changes']:
+            yield (change['kind'], change['op'], change['value'])
+
+
+def replay_changes(data: Dict, changes: Iterable[Change]) -> None:
+    """Apply journaled changes to data in place."""
+    collections = {'ingredient': 'ingredients', 'recipe': 'recipes'}
+    positions: Dict[str, Dict[int, int]] = {}
+
+    for kind, op, value in changes:
+        if kind == 'meta':
+            data[value['key']] = value['value']
+            continue
+
+        key = collections.get(kind)
+        if key is None:
+            raise ValueError(f"Unknown change kind: {kind}")
+
+        items = data.setdefault(key, [])
+        if key not in positions:
+            positions[key] = {}
+            for i, item in enumerate(items):
+                positions[key].setdefault(item['id'], i)
+        index = positions[key]
+
+        if op == 'put':
+            if value['id'] in index:
+                items[index[value['id']]] = value
+            else:
+                index[value['id']] = len(items)
+                items.append(value)
+        elif op == 'delete':
+            if value in index:
+                data[key] = [item for item in items if item['id'] != value]
+                del positions[key]
+        else:
+            raise ValueError(f"Unknown change op: {op}")
+
+
+# Columns stored natively; every other key is kept in the row's 'extra' JSON.
+INGREDIENT_COLUMNS = ('id', 'name', 'category', 'measurement', 'amount')
+RECIPE_COLUMNS = ('id', 'name', 'comments', 'vegie', 'tag')
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ingredients (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    name_norm TEXT NOT NULL,
+    category TEXT,
+    measurement TEXT,
+    amount REAL,
+    extra TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS idx_ingredients_category ON ingredients(category);
+CREATE INDEX IF NOT EXISTS idx_ingredients_name_norm ON ingredients(name_norm);
+CREATE TABLE IF NOT EXISTS recipes (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    comments TEXT,
+    vegie TEXT,
+    tag TEXT,
+    extra TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS recipe_ingredients (
+    recipe_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    ingredient_id INTEGER NOT NULL,
+    quantity_grams REAL NOT NULL,
+    PRIMARY KEY (recipe_id, position)
+);
+CREATE INDEX IF NOT EXISTS idx_recipe_ingredients_ingredient
+    ON recipe_ingredients(ingredient_id);
+"""
+
+
+class SqliteBackend:
+    """Stores ingredients, recipes and recipe ingredients in SQLite tables."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.lock_path = self.path.with_suffix('.lock')
+        self.ledger_path = self.path.with_suffix('.ledger')
+        self._schema_ready = False
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """Open a connection and run the body in a single transaction."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path)
+        try:
+            if not self._schema_ready:
+                conn.executescript(SQLITE_SCHEMA)
+                self._schema_ready = True
+            with conn:
+                yield conn
+            instrumentation.count('sqlite.rows_written', conn.total_changes)
+        finally:
+            conn.close()
+
+    def compact(self, data: Dict) -> bool:
+        """Nothing to fold: every commit already updates the tables in place."""
+        return False
+
+    def fingerprint(self) -> Optional[Tuple]:
+        """Return a value that changes whenever the database is committed to."""
+        key = file_fingerprint(self.path)
+        if key is None:
+            return None
+        # The header's file change counter is bumped by every commit, even
+        # when the file's mtime and size stay the same
+        with open(self.path, 'rb') as f:
+            f.seek(24)
+            return key + (f.read(4),)
+
+    def read(self) -> Dict:
+        """Rebuild the full document from the tables."""
+        with self._connect() as conn:
+            data = {key: json.loads(value) for key, value in conn.execute("SELECT key, value FROM meta")}
+
+            data['ingredients'] = [
+                _row_to_dict(INGREDIENT_COLUMNS, row[:-1], row[-1])
+                for row in conn.execute(
+                    "SELECT id, name, category, measurement, amount, extra FROM ingredients ORDER BY id"
+                )
+            ]
+
+            recipe_ingredients: Dict[int, List[Dict]] = {}
+            for recipe_id, ingredient_id, quantity_grams in conn.execute(
+                "SELECT recipe_id, ingredient_id, quantity_grams FROM recipe_ingredients "
+                "ORDER BY recipe_id, position"
+            ):
+                recipe_ingredients.setdefault(recipe_id, []).append({
+                    'ingredient_id': ingredient_id,
+                    'quantity_grams': quantity_grams
+                })
+
+            recipes = []
+            for row in conn.execute("SELECT id, name, comments, vegie, tag, extra FROM recipes ORDER BY id"):
+                recipe = _row_to_dict(RECIPE_COLUMNS, row[:-1], row[-1])
+                recipe['ingredients'] = recipe_ingredients.get(recipe['id'], [])
+                recipes.append(recipe)
+            data['recipes'] = recipes
+
+        instrumentation.count(
+            'sqlite.rows_read',
+            len(data['ingredients']) + len(recipes) + sum(len(rows) for rows in recipe_ingredients.values())
+        )
+        return data
+
+    def write(self, data: Dict) -> None:
+        """Replace all stored rows with data."""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM meta")
+            conn.execute("DELETE FROM ingredients")
+            conn.execute("DELETE FROM recipes")
+            conn.execute("DELETE FROM recipe_ingredients")
+
+            for key, value in data.items():
+                if key not in ('ingredients', 'recipes'):
+                    conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+            for ingredient in data.get('ingredients', []):
+                _put_ingredient(conn, ingredient)
+            for recipe in data.get('recipes', []):
+                _put_recipe(conn, recipe)
+
+    def apply(self, data: Dict, changes: List[Change]) -> None:
+        """Persist changes row by row in one transaction."""
+        with self._connect() as conn:
+            for kind, op, payload in changes:
+                if kind == 'ingredient':
+                    if op == 'put':
+                        _put_ingredient(conn, payload)
+                    else:
+                        conn.execute("DELETE FROM ingredients WHERE id = ?", (payload,))
+                elif kind == 'recipe':
+                    if op == 'put':
+                        _put_recipe(conn, payload)
+                    else:
+                        conn.execute("DELETE FROM recipes WHERE id = ?", (payload,))
+                        conn.execute("DELETE FROM recipe_ingredients WHERE recipe_id = ?", (payload,))
+                elif kind == 'meta':
+                    conn.execute(
+                        "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                        (payload['key'], json.dumps(payload['value']))
+                    )
+                else:
+                    raise ValueError(f"Unknown change kind: {kind}")
+
+
+def _row_to_dict(columns: Tuple[str, ...], values: Tuple, extra: str) -> Dict:
+    """Combine native columns and the extra JSON into one entity dict."""
+    item = {column: value for column, value in zip(columns, values) if value is not None}
+    item.update(json.loads(extra))
+    return item
+
+
+def _extra_fields(item: Dict, columns: Tuple[str, ...], skip: Tuple[str, ...] = ()) -> str:
+    """Serialize the keys of item that have no native column."""
+    return json.dumps({k: v for k, v in item.items() if k not in columns and k not in skip})
+
+
+def _put_ingredient(conn: sqlite3.Connection, ingredient: Dict) -> None:
+    """Insert or replace one ingredient row."""
+    conn.execute(
+        "INSERT OR REPLACE INTO ingredients (id, name, name_norm, category, measurement, amount, extra) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (
+            ingredient['id'],
+            ingredient['name'],
+            normalize_name(ingredient['name']),
+            ingredient.get('category'),
+            ingredient.get('measurement'),
+            ingredient.get('amount'),
+            _extra_fields(ingredient, INGREDIENT_COLUMNS)
+        )
+    )
+
+
+def _put_recipe(conn: sqlite3.Connection, recipe: Dict) -> None:
+    """Insert or replace one recipe row together with its ingredient rows."""
+    conn.execute(
+        "INSERT OR REPLACE INTO recipes (id, name, comments, vegie, tag, extra) VALUES (?, ?, ?, ?, ?, ?)",
+        (
+            recipe['id'],
+            recipe['name'],
+            recipe.get('comments'),
+            recipe.get('vegie'),
+            recipe.get('tag'),
+            _extra_fields(recipe, RECIPE_COLUMNS, skip=('ingredients',))
+        )
+    )
+    conn.execute("DELETE FROM recipe_ingredients WHERE recipe_id = ?", (recipe['id'],))
+    conn.executemany(
+        "INSERT INTO recipe_ingredients (recipe_id, position, ingredient_id, quantity_grams) VALUES (?, ?, ?, ?)",
+        [
+            (recipe['id'], position, ring['ingredient_id'], ring['quantity_grams'])
+            for position, ring in enumerate(recipe.get('ingredients', []))
+        ]
+    )
+
+
+# Arrow tables: native columns with their types; every other key goes to 'extra' JSON.
+# recipes.num_ingredients counts the recipe's rows in recipe_ingredients, which
+# are stored grouped by recipe in the order of the recipes table.
+ARROW_INGREDIENT_COLUMNS = (
+    ('id', 'int64'), ('name', 'string'), ('category', 'string'), ('measurement', 'string'),
+    ('amount', 'float64'), ('revision', 'int64'), ('piece_grams', 'float64'), ('density', 'float64'),
+)
+ARROW_RECIPE_COLUMNS = (
+    ('id', 'int64'), ('name', 'string'), ('comments', 'string'), ('vegie', 'string'), ('tag', 'string'),
+    ('revision', 'int64'),
+)
+ARROW_TABLES = ('ingredients', 'recipes', 'recipe_ingredients')
+
+
+def _pyarrow():
+    """Import pyarrow on first use, so the other backends do not pay for it."""
+    import pyarrow
+    import pyarrow.ipc  # noqa: F401 (loads the submodule)
+    return pyarrow
+
+
+class ArrowBackend(JsonBackend):
+    """Stores the snapshot as Arrow IPC (Feather v2) tables plus a JSON journal.
+
+    The directory holds ingredients, recipes and recipe_ingredients tables
+    written under a new generation number by every snapshot, and a small
+    manifest.json naming the current generation and holding the top-level
+    settings. Replacing the manifest switches to a new snapshot atomically.
+    Tables are memory-mapped on read; edits are journaled exactly like
+    JsonBackend does.
+    """
+
+    def __init__(self, directory: Path, compact_bytes: int = 256 * 1024):
+        self.directory = Path(directory)
+        super().__init__(self.directory / 'manifest.json', compact_bytes)
+        self.journal_path = self.directory / 'journal.jsonl'
+        self.lock_path = self.directory.with_suffix('.lock')
+        self.ledger_path = self.directory / 'ledger.jsonl'
+        # (document, tables) while the document is exactly what the tables hold
+        self._mapped: Optional[Tuple[Dict, Dict]] = None
+
+    def _table_path(self, name: str, generation: int) -> Path:
+        return self.directory / f"{name}.{generation}.arrow"
+
+    def read(self) -> Dict:
+        """Memory-map the current tables, build the document and replay the journal tail."""
+        pa = _pyarrow()
+        with instrumentation.timed('arrow.read_snapshot'):
+            manifest = json.loads(self.path.read_text())
+            tables = {}
+            for name in ARROW_TABLES:
+                path = self._table_path(name, manifest['generation'])
+                tables[name] = pa.ipc.open_file(pa.memory_map(str(path), 'r')).read_all()
+                instrumentation.count('arrow.bytes_mapped', path.stat().st_size)
+
+            data = dict(manifest['meta'])
+            data['ingredients'] = _table_rows(tables['ingredients'])
+            data['recipes'] = _table_rows(tables['recipes'])
+            rings = tables['recipe_ingredients']
+            ring_dicts = [
+                {'ingredient_id': ingredient_id, 'quantity_grams': quantity_grams}
+                for ingredient_id, quantity_grams in zip(_column_list(rings['ingredient_id']),
+                                                         _column_list(rings['quantity_grams']))
+            ]
+            start = 0
+            for recipe in data['recipes']:
+                end = start + recipe.pop('num_ingredients')
+                recipe['ingredients'] = ring_dicts[start:end]
+                start = end
+
+        self._mapped = None if self._replay_journal(data) else (data, tables)
+        return data
+
+    def write(self, data: Dict) -> None:
+        """Write the tables of a new generation, switch the manifest to it and clear the journal."""
+        pa = _pyarrow()
+        self._mapped = None
+        generation = 1
+        if self.path.exists():
+            generation = json.loads(self.path.read_text())['generation'] + 1
+
+        recipes = data.get('recipes', [])
+        tables = {
+            'ingredients': _entity_table(pa, data.get('ingredients', []), ARROW_INGREDIENT_COLUMNS),
+            'recipes': _entity_table(pa, recipes, ARROW_RECIPE_COLUMNS, skip=('ingredients',)).append_column(
+                'num_ingredients', pa.array([len(r.get('ingredients', [])) for r in recipes], pa.int64())
+            ),
+            'recipe_ingredients': pa.table({
+                'recipe_id': pa.array(
+                    [r['id'] for r in recipes for _ in r.get('ingredients', [])], pa.int64()),
+                'ingredient_id': pa.array(
+                    [ring['ingredient_id'] for r in recipes for ring in r.get('ingredients', [])], pa.int64()),
+                'quantity_grams': pa.array(
+                    [ring['quantity_grams'] for r in recipes for ring in r.get('ingredients', [])], pa.float64()),
+            }),
+        }
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for name, table in tables.items():
+            path = self._table_path(name, generation)
+            with open(path, 'wb') as f:
+                with pa.ipc.new_file(f, table.schema) as writer:
+                    writer.write_table(table)
+                f.flush()
+                os.fsync(f.fileno())
+                instrumentation.count('arrow.bytes_written', f.tell())
+
+        meta = {key: value for key, value in data.items() if key not in ('ingredients', 'recipes')}
+        atomic_write_json(self.path, {'generation': generation, 'meta': meta})
+        if self.journal_path.exists():
+            self.journal_path.unlink()
+
+        # Older generations are unreachable now; open memory maps keep working
+        for path in self.directory.glob('*.arrow'):
+            if not path.name.endswith(f".{generation}.arrow"):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+    def apply(self, data: Dict, changes: List[Change]) -> None:
+        """Journal changes like JsonBackend; the document no longer matches the tables."""
+        self._mapped = None
+        super().apply(data, changes)
+
+    def columns(self, data: Dict) -> Optional[Dict]:
+        """Columns of the mapped tables as NumPy arrays, if data is the unchanged document read from them.
+
+        Keys: ingredient_id, measurement, amount, density, piece_grams
+        (NaN where missing), recipe_id, num_ingredients, ring_ingredient_id,
+        quantity_grams. Returns None once the document was edited.
+        """
+        if self._mapped is None or self._mapped[0] is not data:
+            return None
+        tables = self._mapped[1]
+        ingredients, recipes, rings = tables['ingredients'], tables['recipes'], tables['recipe_ingredients']
+        return {
+            'ingredient_id': _column_array(ingredients['id']),
+            'measurement': _column_array(ingredients['measurement']),
+            'amount': _column_array(ingredients['amount'].fill_null(0.0)),
+            'density': _column_array(ingredients['density']),
+            'piece_grams': _column_array(ingredients['piece_grams']),
+            'recipe_id': _column_array(recipes['id']),
+            'num_ingredients': _column_array(recipes['num_ingredients']),
+            'ring_ingredient_id': _column_array(rings['ingredient_id']),
+            'quantity_grams': _column_array(rings['quantity_grams']),
+        }
+
+
+def _column_array(column):
+    """A chunked Arrow column as a NumPy array (zero-copy where Arrow allows it)."""
+    return column.to_numpy()
+
+
+def _column_list(column) -> List:
+    """A chunked Arrow column as Python values; via NumPy, which is much faster than to_pylist()."""
+    return column.to_numpy(zero_copy_only=False).tolist()
+
+
+def _entity_table(pa, items: List[Dict], columns: Tuple[Tuple[str, str], ...], skip: Tuple[str, ...] = ()):
+    """Build an Arrow table of entity dicts; keys without a native column go to 'extra' JSON."""
+    names = tuple(name for name, _ in columns)
+    arrays = {
+        name: pa.array([item.get(name) for item in items], getattr(pa, type_name)())
+        for name, type_name in columns
+    }
+    extras = [{k: v for k, v in item.items() if k not in names and k not in skip} for item in items]
+    arrays['extra'] = pa.array([json.dumps(extra) if extra else None for extra in extras], pa.string())
+    return pa.table(arrays)
+
+
+def _table_rows(table) -> List[Dict]:
+    """Turn an Arrow table back into entity dicts; null columns are left out, like _row_to_dict does."""
+    dense = [name for name in table.column_names if name != 'extra' and table[name].null_count == 0]
+    rows = [dict(zip(dense, values)) for values in zip(*(_column_list(table[name]) for name in dense))]
+
+    for name in table.column_names:
+        column = table[name]
+        if name in dense or column.null_count == len(column):
+            continue
+        valid = column.is_valid()
+        positions = valid.to_numpy(zero_copy_only=False).nonzero()[0].tolist()
+        for i, value in zip(positions, _column_list(column.filter(valid))):
+            if name == 'extra':
+                rows[i].update(json.loads(value))
+            else:
+                rows[i][name] = value
+    return rows
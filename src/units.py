@@ -0,0 +1,116 @@
+"""
+Conversion of stored amounts to grams.
+
+Recipes are in grams, but stock is counted in kg, liters or pieces. Each
+ingredient may store a density (kg per liter, default: water) and an average
+weight per piece in grams; together with the measurement they give one
+grams-per-unit factor per ingredient. Factors are compiled into an array once
+so whole inventories convert with a single multiplication.
+"""
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+
+MEASUREMENTS = ['kg', 'liter', 'pieces']
+
+# Density of water in kg per liter, used when an ingredient has none
+DEFAULT_DENSITY = 1.0
+
+
+def grams_per_unit(ingredient: Dict) -> Optional[float]:
+    """Grams in one unit of the ingredient's measurement, or None if unknown."""
+    measurement = ingredient.get('measurement', 'pieces')
+    if measurement == 'kg':
+        return 1000.0
+    if measurement == 'liter':
+        return 1000.0 * (ingredient.get('density') or DEFAULT_DENSITY)
+    piece_grams = ingredient.get('piece_grams')
+    return float(piece_grams) if piece_grams else None
+
+
+def to_grams(ingredient: Dict, amount: Optional[float] = None) -> Optional[float]:
+    """Convert amount (default: the stored amount) of ingredient to grams."""
+    factor = grams_per_unit(ingredient)
+    if factor is None:
+        return None
+    return (ingredient.get('amount', 0) if amount is None else amount) * factor
+
+
+def from_grams(ingredient: Dict, grams: float) -> Optional[float]:
+    """Convert grams to the ingredient's measurement, or None if unknown."""
+    factor = grams_per_unit(ingredient)
+    return grams / factor if factor else None
+
+
+def convert(amount: float, source: Dict, target: Dict) -> Optional[float]:
+    """Convert amount in source's measurement to target's, through grams.
+
+    Equal measurements convert one to one; None if either weight is unknown.
+    """
+    if source.get('measurement', 'pieces') == target.get('measurement', 'pieces'):
+        return amount
+    source_factor, target_factor = grams_per_unit(source), grams_per_unit(target)
+    if source_factor is None or target_factor is None:
+        return None
+    return amount * source_factor / target_factor
+
+
+def describe(ingredient: Dict) -> str:
+    """Human readable stock amount, with the grams it was converted to."""
+    measurement = ingredient.get('measurement', 'pieces')
+    amount = ingredient.get('amount', 0)
+    if measurement == 'kg':
+        return f"{amount:.1f} kg"
+    if measurement == 'liter':
+        density = ingredient.get('density')
+        basis = f"{density:g} kg/l" if density else "water-based estimate"
+        return f"{amount:.1f} liter ({basis})"
+    piece_grams = ingredient.get('piece_grams')
+    if piece_grams:
+        return f"{amount:.1f} pieces (~{amount * piece_grams:.0f}g at {piece_grams:g}g each)"
+    return f"{amount:.1f} pieces"
+
+
+def grams_per_unit_columns(measurement: np.ndarray, density: np.ndarray, piece_grams: np.ndarray) -> np.ndarray:
+    """grams_per_unit over whole columns (missing density/piece_grams as NaN)."""
+    liter = 1000.0 * np.where(np.isnan(density) | (density == 0), DEFAULT_DENSITY, density)
+    pieces = np.where(np.isnan(piece_grams) | (piece_grams == 0), np.nan, piece_grams)
+    return np.select([measurement == 'kg', measurement == 'liter'], [1000.0, liter], pieces)
+
+
+class ConversionTable:
+    """Precompiled grams-per-unit factors for a list of ingredients.
+
+    Position i belongs to ingredients[i]; factors are NaN where no weight is
+    known (pieces without a piece weight).
+    """
+
+    def __init__(self, ingredients: Iterable[Dict]):
+        ingredients = list(ingredients)
+        factors = [grams_per_unit(ing) for ing in ingredients]
+        self.factors = np.array([np.nan if f is None else f for f in factors], dtype=np.float64)
+        self.amounts = np.array([ing.get('amount', 0) for ing in ingredients], dtype=np.float64)
+
+    @classmethod
+    def from_columns(cls, measurement: np.ndarray, amount: np.ndarray, density: np.ndarray,
+                     piece_grams: np.ndarray) -> 'ConversionTable':
+        """Build the table from ingredient columns instead of dicts."""
+        table = cls([])
+        table.factors = grams_per_unit_columns(measurement, density, piece_grams).astype(np.float64)
+        # A copy: stock edits patch it in place, and mapped columns are read-only
+        table.amounts = np.array(amount, dtype=np.float64)
+        return table
+
+    def update(self, i: int, ingredient: Dict) -> None:
+        """Recompile position i from a changed ingredient."""
+        factor = grams_per_unit(ingredient)
+        self.factors[i] = np.nan if factor is None else factor
+        self.amounts[i] = ingredient.get('amount', 0)
+
+    def available_grams(self) -> np.ndarray:
+        """Stock of every ingredient in grams (NaN where it cannot be converted)."""
+        return self.amounts * self.factors
+
+    def to_grams(self, amounts: np.ndarray) -> np.ndarray:
+        """Convert an array of amounts in each ingredient's measurement to grams."""
+        return np.asarray(amounts, dtype=np.float64) * self.factors
@@ -0,0 +1,63 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT / "scripts"))
+
+import data_manager as dm
+from storage_backends import JsonBackend
+
+
+def make_document() -> dict:
+    """A small current-schema store: two ingredients and one recipe using both."""
+    return {
+        "schema_version": dm.SCHEMA_VERSION,
+        "ingredients": [
+            {"id": 1, "name": "Onions", "category": "Vegetables", "measurement": "kg", "amount": 2.0, "revision": 1},
+            {"id": 2, "name": "Rice", "category": "Grains", "measurement": "kg", "amount": 1.0, "revision": 1},
+        ],
+        "recipes": [
+            {"id": 1, "name": "Rice with onions", "comments": "", "vegie": "yes", "tag": "",
+             "ingredients": [{"ingredient_id": 1, "quantity_grams": 100.0},
+                             {"ingredient_id": 2, "quantity_grams": 150.0}],
+             "revision": 1},
+        ],
+        "categories": ["Vegetables", "Grains", "Dairy", "Other"],
+        "units": ["kg", "liter", "pieces"],
+    }
+
+
+def start_other_process(store_path, code) -> subprocess.Popen:
+    """Start running code with data_manager as dm on the store, in a separate process."""
+    setup = (f"import sys; sys.path.insert(0, {str(ROOT / 'src')!r})\n"
+             "import data_manager as dm\n"
+             "from storage_backends import JsonBackend\n"
+             f"dm.set_backend(JsonBackend({str(store_path)!r}))\n")
+    return subprocess.Popen([sys.executable, "-c", setup + code])
+
+
+def in_other_process(store_path, code):
+    """Run code with data_manager as dm on the store in a separate process, and wait for it."""
+    assert start_other_process(store_path, code).wait() == 0
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    """Path of a JSON store holding make_document()."""
+    path = tmp_path / "storage_data.json"
+    path.write_text(json.dumps(make_document()))
+    return path
+
+
+@pytest.fixture
+def store(store_path):
+    """data_manager using a JSON store in a temporary directory."""
+    dm.set_backend(JsonBackend(store_path))
+    yield dm
+    dm.set_write_behind(0)
+    dm.set_backend(JsonBackend(store_path))
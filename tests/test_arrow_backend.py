@@ -0,0 +1,65 @@
+from conftest import make_document
+from storage_backends import ArrowBackend
+
+
+def test_write_and_read_round_trip_keep_extra_fields(tmp_path):
+    backend = ArrowBackend(tmp_path / "storage_data.arrow")
+    document = make_document()
+    document['ingredients'][0].update(min_stock=0.5, lots=[{'amount': 1.0, 'expires': "2030-01-01"}])
+    document['recipes'][0]['planned_for'] = "2030-01-02"
+
+    backend.write(document)
+
+    assert backend.read() == document
+
+
+def test_columns_only_describe_the_unchanged_tables(tmp_path):
+    backend = ArrowBackend(tmp_path / "storage_data.arrow")
+    backend.write(make_document())
+    data = backend.read()
+
+    columns = backend.columns(data)
+    assert columns['ingredient_id'].tolist() == [1, 2]
+    assert columns['num_ingredients'].tolist() == [2]
+    assert columns['quantity_grams'].tolist() == [100.0, 150.0]
+    assert backend.columns(make_document()) is None
+
+    onions = {**data['ingredients'][0], 'amount': 7.5}
+    backend.apply(data, [('ingredient', 'put', onions)])
+    assert backend.columns(data) is None
+
+    # The journal tail is replayed on read, so the tables are out of date too
+    reread = backend.read()
+    assert reread['ingredients'][0]['amount'] == 7.5
+    assert backend.columns(reread) is None
+
+
+def test_snapshots_switch_generation_and_drop_the_old_tables(tmp_path):
+    backend = ArrowBackend(tmp_path / "storage_data.arrow", compact_bytes=100)
+    backend.write(make_document())
+    data = backend.read()
+
+    data['ingredients'][1]['amount'] = 4.0
+    backend.apply(data, [('ingredient', 'put', data['ingredients'][1])])
+
+    assert not backend.journal_path.exists()
+    assert sorted(path.name for path in backend.directory.glob('*.arrow')) == [
+        "ingredients.2.arrow", "recipe_ingredients.2.arrow", "recipes.2.arrow",
+    ]
+    reread = backend.read()
+    assert reread == data
+    assert backend.columns(reread)['amount'].tolist() == [2.0, 4.0]
+
+
+def test_data_manager_on_arrow(store, tmp_path):
+    backend = ArrowBackend(tmp_path / "storage_data.arrow")
+    backend.write(make_document())
+    store.set_backend(backend)
+
+    store.update_ingredient(1, amount=4.0)
+    store.add_recipe("Onion rice", "", [{'ingredient_id': 1, 'quantity_grams': 80.0}])
+
+    reread = ArrowBackend(backend.directory).read()
+    assert reread['ingredients'][0]['amount'] == 4.0
+    assert reread['ingredients'][0]['revision'] == 2
+    assert [recipe['name'] for recipe in reread['recipes']] == ["Rice with onions", "Onion rice"]
@@ -0,0 +1,64 @@
+import threading
+
+import pytest
+
+import data_manager as dm
+from conftest import in_other_process, start_other_process
+
+
+def test_index_rebuilds_race_with_writers(store):
+    data = store.load_data()
+    data['ingredients'] += [
+        {'id': i, 'name': f"Filler {i}", 'category': 'Other', 'measurement': 'kg', 'amount': 1.0, 'revision': 1}
+        for i in range(3, 5003)
+    ]
+    store.save_data(data)
+
+    errors = []
+    done = threading.Event()
+
+    def rebuild():
+        try:
+            while not done.is_set():
+                # Force every lazy index to be rebuilt from the snapshot
+                dm._indexed_snapshot = None
+                store.find_ingredient("Onions", fuzzy=False)
+                store.query_ingredients(search="Added")
+        except Exception as e:
+            errors.append(e)
+
+    reader = threading.Thread(target=rebuild)
+    reader.start()
+    try:
+        added = [store.add_ingredient(f"Added {i}", 'Other', 'kg', 1.0) for i in range(100)]
+    finally:
+        done.set()
+        reader.join()
+
+    assert not errors
+    # No index built before a concurrent add may have been published after it
+    for ing in added:
+        assert store.find_ingredient(ing['name'], fuzzy=False) is ing
+    assert store.query_ingredients(search="Added")['total'] == 100
+
+
+def test_stale_expected_revision_raises_conflict(store, store_path):
+    revision = store.get_ingredient(1)['revision']
+    in_other_process(store_path, "dm.update_ingredient(1, amount=99.0)")
+
+    with pytest.raises(dm.ConflictError):
+        store.update_ingredient(1, expected_revision=revision, amount=5.0)
+
+    assert store.get_ingredient(1)['amount'] == 99.0
+    updated = store.update_ingredient(1, expected_revision=revision + 1, amount=5.0)
+    assert updated['revision'] == revision + 2
+
+
+def test_concurrent_processes_lose_no_updates(store, store_path):
+    workers = [start_other_process(store_path, "for _ in range(20):\n    dm.add_stock(1, 1.0)\n")
+               for _ in range(3)]
+    assert [worker.wait() for worker in workers] == [0, 0, 0]
+
+    onions = store.get_ingredient(1)
+    assert onions['amount'] == 62.0
+    assert onions['revision'] == 61
@@ -0,0 +1,46 @@
+import pytest
+
+import dedupe
+
+
+@pytest.mark.parametrize("a, b, expected", [
+    ("Coconutmilk", "Coconut milk", True),
+    ("quiona", "Quinoa", True),
+    ("Tomatoes Pulpe", "Tomato pulp", True),
+    ("Coriander", "Coriander TK", False),
+    ("Chicken sliced", "Chickpeas sliced", False),
+    ("Onions", "Onions TK", False),
+])
+def test_is_duplicate(a, b, expected):
+    assert dedupe.is_duplicate(a, b) is expected
+
+
+def test_duplicates_far_apart_by_name_are_found():
+    # "Berberxo Basil" sorts after all 40 fillers, outside the window by name
+    names = ["Berber Basil"] + [f"Berberb{a}{b} Flour" for a in "aeiou" for b in "klmnprst"] + ["Berberxo Basil"]
+    ingredients = [{'id': ing_id, 'name': name} for ing_id, name in enumerate(names, 1)]
+
+    clusters = [cluster for cluster in dedupe.find_duplicate_clusters(ingredients) if cluster[0]['id'] == 1]
+
+    assert [ing['name'] for ing in clusters[0] if ing['name'].endswith("Basil")] == ["Berber Basil", "Berberxo Basil"]
+
+
+def test_clusters():
+    names = ["Coconut milk", "Coriander", "Chicken sliced", "quiona", "Tomatoes Pulpe", "Onions",
+             "Coconutmilk", "Coriander TK", "Chickpeas sliced", "Quinoa", "Tomato pulp", "Onions TK"]
+    ingredients = [{'id': ing_id, 'name': name} for ing_id, name in enumerate(names, 1)]
+
+    clusters = dedupe.find_duplicate_clusters(ingredients)
+
+    assert sorted([ing['name'] for ing in cluster] for cluster in clusters) == [
+        ["Coconut milk", "Coconutmilk"], ["Tomatoes Pulpe", "Tomato pulp"], ["quiona", "Quinoa"],
+    ]
+
+
+def test_forced_merges_join_names_similarity_cannot_see():
+    ingredients = [{'id': 1, 'name': "Zwiebeln"}, {'id': 2, 'name': "Onions"}, {'id': 3, 'name': "Rice"}]
+
+    clusters = dedupe.find_duplicate_clusters(ingredients, forced={"Onions": ["Zwiebeln"]})
+
+    assert [[ing['id'] for ing in cluster] for cluster in clusters] == [[1, 2]]
+    assert dedupe.choose_survivor(clusters[0], {}, {"Onions": ["Zwiebeln"]}) == (ingredients[1], None)
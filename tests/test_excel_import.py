@@ -0,0 +1,63 @@
+from openpyxl import Workbook, load_workbook
+
+from excel_import import iter_sheets, sheet_hashes, sheet_names
+
+
+def write_workbook(path, amounts):
+    wb = Workbook()
+    wb.remove(wb.active)
+    for name, amount in amounts.items():
+        ws = wb.create_sheet(name)
+        ws.cell(row=2, column=2, value=f"Recipe {name}")
+        ws.cell(row=7, column=1, value="Onions")
+        ws.cell(row=7, column=4, value=amount)
+    wb.save(path)
+
+
+def test_only_changed_sheets_are_parsed(tmp_path):
+    path = tmp_path / "source.xlsx"
+    write_workbook(path, {'A': 0.1, 'B': 0.2, 'C': 0.3})
+    known = sheet_hashes(path)
+    assert sheet_names(path) == ['A', 'B', 'C']
+    assert [rows for _, _, rows in iter_sheets(path, known, jobs=1)] == [None, None, None]
+
+    write_workbook(path, {'A': 0.1, 'B': 0.25, 'C': 0.3})
+    results = {
+        name: (content_hash, None if rows is None else list(rows))
+        for name, content_hash, rows in iter_sheets(path, known, jobs=1)
+    }
+    assert results['A'][1] is None and results['C'][1] is None
+    assert results['B'][0] != known['B']
+    rows = results['B'][1]
+    assert rows[1][1] == "Recipe B" and rows[6][3] == 0.25
+
+
+def test_pool_and_stream_read_the_same_rows(tmp_path):
+    path = tmp_path / "source.xlsx"
+    write_workbook(path, {name: i / 10 for i, name in enumerate("ABCD")})
+    reference = load_workbook(path, read_only=True)
+    expected = {name: list(reference[name].iter_rows(values_only=True)) for name in "ABCD"}
+    for jobs in (1, 2):
+        assert {name: list(rows) for name, _, rows in iter_sheets(path, {}, jobs)} == expected
+
+
+def test_import_retries_sheets_skipped_for_missing_ingredients(store, tmp_path, monkeypatch):
+    import import_recipes
+
+    path = tmp_path / "source.xlsx"
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Soup"
+    ws.cell(row=2, column=2, value="Garlic soup")
+    ws.cell(row=7, column=1, value="Garlic")
+    ws.cell(row=7, column=4, value=0.05)
+    wb.save(path)
+    monkeypatch.setattr(import_recipes, 'EXCEL_FILE', path)
+    monkeypatch.setattr('sys.argv', ['import_recipes.py', '--jobs', '1'])
+
+    import_recipes.main()
+    assert [recipe['name'] for recipe in store.get_recipes()] == ["Rice with onions"]
+
+    store.add_ingredient("Garlic", "Vegetables", "kg", 0.5)
+    import_recipes.main()
+    assert [recipe['name'] for recipe in store.get_recipes()] == ["Rice with onions", "Garlic soup"]
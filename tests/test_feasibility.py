@@ -0,0 +1,90 @@
+import numpy as np
+
+import meal_planning
+
+
+def build(ingredients, recipes):
+    return meal_planning.RequirementMatrix({ing['id']: ing for ing in ingredients},
+                                           {recipe['id']: recipe for recipe in recipes})
+
+
+INGREDIENTS = [
+    {'id': 1, 'name': "Onions", 'measurement': "kg", 'amount': 2.0},
+    {'id': 2, 'name': "Eggs", 'measurement': "pieces", 'amount': 6.0},
+    {'id': 3, 'name': "Milk", 'measurement': "liter", 'amount': 1.0, 'density': 1.03},
+]
+RECIPES = [
+    {'id': 10, 'name': "Onion tart", 'ingredients': [
+        {'ingredient_id': 1, 'quantity_grams': 300.0},
+        {'ingredient_id': 3, 'quantity_grams': 100.0},
+        {'ingredient_id': 2, 'quantity_grams': 60.0},
+    ]},
+    {'id': 11, 'name': "Boiled eggs", 'ingredients': [{'ingredient_id': 2, 'quantity_grams': 120.0}]},
+    {'id': 12, 'name': "Water", 'ingredients': []},
+    {'id': 13, 'name': "Ghost soup", 'ingredients': [{'ingredient_id': 99, 'quantity_grams': 10.0}]},
+]
+
+
+def test_max_servings_takes_the_scarcest_convertible_ingredient():
+    matrix = build(INGREDIENTS, RECIPES)
+
+    result = meal_planning.max_servings(matrix)
+
+    assert result['servings'].tolist() == [6, -1, -1, -1]
+    assert [matrix.ingredient_ids[col] if col >= 0 else None for col in result['limiting_col']] == [1, None, None, None]
+    assert result['unknown'].tolist() == [1, 1, 0, 0]
+
+
+def test_rank_recipes_lists_unchecked_ingredients_after_checked_ones():
+    matrix = build(INGREDIENTS, RECIPES)
+
+    ranked = meal_planning.rank_recipes(matrix, {recipe['id']: recipe for recipe in RECIPES}, min_servings=1)
+
+    assert [(r['name'], r['max_servings'], r['unchecked_ingredients']) for r in ranked] == [
+        ("Onion tart", 6, ["Eggs"]),
+        ("Boiled eggs", None, ["Eggs"]),
+    ]
+
+
+def test_update_stock_changes_only_its_column():
+    matrix = build(INGREDIENTS, RECIPES)
+
+    assert matrix.update_stock({**INGREDIENTS[2], 'amount': 0.2})
+    assert matrix.available_grams.tolist()[0] == 2000.0
+    assert np.isnan(matrix.available_grams[1])
+    assert matrix.available_grams[2] == np.float64(0.2) * 1030.0
+    assert meal_planning.max_servings(matrix)['limiting_col'][0] == 2
+    assert not matrix.update_stock({'id': 4, 'name': "Salt", 'measurement': "kg", 'amount': 1.0})
+
+
+def test_from_columns_matches_the_dict_build():
+    columns = {
+        'ingredient_id': np.array([1, 2, 3]),
+        'measurement': np.array(["kg", "pieces", "liter"], dtype=object),
+        'amount': np.array([2.0, 6.0, 1.0]),
+        'density': np.array([np.nan, np.nan, 1.03]),
+        'piece_grams': np.array([np.nan, np.nan, np.nan]),
+        'recipe_id': np.array([10, 11, 12, 13]),
+        'num_ingredients': np.array([3, 1, 0, 1]),
+        'ring_ingredient_id': np.array([1, 3, 2, 2, 99]),
+        'quantity_grams': np.array([300.0, 100.0, 60.0, 120.0, 10.0]),
+    }
+    by_id = {ing['id']: ing for ing in INGREDIENTS}, {recipe['id']: recipe for recipe in RECIPES}
+
+    expected = build(INGREDIENTS, RECIPES)
+    matrix = meal_planning.RequirementMatrix.from_columns(*by_id, columns)
+
+    for name in ('indptr', 'cols', 'grams', 'available_grams'):
+        np.testing.assert_array_equal(getattr(matrix, name), getattr(expected, name))
+    assert (matrix.ingredient_ids, matrix.recipe_ids) == (expected.ingredient_ids, expected.recipe_ids)
+    assert meal_planning.RequirementMatrix.from_columns(by_id[0], {10: RECIPES[0]}, columns) is None
+
+
+def test_feasible_recipes_follow_stock_changes(store):
+    assert [(r['name'], r['max_servings'], r['limiting_ingredient']) for r in store.get_feasible_recipes()] == [
+        ("Rice with onions", 6, "Rice"),
+    ]
+
+    store.update_ingredient(1, amount=0.25)
+    assert [(r['max_servings'], r['limiting_ingredient']) for r in store.get_feasible_recipes()] == [(2, "Onions")]
+    assert store.get_feasible_recipes(min_servings=3) == []
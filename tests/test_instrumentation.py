@@ -0,0 +1,72 @@
+import pytest
+
+import instrumentation
+
+
+def test_diff_reports_only_what_happened_in_between():
+    instrumentation.count('test.before')
+    before = instrumentation.snapshot()
+
+    instrumentation.count('test.items', 3)
+    with instrumentation.timed('test.block'):
+        pass
+
+    stats = instrumentation.diff(before, instrumentation.snapshot())
+    assert stats['counters'] == {'test.items': 3}
+    assert list(stats['timings']) == ['test.block']
+    assert stats['timings']['test.block']['count'] == 1
+    assert sum(stats['timings']['test.block']['buckets']) == 1
+
+
+def test_record_fills_the_histogram_bucket_of_the_duration():
+    before = instrumentation.snapshot()
+    instrumentation.record('test.bucketed', 0.005)
+    instrumentation.record('test.bucketed', 2.0)
+
+    timing = instrumentation.diff(before, instrumentation.snapshot())['timings']['test.bucketed']
+    assert timing['buckets'] == [0, 0, 0, 1, 0, 0, 1]
+    assert timing['max_ms'] == pytest.approx(2000.0)
+
+
+def test_instrument_times_calls_that_raise_and_calls_hooks():
+    calls = []
+    hook = instrumentation.add_hook(lambda name, seconds: calls.append(name))
+
+    @instrumentation.instrument
+    def failing():
+        raise ValueError("boom")
+
+    try:
+        with pytest.raises(ValueError):
+            failing()
+    finally:
+        instrumentation.remove_hook(hook)
+    instrumentation.record('test.after_hook_removed', 0.0)
+
+    assert calls == ['failing']
+    assert instrumentation.snapshot()['timings']['failing']['count'] >= 1
+
+
+def test_data_layer_counts_cache_hits(store):
+    store.load_data()
+    before = instrumentation.snapshot()
+
+    store.load_data()
+
+    stats = instrumentation.diff(before, instrumentation.snapshot())
+    assert stats['counters'].get('load_data.cache_hit') == 1
+    assert 'load_data.cache_miss' not in stats['counters']
+    assert stats['timings']['load_data']['count'] == 1
+
+
+def test_timing_rows_sort_slowest_total_first():
+    stats = {'counters': {}, 'timings': {
+        'fast': {'count': 2, 'total_ms': 1.0, 'max_ms': 0.6, 'buckets': [0, 0, 2, 0, 0, 0, 0]},
+        'slow': {'count': 1, 'total_ms': 50.0, 'max_ms': 50.0, 'buckets': [0, 0, 0, 0, 1, 0, 0]},
+    }}
+
+    rows = instrumentation.timing_rows(stats)
+
+    assert [row['operation'] for row in rows] == ['slow', 'fast']
+    assert rows[1]['mean ms'] == 0.5
+    assert rows[0]['≤100ms'] == 1
@@ -0,0 +1,44 @@
+from inventory_index import InventoryIndex
+
+
+def test_pages_follow_name_order_per_category():
+    index = InventoryIndex([
+        {'id': 1, 'name': "rice", 'category': "Grains"},
+        {'id': 2, 'name': "Apples", 'category': "Fruit"},
+        {'id': 3, 'name': "Barley", 'category': "Grains"},
+        {'id': 4, 'name': "Couscous", 'category': "Grains"},
+    ])
+
+    assert index.query(offset=1, limit=2) == (4, [
+        {'id': 3, 'name': "Barley", 'category': "Grains"},
+        {'id': 4, 'name': "Couscous", 'category': "Grains"},
+    ])
+    total, items = index.query("Grains", offset=2)
+    assert (total, [item['id'] for item in items]) == (3, [1])
+    assert index.query("Spices") == (0, [])
+
+
+def test_edits_move_entries_by_their_indexed_name_and_category():
+    item = {'id': 1, 'name': "Zucchini", 'category': "Vegetables"}
+    index = InventoryIndex([item, {'id': 2, 'name': "Leek", 'category': "Vegetables"}])
+
+    # The stored dict may already be changed in place when the index is updated
+    item.update(name="Aubergine", category="Fruit")
+    index.add(item)
+
+    assert [i['id'] for i in index.query()[1]] == [1, 2]
+    assert [i['id'] for i in index.query("Vegetables")[1]] == [2]
+    index.remove(1)
+    assert index.query("Fruit") == (0, [])
+
+
+def test_query_ingredients_follows_edits(store):
+    store.add_ingredient("Garlic", "Vegetables", "kg", 0.5)
+    store.add_ingredient("Basmati", "Grains", "kg", 1.0)
+
+    page = store.query_ingredients(search="i", offset=1, limit=2)
+    assert page['total'] == 4
+    assert [ing['name'] for ing in page['items']] == ["Garlic", "Onions"]
+
+    store.update_ingredient(1, name="Shallots")
+    assert [ing['name'] for ing in store.query_ingredients("Vegetables")['items']] == ["Garlic", "Shallots"]
@@ -0,0 +1,45 @@
+import json
+
+from storage_backends import JsonBackend
+
+
+def test_compact_folds_the_journal_into_the_snapshot(store, store_path):
+    store.update_ingredient(1, amount=5.0)
+    backend = JsonBackend(store_path)
+    assert backend.journal_path.exists()
+
+    assert store.compact()
+    assert not backend.journal_path.exists()
+    assert json.loads(store_path.read_text())['ingredients'][0]['amount'] == 5.0
+    assert not store.compact()
+
+
+def test_torn_last_journal_line_is_skipped_and_terminated(store, store_path):
+    store.update_ingredient(1, amount=5.0)
+    backend = JsonBackend(store_path)
+    with open(backend.journal_path, 'ab') as f:
+        # An append interrupted halfway through its line
+        f.write(b'{"changes": [{"kind": "ingredient", "op": "put", "value": {"id": 2, "am')
+
+    assert [ing['amount'] for ing in backend.read()['ingredients']] == [5.0, 1.0]
+
+    backend.apply(backend.read(), [('ingredient', 'put', {**store.get_ingredient(2), 'amount': 3.0})])
+    assert [ing['amount'] for ing in backend.read()['ingredients']] == [5.0, 3.0]
+    assert len(backend.journal_path.read_bytes().splitlines()) == 3
+
+
+def test_journal_is_compacted_once_it_grows_too_large(store_path):
+    backend = JsonBackend(store_path, compact_bytes=300)
+    data = backend.read()
+    onions = data['ingredients'][0]
+
+    onions['amount'] = 3.0
+    backend.apply(data, [('ingredient', 'put', onions)])
+    assert backend.journal_path.exists()
+    assert json.loads(store_path.read_text())['ingredients'][0]['amount'] == 2.0
+
+    onions['amount'] = 4.0
+    backend.apply(data, [('ingredient', 'put', onions)])
+    assert not backend.journal_path.exists()
+    assert json.loads(store_path.read_text())['ingredients'][0]['amount'] == 4.0
+    assert backend.read() == data
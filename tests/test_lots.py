@@ -0,0 +1,110 @@
+from datetime import date
+
+import pytest
+
+import lots
+
+
+def make_item(amount, *dated, item_id=1):
+    return {'id': item_id, 'amount': amount,
+            'lots': [{'amount': lot_amount, 'expires': expires} for lot_amount, expires in dated]}
+
+
+def test_consume_takes_the_soonest_expiring_lot_first():
+    item = make_item(5.0, (1.0, "2030-01-01"), (2.0, "2030-02-01"))
+
+    taken, missing = lots.consume(item, 2.5)
+
+    assert taken == [{'amount': 1.0, 'expires': "2030-01-01"}, {'amount': 1.5, 'expires': "2030-02-01"}]
+    assert missing == 0
+    assert item['amount'] == 2.5
+    assert item['lots'] == [{'amount': 0.5, 'expires': "2030-02-01"}]
+
+
+def test_consume_uses_undated_stock_last_and_reports_what_is_missing():
+    item = make_item(2.0, (1.5, "2030-01-01"))
+
+    taken, missing = lots.consume(item, 3.0)
+
+    assert taken == [{'amount': 1.5, 'expires': "2030-01-01"}, {'amount': 0.5, 'expires': None}]
+    assert missing == 1.0
+    assert item['amount'] == 0
+    assert item['lots'] == []
+
+
+def test_add_lot_merges_lots_with_the_same_date():
+    item = {'id': 1, 'amount': 1.0}
+
+    lots.add_lot(item, 2.0, "2030-02-01")
+    lots.add_lot(item, 1.0, "2030-01-01")
+    lots.add_lot(item, 0.5, "2030-02-01")
+    lots.add_lot(item, 1.0)
+
+    assert item['amount'] == 5.5
+    assert item['lots'] == [{'amount': 1.0, 'expires': "2030-01-01"}, {'amount': 2.5, 'expires': "2030-02-01"}]
+
+
+def test_normalize_takes_a_lower_amount_from_the_first_expiring_lots():
+    item = make_item(2.0, (2.0, "2030-02-01"), (1.0, "2030-01-01"), (0.0, "2030-03-01"))
+
+    lots.normalize(item, previous_amount=4.0)
+
+    assert item['lots'] == [{'amount': 1.0, 'expires': "2030-02-01"}]
+
+
+def test_normalize_caps_the_lots_at_the_amount_and_drops_empty_lots():
+    item = make_item(0.5, (1.0, "2030-01-01"), (1.0, "2030-02-01"))
+
+    lots.normalize(item)
+    assert item['lots'] == [{'amount': 0.5, 'expires': "2030-02-01"}]
+
+    item['amount'] = 0
+    lots.normalize(item)
+    assert 'lots' not in item
+
+
+def test_expiry_index_follows_updates_and_removals():
+    first = make_item(2.0, (1.0, "2030-01-05"), (1.0, "2030-03-01"), item_id=1)
+    second = make_item(1.0, (1.0, "2030-01-02"), item_id=2)
+    index = lots.ExpiryIndex([first, second, {'id': 3, 'amount': 1.0}])
+
+    assert [(expires, item['id']) for expires, item, _ in index.expiring("2030-01-31")] == \
+        [("2030-01-02", 2), ("2030-01-05", 1)]
+    assert len(index.expiring("2030-12-31", since="2030-01-03")) == 2
+    assert len(index.expiring("2030-12-31", limit=1)) == 1
+
+    lots.consume(first, 1.0)
+    index.update(first)
+    index.remove(2)
+
+    assert index.expiring("2030-01-31") == []
+    assert [lot for _, _, lot in index.expiring("2030-12-31")] == [{'amount': 1.0, 'expires': "2030-03-01"}]
+
+
+def test_stock_lots_through_data_manager(store):
+    store.add_stock(1, 1.0, expires="2030-01-03")
+    store.add_stock(2, 0.5, expires=date(2030, 1, 1))
+
+    expiring = store.get_expiring(days=3, today=date(2030, 1, 2))
+    assert [(e['ingredient']['name'], e['expires'], e['expired']) for e in expiring] == [
+        ("Rice", "2030-01-01", True), ("Onions", "2030-01-03", False),
+    ]
+    assert store.get_expiring(days=3, include_expired=False, today=date(2030, 1, 2))[0]['expires'] == "2030-01-03"
+
+    assert store.consume_ingredient(1, 1.5) == {
+        'taken': [{'amount': 1.0, 'expires': "2030-01-03"}, {'amount': 0.5, 'expires': None}], 'missing': 0,
+    }
+    assert store.get_ingredient(1)['amount'] == 1.5
+    assert store.get_expiring(days=3, today=date(2030, 1, 2))[0]['ingredient']['name'] == "Rice"
+
+
+def test_cook_recipe_uses_the_soonest_expiring_lots(store):
+    store.add_stock(2, 0.2, expires="2030-01-01")
+    store.add_stock(2, 0.5, expires="2030-02-01")
+
+    result = store.cook_recipe(1, 2)
+
+    assert result == {'used': {1: 0.2, 2: 0.3}, 'missing': {}, 'unconverted': []}
+    rice = store.get_ingredient(2)
+    assert rice['amount'] == pytest.approx(1.4)
+    assert rice['lots'] == [{'amount': pytest.approx(0.4), 'expires': "2030-02-01"}]
@@ -0,0 +1,37 @@
+def test_plan_requirements_add_up_all_meals(store):
+    rice_bowl = store.add_recipe("Rice bowl", "", [{'ingredient_id': 2, 'quantity_grams': 200.0}])
+
+    result = store.calculate_plan_requirements([
+        (1, 4, "2030-01-03"),
+        (rice_bowl['id'], 3, "2030-01-01"),
+        (99, 2, None),
+    ])
+
+    assert (result['num_meals'], result['total_servings'], result['missing_recipes']) == (2, 7, [99])
+    requirements = {req['name']: req for req in result['requirements']}
+    assert requirements['Onions']['required_quantity'] == 400.0
+    assert requirements['Onions']['is_sufficient']
+    assert requirements['Onions']['first_needed'] == "2030-01-03"
+    assert requirements['Rice']['required_quantity'] == 1200.0
+    assert requirements['Rice']['shortfall'] == 200.0
+    assert requirements['Rice']['first_needed'] == "2030-01-01"
+    assert [req['name'] for req in result['shopping_list']] == ["Rice"]
+
+
+def test_plan_matches_single_recipe_requirements(store):
+    single = store.calculate_meal_requirements(1, 3)
+    plan = store.calculate_plan_requirements([(1, 3, None)])
+
+    assert {req['ingredient_id']: req['required_quantity'] for req in plan['requirements']} == \
+        {req['ingredient_id']: req['required_quantity'] for req in single['requirements']}
+    assert all(req['first_needed'] is None for req in plan['requirements'])
+
+
+def test_pieces_without_weight_cannot_be_compared(store):
+    eggs = store.add_ingredient("Eggs", "Dairy", "pieces", 6.0)
+    omelette = store.add_recipe("Omelette", "", [{'ingredient_id': eggs['id'], 'quantity_grams': 120.0}])
+
+    requirement, = store.calculate_plan_requirements([(omelette['id'], 2, None)])['requirements']
+
+    assert not requirement['can_compare']
+    assert requirement['shortfall'] == 240.0
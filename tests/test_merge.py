@@ -0,0 +1,51 @@
+import pytest
+
+import clean_ingredients
+
+
+def test_merge_converts_stock_between_measurements(store):
+    pulp = store.add_ingredient("Tomato pulp", "Vegetables", "kg", 1.0)
+    pulpe = store.add_ingredient("Tomatoes Pulpe", "Vegetables", "liter", 0.0, density=1.2)
+    store.add_stock(pulpe['id'], 0.5, expires="2030-01-01")
+    store.add_stock(pulpe['id'], 0.5)
+
+    result = store.merge_ingredients({pulpe['id']: pulp['id']})
+
+    assert result == {'ingredients_removed': 1, 'recipes_updated': 0, 'skipped': []}
+    survivor = store.get_ingredient(pulp['id'])
+    assert survivor['amount'] == pytest.approx(2.2)
+    assert survivor['lots'] == [{'amount': pytest.approx(0.6), 'expires': "2030-01-01"}]
+    assert store.get_ingredient(pulpe['id']) is None
+
+
+def test_merge_refuses_stock_it_cannot_convert(store):
+    eggs = store.add_ingredient("Eggs", "Dairy", "kg", 1.0)
+    egg = store.add_ingredient("Egg", "Dairy", "pieces", 6.0)
+    empty = store.add_ingredient("Eggs M", "Dairy", "pieces", 0.0)
+
+    result = store.merge_ingredients({egg['id']: eggs['id'], empty['id']: eggs['id']})
+
+    assert result['skipped'] == [egg['id']]
+    assert result['ingredients_removed'] == 1
+    assert store.get_ingredient(eggs['id'])['amount'] == 1.0
+    assert store.get_ingredient(egg['id'])['amount'] == 6.0
+    assert store.get_ingredient(empty['id']) is None
+
+
+def test_review_reports_conversions_and_mismatches(store, capsys):
+    store.add_ingredient("Tomato pulp", "Vegetables", "kg", 1.0)
+    store.add_ingredient("Tomatoes Pulpe", "Vegetables", "liter", 1.0)
+    store.add_ingredient("Onion", "Vegetables", "pieces", 4.0)
+
+    plan = {survivor['name']: (duplicates, unconvertible)
+            for survivor, _, duplicates, unconvertible in clean_ingredients.plan_merges(store.load_data())}
+    assert [dup['name'] for dup in plan["Tomato pulp"][0]] == ["Tomatoes Pulpe"]
+    assert [dup['name'] for dup in plan["Onions"][1]] == ["Onion"]
+
+    clean_ingredients.clean_ingredients(store.load_data(), apply=True)
+
+    output = capsys.readouterr().out
+    assert "(stock 1 liter → 1 kg)" in output
+    assert "Not merging: 'Onion'" in output
+    assert store.find_ingredient("Onion", fuzzy=False)['amount'] == 4.0
+    assert store.find_ingredient("Onions", fuzzy=False)['amount'] == 2.0
@@ -0,0 +1,41 @@
+import json
+
+import data_manager as dm
+from conftest import ROOT
+from storage_backends import JsonBackend
+
+
+def test_migrate_data_keeps_a_returned_copy(monkeypatch):
+    def copy_step(data):
+        return {**data, 'migrated': True}
+
+    monkeypatch.setattr(dm, 'SCHEMA_VERSION', 2)
+    monkeypatch.setattr(dm, 'MIGRATIONS', dm.MIGRATIONS + [(2, copy_step)])
+    data, migrated = dm.migrate_data({'schema_version': 1, 'ingredients': [], 'recipes': []})
+    assert migrated
+    assert data['migrated'] is True
+    assert data['schema_version'] == 2
+
+
+def test_migrate_data_current_schema_is_untouched():
+    original = {'schema_version': dm.SCHEMA_VERSION, 'ingredients': [], 'recipes': []}
+    data, migrated = dm.migrate_data(original)
+    assert not migrated
+    assert data is original
+
+
+def test_load_data_saves_the_migrated_copy(monkeypatch, tmp_path):
+    path = tmp_path / "storage_data.json"
+    path.write_text(json.dumps({'schema_version': 1, 'ingredients': [], 'recipes': []}))
+    monkeypatch.setattr(dm, 'SCHEMA_VERSION', 2)
+    monkeypatch.setattr(dm, 'MIGRATIONS', dm.MIGRATIONS + [(2, lambda data: {**data, 'migrated': True})])
+    dm.set_backend(JsonBackend(path))
+    assert dm.load_data()['migrated'] is True
+    assert json.loads(path.read_text())['migrated'] is True
+
+
+def test_shipped_store_needs_no_migration():
+    # Loading it must not rewrite the tracked file
+    for name in ("storage_data.json", "storage_data.template.json"):
+        data = json.loads((ROOT / "data" / name).read_text())
+        assert data['schema_version'] == dm.SCHEMA_VERSION
@@ -0,0 +1,62 @@
+import pytest
+
+from name_index import NameIndex, normalize_name, similarity
+
+
+def make_index(*names):
+    return NameIndex({'id': item_id, 'name': name} for item_id, name in enumerate(names, 1))
+
+
+def test_exact_lookup_ignores_case_and_surrounding_spaces():
+    index = make_index("Coconut milk", "Rice")
+
+    assert index.exact("  COCONUT milk ")['id'] == 1
+    assert index.exact("Coconutmilk") is None
+
+
+def test_fuzzy_lookup_scores_like_similarity():
+    index = make_index("Tomatoes", "Tomato pulp", "Potatoes", "Rice")
+
+    matches = index.fuzzy("Tomatos", threshold=0.3)
+
+    assert [item['name'] for _, item in matches][:2] == ["Tomatoes", "Tomato pulp"]
+    for score, item in matches:
+        assert score == pytest.approx(similarity("Tomatos", item['name']))
+        assert score >= 0.3
+    assert index.fuzzy("Tomatos", threshold=0.3, limit=1) == matches[:1]
+    assert index.fuzzy("xyz") == []
+
+
+def test_find_prefers_the_exact_match():
+    index = make_index("Onions", "Onion")
+
+    assert index.find("onion")['id'] == 2
+    assert index.find("Onionz")['id'] == 2
+    assert index.find("Garlic") is None
+
+
+def test_renamed_and_removed_items_leave_no_stale_entries():
+    index = make_index("Quinoa", "Rice")
+    quinoa = index.exact("Quinoa")
+
+    quinoa['name'] = "Bulgur"
+    index.add(quinoa)
+    index.remove(2)
+
+    assert index.exact("Quinoa") is None
+    assert index.fuzzy("Quinoa") == []
+    assert index.exact("bulgur") is quinoa
+    assert index.find("Rice") is None
+    assert normalize_name(" Bulgur ") == "bulgur"
+
+
+def test_find_ingredient_follows_edits(store):
+    assert store.find_ingredient("Onionz")['id'] == 1
+    assert store.find_ingredient("Onionz", fuzzy=False) is None
+
+    store.update_ingredient(1, name="Shallots")
+    store.delete_ingredient(2)
+
+    assert store.find_ingredient("Onions", fuzzy=False) is None
+    assert store.find_ingredient("Shalots")['name'] == "Shallots"
+    assert store.find_ingredient("Rice") is None
@@ -0,0 +1,49 @@
+from datetime import date
+
+import pytest
+
+
+@pytest.fixture
+def kitchen(store):
+    """Besides rice with onions (vegie): onion soup (vegie, soup) and steak, whose beef is out of stock."""
+    beef = store.add_ingredient("Beef", "Meat", "kg", 0.0)
+    soup = store.add_recipe("Onion soup", "", [{'ingredient_id': 1, 'quantity_grams': 300.0}], vegie="yes", tag="soup")
+    steak = store.add_recipe("Steak", "", [{'ingredient_id': beef['id'], 'quantity_grams': 200.0}], tag="meat")
+    return store, soup['id'], steak['id']
+
+
+def test_fixed_plan_buys_as_little_as_possible(kitchen):
+    store, soup, steak = kitchen
+
+    result = store.optimize_meal_plan(2, num_days=2, start_date=date(2030, 1, 1))
+
+    assert sorted(recipe_id for recipe_id, _, _ in result['plan']) == sorted([1, soup])
+    assert [(people, day) for _, people, day in result['plan']] == [(2, date(2030, 1, 1)), (2, date(2030, 1, 2))]
+    assert (result['shortfall_grams'], result['shopping_list'], result['unfilled']) == (0.0, [], 0)
+
+    result = store.optimize_meal_plan(2, num_days=3)
+    assert sorted(recipe_id for recipe_id, _, _ in result['plan']) == sorted([1, soup, steak])
+    assert result['shortfall_grams'] == 400.0
+    assert [req['name'] for req in result['shopping_list']] == ["Beef"]
+
+
+def test_without_days_plans_as_many_meals_as_the_stock_covers(kitchen):
+    store, soup, steak = kitchen
+
+    result = store.optimize_meal_plan(1, max_repeats=3)
+
+    # Onions: 3 x 100 g + 3 x 300 g of 2 kg; rice: 3 x 150 g of 1 kg
+    assert sorted(recipe_id for recipe_id, _, _ in result['plan']) == [1, 1, 1, soup, soup, soup]
+    assert result['shortfall_grams'] == 0.0
+    assert steak not in [recipe_id for recipe_id, _, _ in result['plan']]
+
+
+def test_constraints_leave_meals_unfilled(kitchen):
+    store, soup, steak = kitchen
+
+    result = store.optimize_meal_plan(1, num_days=2, vegie_only=True, tags=["soup"])
+    assert [recipe_id for recipe_id, _, _ in result['plan']] == [soup]
+    assert result['unfilled'] == 1
+
+    result = store.optimize_meal_plan(1, num_days=1, meals_per_day=3, max_repeats=2, max_per_tag=1)
+    assert sorted(recipe_id for recipe_id, _, _ in result['plan']) == sorted([1, 1, soup])
@@ -0,0 +1,89 @@
+import random
+
+import pytest
+
+from search_index import PREFIX_FACTOR, SearchIndex, tokenize
+
+
+def build(ingredients=(), recipes=()):
+    index = SearchIndex()
+    index.add_many('ingredient', ingredients)
+    index.add_many('recipe', recipes)
+    return index
+
+
+def test_every_word_must_match_and_the_last_may_be_a_prefix():
+    index = build([{'id': 1, 'name': "Coconut milk", 'category': "Dairy"},
+                   {'id': 2, 'name': "Coconut flakes", 'category': "Baking"}])
+
+    assert [(score, item['id']) for score, _, item in index.search("coconut mi")] == [(3.0 + 3.0 * PREFIX_FACTOR, 1)]
+    assert [item['id'] for _, _, item in index.search("coconut")] == [1, 2]
+    assert index.search("coco milk") == []
+    # One letter is too short to be used as a prefix
+    assert index.search("coconut m") == []
+
+
+def test_field_weights_rank_names_above_comments():
+    index = build(recipes=[
+        {'id': 1, 'name': "Stew", 'tag': "", 'comments': "with rice"},
+        {'id': 2, 'name': "Rice pudding", 'tag': "dessert", 'comments': ""},
+        {'id': 3, 'name': "Curry", 'tag': "rice", 'comments': ""},
+    ])
+
+    assert [(score, item['id']) for score, _, item in index.search("rice")] == [(3.0, 2), (2.0, 3), (1.0, 1)]
+    assert [item['id'] for _, _, item in index.search("rice", limit=1)] == [2]
+
+
+def test_kinds_and_removal():
+    index = build([{'id': 1, 'name': "Rice", 'category': "Grains"}],
+                  [{'id': 1, 'name': "Fried rice", 'tag': "", 'comments': ""}])
+
+    assert [kind for _, kind, _ in index.search("rice", kinds=['recipe'])] == ['recipe']
+
+    index.remove('ingredient', 1)
+    assert [kind for _, kind, _ in index.search("rice")] == ['recipe']
+    index.remove('recipe', 1)
+    assert index.search("ric") == []
+
+
+def test_top_results_match_scoring_every_document():
+    rng = random.Random(7)
+    words = ["rice", "rich", "ricotta", "onion", "oil", "olive", "milk", "mint", "salt", "sage"]
+    recipes = [
+        {'id': i, 'name': " ".join(rng.sample(words, 2)), 'tag': rng.choice(words), 'comments': " ".join(rng.sample(words, 3))}
+        for i in range(200)
+    ]
+    index = build(recipes=recipes)
+    weights = {'name': 3.0, 'tag': 2.0, 'comments': 1.0}
+
+    def score(recipe, query):
+        terms = {}
+        for field, weight in weights.items():
+            for term in tokenize(recipe[field]):
+                terms[term] = terms.get(term, 0.0) + weight
+        *exact, prefix = tokenize(query)
+        total = 0.0
+        for word in exact:
+            if word not in terms:
+                return 0.0
+            total += terms[word]
+        best = max((weight * (1.0 if term == prefix else PREFIX_FACTOR)
+                    for term, weight in terms.items() if term.startswith(prefix)), default=0.0)
+        return total + best if best else 0.0
+
+    for query in ["ric", "onion ri", "salt mi", "olive"]:
+        expected = sorted((score(recipe, query) for recipe in recipes), reverse=True)[:10]
+        found = [score for score, _, _ in index.search(query, limit=10)]
+        assert found == pytest.approx([s for s in expected if s])
+
+
+def test_search_follows_edits(store):
+    assert [(r['kind'], r['item']['name']) for r in store.search("rice")] == [
+        ('ingredient', "Rice"), ('recipe', "Rice with onions"),
+    ]
+
+    store.update_ingredient(2, name="Basmati")
+    store.add_recipe("Onion soup", "", [{'ingredient_id': 1, 'quantity_grams': 200.0}], tag="soup")
+
+    assert [r['item']['name'] for r in store.search("basm")] == ["Basmati"]
+    assert [r['item']['name'] for r in store.search("onion", kinds=['recipe'])] == ["Onion soup", "Rice with onions"]
@@ -0,0 +1,52 @@
+from conftest import make_document
+from storage_backends import SqliteBackend
+
+
+def test_write_and_read_round_trip_keep_extra_fields(tmp_path):
+    backend = SqliteBackend(tmp_path / "storage_data.db")
+    document = make_document()
+    document['ingredients'][0].update(min_stock=0.5, lots=[{'amount': 1.0, 'expires': "2030-01-01"}])
+    document['recipes'][0]['planned_for'] = "2030-01-02"
+
+    backend.write(document)
+
+    assert backend.read() == document
+
+
+def test_apply_updates_single_rows(tmp_path):
+    backend = SqliteBackend(tmp_path / "storage_data.db")
+    document = make_document()
+    backend.write(document)
+    before = backend.fingerprint()
+
+    onions = {**document['ingredients'][0], 'amount': 7.5}
+    recipe = {**document['recipes'][0], 'ingredients': [{'ingredient_id': 1, 'quantity_grams': 50.0}]}
+    backend.apply(document, [
+        ('ingredient', 'put', onions),
+        ('ingredient', 'delete', 2),
+        ('recipe', 'put', recipe),
+        ('meta', 'put', {'key': 'units', 'value': ["kg"]}),
+    ])
+
+    data = backend.read()
+    assert backend.fingerprint() != before
+    assert data['ingredients'] == [onions]
+    assert data['recipes'] == [recipe]
+    assert data['units'] == ["kg"]
+
+    backend.apply(data, [('recipe', 'delete', 1)])
+    assert backend.read()['recipes'] == []
+
+
+def test_data_manager_on_sqlite(store, tmp_path):
+    backend = SqliteBackend(tmp_path / "storage_data.db")
+    backend.write(make_document())
+    store.set_backend(backend)
+
+    store.update_ingredient(1, amount=4.0)
+    store.add_recipe("Onion rice", "", [{'ingredient_id': 1, 'quantity_grams': 80.0}])
+
+    reread = SqliteBackend(backend.path).read()
+    assert reread['ingredients'][0]['amount'] == 4.0
+    assert reread['ingredients'][0]['revision'] == 2
+    assert [recipe['name'] for recipe in reread['recipes']] == ["Rice with onions", "Onion rice"]
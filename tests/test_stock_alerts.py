@@ -0,0 +1,40 @@
+from stock_alerts import StockAlerts, stock_ratio
+
+
+def test_stock_ratio_only_for_items_below_their_threshold():
+    assert stock_ratio({'id': 1, 'amount': 1.0, 'min_stock': 4.0}) == 0.25
+    assert stock_ratio({'id': 1, 'amount': 4.0, 'min_stock': 4.0}) is None
+    assert stock_ratio({'id': 1, 'amount': 0.0}) is None
+    assert stock_ratio({'id': 1, 'amount': None, 'min_stock': 2.0}) == 0.0
+
+
+def test_alerts_follow_updates_of_items_changed_in_place():
+    rice = {'id': 1, 'amount': 1.0, 'min_stock': 2.0}
+    salt = {'id': 2, 'amount': 0.1, 'min_stock': 1.0}
+    alerts = StockAlerts([rice, salt, {'id': 3, 'amount': 5.0, 'min_stock': 1.0}])
+
+    assert [(ratio, item['id']) for ratio, item in alerts.alerts()] == [(0.1, 2), (0.5, 1)]
+
+    salt['amount'] = 3.0
+    alerts.update(salt)
+    rice['amount'] = 0.0
+    alerts.update(rice)
+
+    assert [(ratio, item['id']) for ratio, item in alerts.alerts()] == [(0.0, 1)]
+    alerts.remove(1)
+    assert len(alerts) == 0
+
+
+def test_get_low_stock_follows_edits(store):
+    store.update_ingredient(1, min_stock=4.0)
+    store.update_ingredient(2, min_stock=4.0)
+    assert [(low['ingredient']['name'], low['ratio']) for low in store.get_low_stock()] == [
+        ("Rice", 0.25), ("Onions", 0.5),
+    ]
+
+    store.update_ingredient(2, amount=5.0)
+    garlic = store.add_ingredient("Garlic", "Vegetables", "kg", 0.0)
+    store.update_ingredient(garlic['id'], min_stock=0.5)
+    store.delete_ingredient(1)
+
+    assert [low['ingredient']['name'] for low in store.get_low_stock(limit=5)] == ["Garlic"]
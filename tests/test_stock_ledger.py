@@ -0,0 +1,67 @@
+import pytest
+
+import stock_ledger
+from stock_ledger import StockLedger
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Ledger time that advances one second per reading."""
+    now = [1000.0]
+
+    def tick():
+        now[0] += 1
+        return now[0]
+    monkeypatch.setattr(stock_ledger.time, 'time', tick)
+    return now
+
+
+def test_stock_at_replays_from_the_nearest_checkpoint(tmp_path, clock):
+    ledger = StockLedger(tmp_path / "store.ledger", checkpoint_every=3)
+    ledger.start({1: 10.0})
+    times = []
+    for delta in (-1.0, -2.0, 5.0, -3.0, 1.0, -4.0, 2.0):
+        ledger.record({1: delta}, 'manual')
+        ledger.sync()
+        times.append(clock[0])
+
+    # The opening stock and one checkpoint every three events
+    assert len(ledger._checkpoints()) == 3
+    reopened = StockLedger(tmp_path / "store.ledger", checkpoint_every=3)
+    assert reopened.stock() == {1: 8.0}
+    assert reopened.stock_at(times[1]) == {1: 7.0}
+    assert reopened.stock_at(times[3]) == {1: 9.0}
+    assert reopened.stock_at(times[4] + 0.5) == {1: 10.0}
+    assert reopened.stock_at(1000.0) is None
+
+
+def test_torn_event_line_is_skipped_and_terminated(tmp_path, clock):
+    ledger = StockLedger(tmp_path / "store.ledger")
+    ledger.start({1: 10.0})
+    ledger.record({1: -1.0}, 'cook')
+    ledger.sync()
+    with open(ledger.path, 'ab') as f:
+        f.write(b'{"seq": 2, "time": 100')
+
+    assert StockLedger(ledger.path).stock() == {1: 9.0}
+
+    ledger.record({1: -2.0}, 'cook')
+    ledger.sync()
+    reopened = StockLedger(ledger.path)
+    assert reopened.stock() == {1: 7.0}
+    assert [event['delta'] for event in reopened.events()] == [-1.0, -2.0]
+
+
+def test_transaction_keeps_the_stock_source_of_each_change(store):
+    with store.transaction():
+        with store.stock_source('import', reason="source.xlsx: Sheet1"):
+            store.update_ingredient(1, amount=5.0)
+        store.update_ingredient(2, amount=3.0)
+        with store.stock_source('cook', reason="Rice with onions"):
+            store.add_ingredient("Garlic", "Vegetables", "kg", 0.5)
+
+    history = [(event['ingredient_id'], event['delta'], event['source'], event['reason'])
+               for event in store.get_stock_history()]
+    assert sorted(history) == [(1, 3.0, 'import', "source.xlsx: Sheet1"),
+                               (2, 2.0, 'manual', ""),
+                               (3, 0.5, 'cook', "Rice with onions")]
@@ -0,0 +1,99 @@
+import json
+import threading
+
+import pytest
+
+import data_manager as dm
+
+
+def stored_amounts(store_path):
+    """Amounts in the store on disk, snapshot plus journal."""
+    from storage_backends import JsonBackend
+    return {ing['id']: ing['amount'] for ing in JsonBackend(store_path).read()['ingredients']}
+
+
+def failing_apply(monkeypatch):
+    def apply(data, changes):
+        raise OSError("No space left on device")
+    monkeypatch.setattr(dm.get_backend(), 'apply', apply)
+
+
+def test_failed_commit_rolls_back_the_cache(store, store_path, monkeypatch):
+    store.get_ingredient(1)
+    store.find_ingredient("Onions")
+    failing_apply(monkeypatch)
+
+    with pytest.raises(OSError):
+        store.update_ingredient(1, amount=7.0)
+
+    monkeypatch.undo()
+    assert store.get_ingredient(1)['amount'] == 2.0
+    assert store.find_ingredient("Onions")['amount'] == 2.0
+    assert stored_amounts(store_path) == {1: 2.0, 2: 1.0}
+
+
+def test_failed_transaction_commit_rolls_back_the_cache(store, store_path, monkeypatch):
+    store.get_ingredients()
+    failing_apply(monkeypatch)
+
+    with pytest.raises(OSError):
+        with store.transaction():
+            store.update_ingredient(1, amount=7.0)
+            store.update_ingredient(2, amount=3.0)
+
+    monkeypatch.undo()
+    assert {ing['id']: ing['amount'] for ing in store.get_ingredients()} == {1: 2.0, 2: 1.0}
+    assert store.get_stock_history() == []
+
+    # A later commit must not persist any part of the failed batch
+    store.update_ingredient(2, amount=4.0)
+    assert stored_amounts(store_path) == {1: 2.0, 2: 4.0}
+    assert [(e['ingredient_id'], e['delta']) for e in store.get_stock_history()] == [(2, 3.0)]
+
+
+def test_error_in_transaction_body_rolls_back(store, store_path):
+    with pytest.raises(RuntimeError):
+        with store.transaction():
+            store.update_ingredient(1, amount=7.0)
+            raise RuntimeError("abort")
+
+    assert store.get_ingredient(1)['amount'] == 2.0
+    assert stored_amounts(store_path) == {1: 2.0, 2: 1.0}
+
+
+def test_transaction_writes_one_journal_line(store, store_path):
+    with store.transaction():
+        store.update_ingredient(1, amount=7.0)
+        store.update_ingredient(2, amount=3.0)
+
+    lines = store_path.with_suffix('.journal').read_text().splitlines()
+    assert len(lines) == 1
+    assert len(json.loads(lines[0])['changes']) == 2
+    assert stored_amounts(store_path) == {1: 7.0, 2: 3.0}
+
+
+def read_in_other_thread(store, ingredient_id, seen):
+    reader = threading.Thread(target=lambda: seen.append(store.get_ingredient(ingredient_id)['amount']))
+    reader.start()
+    return reader
+
+
+def test_other_threads_do_not_see_an_uncommitted_transaction(store):
+    seen = []
+    with pytest.raises(RuntimeError):
+        with store.transaction():
+            store.update_ingredient(1, amount=7.0)
+            reader = read_in_other_thread(store, 1, seen)
+            reader.join(0.2)
+            assert seen == []
+            raise RuntimeError("abort")
+    reader.join()
+    assert seen == [2.0]
+
+    with store.transaction():
+        store.update_ingredient(2, amount=3.0)
+        reader = read_in_other_thread(store, 2, seen)
+        reader.join(0.2)
+        assert store.get_ingredient(2)['amount'] == 3.0
+    reader.join()
+    assert seen == [2.0, 3.0]
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+import units
+
+INGREDIENTS = [
+    {'measurement': 'kg', 'amount': 1.5},
+    {'measurement': 'liter', 'amount': 2.0},
+    {'measurement': 'liter', 'amount': 0.5, 'density': 0.92},
+    {'measurement': 'pieces', 'amount': 6.0, 'piece_grams': 60.0},
+    {'measurement': 'pieces', 'amount': 3.0},
+]
+GRAMS = [1500.0, 2000.0, 460.0, 360.0, None]
+
+
+@pytest.mark.parametrize("ingredient, grams", list(zip(INGREDIENTS, GRAMS)))
+def test_to_grams(ingredient, grams):
+    assert units.to_grams(ingredient) == pytest.approx(grams)
+    if grams is not None:
+        assert units.from_grams(ingredient, grams) == pytest.approx(ingredient['amount'])
+
+
+def test_convert_goes_through_grams():
+    eggs = {'measurement': 'pieces', 'piece_grams': 60.0}
+
+    assert units.convert(2.0, {'measurement': 'liter', 'density': 1.2}, {'measurement': 'kg'}) == pytest.approx(2.4)
+    assert units.convert(0.3, {'measurement': 'kg'}, eggs) == pytest.approx(5.0)
+    assert units.convert(4.0, {'measurement': 'pieces'}, {'measurement': 'pieces'}) == 4.0
+    assert units.convert(4.0, {'measurement': 'pieces'}, {'measurement': 'kg'}) is None
+
+
+def test_conversion_table_matches_the_single_conversions():
+    table = units.ConversionTable(INGREDIENTS)
+    expected = np.array([np.nan if grams is None else grams for grams in GRAMS])
+
+    np.testing.assert_allclose(table.available_grams(), expected)
+    np.testing.assert_allclose(table.to_grams(np.ones(len(INGREDIENTS))), [1000.0, 1000.0, 920.0, 60.0, np.nan])
+
+    table.update(4, {'measurement': 'pieces', 'amount': 3.0, 'piece_grams': 10.0})
+    assert table.available_grams()[4] == 30.0
+
+
+def test_columns_match_the_dicts():
+    measurement = np.array([ing['measurement'] for ing in INGREDIENTS], dtype=object)
+    density = np.array([ing.get('density', np.nan) for ing in INGREDIENTS])
+    piece_grams = np.array([ing.get('piece_grams', np.nan) for ing in INGREDIENTS])
+    amount = np.array([ing['amount'] for ing in INGREDIENTS])
+
+    table = units.ConversionTable.from_columns(measurement, amount, density, piece_grams)
+
+    np.testing.assert_allclose(table.available_grams(), units.ConversionTable(INGREDIENTS).available_grams())
+
+
+def test_describe():
+    assert units.describe(INGREDIENTS[2]) == "0.5 liter (0.92 kg/l)"
+    assert units.describe(INGREDIENTS[1]) == "2.0 liter (water-based estimate)"
+    assert units.describe(INGREDIENTS[3]) == "6.0 pieces (~360g at 60g each)"
+    assert units.describe(INGREDIENTS[4]) == "3.0 pieces"
@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import data_manager as dm
+from conftest import in_other_process, make_document
+from storage_backends import ArrowBackend, JsonBackend
+
+
+def stored(store_path):
+    return {ing['id']: ing for ing in JsonBackend(store_path).read()['ingredients']}
+
+
+@pytest.fixture
+def write_behind(store):
+    store.load_data()
+    store.set_write_behind(60.0)
+    return store
+
+
+def test_flush_keeps_another_process_newer_version(write_behind, store_path):
+    write_behind.update_ingredient(1, amount=5.0)
+    write_behind.update_ingredient(2, amount=3.0)
+    in_other_process(store_path, "dm.update_ingredient(1, amount=99.0)")
+
+    with pytest.raises(dm.ConflictError, match="Onions"):
+        write_behind.flush()
+
+    on_disk = stored(store_path)
+    assert on_disk[1]['amount'] == 99.0
+    assert on_disk[1]['revision'] == 2
+    assert on_disk[2]['amount'] == 3.0
+    assert write_behind.get_ingredient(1)['amount'] == 99.0
+    assert write_behind.get_stock_at(datetime.now() + timedelta(seconds=1)) == {1: 99.0, 2: 3.0}
+
+
+def test_flush_detects_a_delete_by_another_process(write_behind, store_path):
+    write_behind.update_ingredient(1, amount=5.0)
+    in_other_process(store_path, "dm.delete_ingredient(1)")
+
+    with pytest.raises(dm.ConflictError, match="deleted"):
+        write_behind.flush()
+
+    assert 1 not in stored(store_path)
+    assert write_behind.get_ingredient(1) is None
+
+
+def test_flush_detects_a_stale_delete(write_behind, store_path):
+    write_behind.delete_ingredient(1)
+    in_other_process(store_path, "dm.update_ingredient(1, amount=99.0)")
+
+    with pytest.raises(dm.ConflictError):
+        write_behind.flush()
+
+    assert stored(store_path)[1]['amount'] == 99.0
+
+
+def test_flush_rebases_changes_to_other_entities(write_behind, store_path):
+    write_behind.update_ingredient(1, amount=5.0)
+    added = write_behind.add_ingredient("Garlic", "Vegetables", "kg", 0.5)
+    in_other_process(store_path, "dm.update_ingredient(2, amount=99.0)")
+
+    write_behind.flush()
+
+    on_disk = stored(store_path)
+    assert (on_disk[1]['amount'], on_disk[2]['amount'], on_disk[added['id']]['name']) == (5.0, 99.0, "Garlic")
+
+
+def test_stale_expected_revision_under_write_behind(write_behind, store_path):
+    revision = write_behind.get_ingredient(1)['revision']
+    write_behind.update_ingredient(1, expected_revision=revision, amount=5.0)
+
+    with pytest.raises(dm.ConflictError):
+        write_behind.update_ingredient(1, expected_revision=revision, amount=6.0)
+
+    write_behind.flush()
+    assert stored(store_path)[1]['amount'] == 5.0
+
+
+def test_requirement_matrix_follows_unflushed_edits_on_arrow(store, tmp_path):
+    backend = ArrowBackend(tmp_path / "storage_data.arrow")
+    backend.write(make_document())
+    store.set_backend(backend)
+    assert [(r['max_servings'], r['limiting_ingredient']) for r in store.get_feasible_recipes()] == [(6, "Rice")]
+    store.set_write_behind(60.0)
+
+    store.update_recipe(1, ingredients=[{'ingredient_id': 1, 'quantity_grams': 5000.0}])
+    assert store.get_feasible_recipes() == []
+
+    store.flush()
+    assert store.get_feasible_recipes() == []
+    store.update_ingredient(1, amount=10.0)
+    store.flush()
+    assert [(r['max_servings'], r['limiting_ingredient']) for r in store.get_feasible_recipes()] == [(2, "Onions")]